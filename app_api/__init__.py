@@ -0,0 +1,3 @@
+# Django 2.1 only uses our AppConfig subclass (and so only runs its ready() method)
+# if we point to it here, since INSTALLED_APPS lists the plain package name
+default_app_config = 'app_api.apps.AppApiConfig'
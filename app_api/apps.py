@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AppApiConfig(AppConfig):
     name = 'app_api'
+
+    def ready(self):
+        # connect our signal receivers, now that the models are loaded
+        from . import signals  # noqa: F401
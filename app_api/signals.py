@@ -0,0 +1,71 @@
+# Receivers for signals from the data model, which throw away anything the API has
+# precomputed or cached once the underlying data changes.
+#
+# Copies of a data set's rows are only thrown away once the change is committed: until then,
+# other requests still see the old rows, and would cache them again straight away. (Outside a
+# transaction, on_commit runs its function immediately.) Versions are bumped in the database, so
+# the bump is part of the same transaction as the change.
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from hda_privileged.models import Data_Point, Data_Set
+from hda_privileged.signals import geography_changed
+from hda_privileged.versions import bump_data_set_version
+
+from app_api.util.export import remove_artifacts
+from app_api.util.percentiles import forget_percentiles
+from app_api.util.prefetch import build_prefetch
+from app_api.views.list_all import ListEndpoint
+from app_api.views.search import Suggestions
+
+
+@receiver(geography_changed)
+def clear_list_payloads(sender, **kwargs):
+    ListEndpoint.payloads.clear()
+
+
+@receiver(geography_changed)
+def clear_search_indexes(sender, **kwargs):
+    Suggestions.indexes.clear()
+
+
+@receiver(geography_changed)
+def rebuild_prefetch_data(sender, **kwargs):
+    # from the committed geography; pages only ever read the manifest
+    transaction.on_commit(build_prefetch)
+
+
+def forget_data_set(data_set_id):
+    remove_artifacts(data_set_id)
+    forget_percentiles(data_set_id)
+
+
+@receiver(post_delete, sender=Data_Set)
+def clear_data_set_copies(sender, instance, **kwargs):
+    data_set_id = instance.id
+    transaction.on_commit(lambda: forget_data_set(data_set_id))
+
+
+# a data set marked as deleted is hidden straight away, although its rows are purged later
+@receiver(post_save, sender=Data_Set)
+def forget_deleted_data_set(sender, instance, **kwargs):
+    if instance.status == Data_Set.DELETED:
+        data_set_id = instance.id
+        transaction.on_commit(lambda: forget_data_set(data_set_id))
+
+
+@receiver(post_save, sender=Data_Set)
+@receiver(post_delete, sender=Data_Set)
+def change_data_set_version(sender, instance, **kwargs):
+    bump_data_set_version(instance.id)
+
+
+# points are normally only written in bulk (without signals) while their data set is staging,
+# but they can be edited one at a time, e.g. in the admin. (There is deliberately no post_delete
+# receiver: it would stop Django from deleting points in bulk when data sets are purged. The
+# admin bumps the version itself when it deletes points.)
+@receiver(post_save, sender=Data_Point)
+def change_point_data_set_version(sender, instance, **kwargs):
+    bump_data_set_version(instance.data_set_id)
@@ -0,0 +1,241 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase
+from django.core.management import call_command
+
+from hda_privileged.models import Cache_Version, Data_Point, Data_Set, Health_Indicator, Percentile, US_County
+from app_api.util import sparkline
+from app_api.views.chart import COMPACT_MEDIA_TYPE
+
+
+class PointSeriesFormatTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        call_command('load_random_data_set', stdout=out)
+        cls.data_set = Data_Set.objects.get()
+        cls.url = f'/api/chart/points/{cls.data_set.id}'
+
+    def test_default_format_has_point_objects(self):
+        response = self.client.get(self.url, {'county': '01001,01003'})
+        self.assertEqual(response.status_code, 200)
+        json = response.json()
+        self.assertNotIn('compact', json)
+        self.assertEqual(len(json['config']['data']), 2)
+        self.assertEqual(json['config']['data'][0]['name'], 'Autauga County')
+
+    def test_compact_format_by_query_string(self):
+        response = self.client.get(self.url, {'county': '01001,01003', 'format': 'compact'})
+        self.assertEqual(response.status_code, 200)
+        json = response.json()
+        # the points are only in the parallel arrays, not repeated in the config
+        self.assertNotIn('data', json['config'])
+        compact = json['compact']
+        self.assertEqual(compact['fips'], ['01001', '01003'])
+        self.assertEqual(len(compact['x']), 2)
+        self.assertEqual(len(compact['y']), 2)
+
+    def test_compact_format_by_accept_header(self):
+        response = self.client.get(self.url, {'state': 'AL'}, HTTP_ACCEPT=COMPACT_MEDIA_TYPE)
+        json = response.json()
+        self.assertIn('compact', json)
+        self.assertEqual(len(json['compact']['fips']), self.data_set.data_points.filter(county__state='AL').count())
+
+    def test_varies_by_accept_header(self):
+        for url in (self.url, '/api/chart/batch'):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'data_sets': self.data_set.id, 'county': '01001'})
+                self.assertIn('Accept', response['Vary'])
+
+    def test_compact_matches_default(self):
+        params = {'state': 'TN'}
+        default = self.client.get(self.url, params).json()['config']['data']
+        compact = self.client.get(self.url, dict(params, format='compact')).json()['compact']
+        names = self.client.get(compact['names']).json()
+        decoded = [
+            {'x': x, 'y': y, 'name': names[fips]}
+            for (fips, x, y) in zip(compact['fips'], compact['x'], compact['y'])
+        ]
+        self.assertEqual(decoded, default)
+
+    def test_unmatched_fips_reported(self):
+        response = self.client.get(self.url, {'county': '01001,00000', 'format': 'compact'})
+        json = response.json()
+        self.assertEqual(json['compact']['fips'], ['01001'])
+        self.assertEqual(json['errors']['no_county'], '00000')
+
+
+class PointSeriesCacheTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        call_command('load_random_data_set', stdout=out)
+        cls.data_set = Data_Set.objects.get()
+        cls.url = f'/api/chart/points/{cls.data_set.id}'
+
+    def setUp(self):
+        cache.clear()
+
+    def value(self):
+        return self.client.get(self.url, {'county': '01001'}).json()['config']['data'][0]['y']
+
+    def test_cached_until_version_changes(self):
+        before = self.value()
+        Data_Point.objects.filter(data_set=self.data_set, county__fips='001', county__state='AL') \
+            .update(value=before + 1)
+        self.assertEqual(self.value(), before)
+        # a bump by another process is seen here, although this process's cache still has the
+        # old series
+        Cache_Version.objects.filter(key=f'data_set:{self.data_set.id}').update(value=F('value') + 1)
+        self.assertEqual(self.value(), round(before + 1, 2))
+
+
+class CountyNamesTestCase(TestCase):
+
+    def test_names_keyed_by_fips(self):
+        response = self.client.get('/api/county/names/')
+        self.assertEqual(response.status_code, 200)
+        names = response.json()
+        self.assertEqual(names['47179'], 'Washington County')
+        self.assertIn('max-age', response['Cache-Control'])
+
+
+class PercentileRankTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        call_command('load_random_data_set', '--count=200', stdout=out)
+        cls.data_set = Data_Set.objects.get()
+        cls.url = f'/api/chart/rank/{cls.data_set.id}'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ranks_stored_points(self):
+        point = self.data_set.data_points.order_by('value')[100]
+        ranks = self.client.get(self.url, {'value': point.value}).json()['ranks']
+        # the point's stored rank is the first percentile at or above its value
+        self.assertLessEqual(ranks[0]['rank'], point.rank)
+        self.assertAlmostEqual(ranks[0]['rank'], point.rank, delta=0.01)
+
+    def test_many_values_keep_their_order(self):
+        response = self.client.get(self.url, {'value': ['0.7,0.1', '0.5']})
+        ranks = response.json()['ranks']
+        self.assertEqual([r['value'] for r in ranks], [0.7, 0.1, 0.5])
+        self.assertLess(ranks[1]['rank'], ranks[2]['rank'])
+        self.assertLess(ranks[2]['rank'], ranks[0]['rank'])
+
+    def test_cached_percentiles(self):
+        self.client.get(self.url, {'value': '0.5'})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'value': '0.6'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_requests(self):
+        for params in [{}, {'value': 'abc'}, {'value': 'nan'}, {'value': '0.5,inf'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 500)
+        self.assertEqual(self.client.get('/api/chart/rank/9999', {'value': '1'}).status_code, 500)
+
+
+class SparklineTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        indicator = Health_Indicator.objects.create(name='Sparkline Indicator')
+        cls.data_set = Data_Set.objects.create(indicator=indicator, year=2018)
+        Percentile.objects.bulk_create(
+            Percentile(data_set=cls.data_set, rank=r / 100, value=float(r)) for r in range(1, 100))
+        county = US_County.objects.get(state__short='TN', fips='179')
+        Data_Point.objects.create(data_set=cls.data_set, county=county, value=25.0, rank=0.25)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, query):
+        return self.client.get(f'/api/chart/sparkline/{self.data_set.id}.svg', query)
+
+    def test_svg(self):
+        response = self.get({'county': '47179', 'title': 'A & B'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        svg = response.content.decode('utf-8')
+        self.assertTrue(svg.startswith('<svg'))
+        self.assertIn('<title>A &amp; B</title>', svg)
+        self.assertEqual(svg.count('<circle'), 1)
+        # the curve is thinned out to about CURVE_POINTS points
+        points = svg.split('points="')[1].split('"')[0].split(' ')
+        self.assertLessEqual(len(points), sparkline.CURVE_POINTS + 1)
+
+    def test_state(self):
+        svg = self.get({'state': 'TN'}).content.decode('utf-8')
+        self.assertEqual(svg.count('<circle'), 1)
+
+    def test_cached(self):
+        self.get({'county': '47179'})
+        # only the data set's version is read
+        with self.assertNumQueries(1):
+            self.get({'county': '47179'})
+
+    def test_version_bumped_by_another_process(self):
+        first = self.get({'county': '47179'}).content
+        Data_Point.objects.filter(data_set=self.data_set).update(value=75.0, rank=0.75)
+        # as if another process had saved the data set: the version changes, but nothing is
+        # removed from this process's cache
+        Cache_Version.objects.filter(key=f'data_set:{self.data_set.id}').update(value=F('value') + 1)
+        self.assertNotEqual(self.get({'county': '47179'}).content, first)
+
+    def test_new_version_when_data_set_changes(self):
+        first = self.get({'county': '47179'}).content
+        Data_Point.objects.filter(data_set=self.data_set).update(value=75.0, rank=0.75)
+        self.data_set.save()
+        self.assertNotEqual(self.get({'county': '47179'}).content, first)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get({}).status_code, 400)
+        response = self.client.get('/api/chart/sparkline/999999.svg', {'county': '47179'})
+        self.assertEqual(response.status_code, 404)
+
+
+class SeriesBatchTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        call_command('load_random_data_set', '--year', '2017', stdout=out)
+        call_command('load_random_data_set', '--year', '2018', stdout=out)
+        cls.data_sets = list(Data_Set.objects.order_by('id'))
+
+    def get(self, query):
+        return self.client.get('/api/chart/batch', query)
+
+    def test_series_for_each_data_set(self):
+        ids = ','.join(str(d.id) for d in self.data_sets)
+        response = self.get({'data_sets': ids, 'county': '01001,01003'})
+        self.assertEqual(response.status_code, 200)
+        json = response.json()
+        self.assertEqual(set(json.keys()), {str(d.id) for d in self.data_sets})
+        for data_set in self.data_sets:
+            series = json[str(data_set.id)]
+            self.assertEqual(series['percentiles']['config']['type'], 'spline')
+            self.assertEqual(len(series['points']['config']['data']), 2)
+
+    def test_matches_individual_endpoints(self):
+        data_set = self.data_sets[0]
+        params = {'state': 'TN', 'format': 'compact'}
+        series = self.get(dict(params, data_sets=str(data_set.id))).json()[str(data_set.id)]
+        percentiles = self.client.get(f'/api/chart/percentiles/{data_set.id}/').json()
+        points = self.client.get(f'/api/chart/points/{data_set.id}', params).json()
+        self.assertEqual(series, {'percentiles': percentiles, 'points': points})
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get({'county': '01001'}).status_code, 500)
+        too_many = ','.join(str(self.data_sets[0].id) for _ in range(21))
+        self.assertEqual(self.get({'data_sets': too_many, 'county': '01001'}).status_code, 500)
+        self.assertEqual(self.get({'data_sets': '999999', 'county': '01001'}).status_code, 500)
+        self.assertEqual(self.get({'data_sets': str(self.data_sets[0].id)}).status_code, 500)
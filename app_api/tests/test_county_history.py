@@ -0,0 +1,58 @@
+from io import StringIO
+
+from django.test import TestCase
+from django.core.management import call_command
+
+from hda_privileged.models import Health_Indicator, Percentile
+
+
+class CountyHistoryTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        for year in (2016, 2018, 2017):
+            call_command('load_random_data_set', '--count=20', indicator='History A', year=year, stdout=out)
+        call_command('load_random_data_set', '--count=20', indicator='History B', year=2018, stdout=out)
+        cls.a = Health_Indicator.objects.get(name='History A')
+        cls.b = Health_Indicator.objects.get(name='History B')
+        # the random data sets use the first counties in the table
+        cls.fips = '01001'
+
+    def url(self, indicator):
+        return f'/api/county/{self.fips}/indicator/{indicator.id}/history'
+
+    def test_all_years_in_order(self):
+        json = self.client.get(self.url(self.a)).json()
+        history = json['indicators'][str(self.a.id)]['history']
+        self.assertEqual([h['year'] for h in history], [2016, 2017, 2018])
+        self.assertEqual(json['county']['name'], 'Autauga County')
+
+    def test_percentile_context(self):
+        json = self.client.get(self.url(self.a)).json()
+        for entry in json['indicators'][str(self.a.id)]['history']:
+            with self.subTest(year=entry['year']):
+                quartiles = entry['percentiles']
+                self.assertEqual(set(quartiles.keys()), {'25', '50', '75'})
+                self.assertLessEqual(quartiles['25'], quartiles['75'])
+
+    def test_data_set_without_percentiles(self):
+        Percentile.objects.filter(data_set__indicator=self.b).delete()
+        json = self.client.get(self.url(self.b)).json()
+        (entry,) = json['indicators'][str(self.b.id)]['history']
+        self.assertEqual(entry['year'], 2018)
+        self.assertIsNone(entry['percentiles'])
+
+    def test_several_indicators_in_one_query(self):
+        # one query for the county, one for all the history and one for its quartiles
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url(self.a), {'indicators': str(self.b.id)})
+        indicators = response.json()['indicators']
+        self.assertEqual(len(indicators[str(self.a.id)]['history']), 3)
+        self.assertEqual(len(indicators[str(self.b.id)]['history']), 1)
+        self.assertEqual(indicators[str(self.b.id)]['name'], 'History B')
+
+    def test_unknown_county(self):
+        self.fips = '00000'
+        response = self.client.get(self.url(self.a))
+        self.assertEqual(response.status_code, 500)
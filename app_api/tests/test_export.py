@@ -0,0 +1,97 @@
+import csv
+import gzip
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from hda_privileged.models import Data_Set
+from hda_privileged.tests import commit_hooks_run
+from app_api.util.export import EXPORT_COLUMNS, EXPORT_DIR
+
+
+class DataSetExportTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        call_command('load_random_data_set', '--count=50', stdout=out)
+        cls.data_set = Data_Set.objects.get()
+        cls.url = f'/api/data_set/{cls.data_set.id}/export.csv'
+
+    def setUp(self):
+        # re-read the data set, since one of the tests deletes it
+        self.data_set = Data_Set.objects.get()
+        # keep exported files out of the real media folder
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def read_rows(self, response, compressed=False):
+        content = b''.join(response.streaming_content)
+        if compressed:
+            content = gzip.decompress(content)
+        return list(csv.reader(StringIO(content.decode('utf-8'))))
+
+    def stored_exports(self):
+        if not default_storage.exists(EXPORT_DIR):
+            return []
+        return default_storage.listdir(EXPORT_DIR)[1]
+
+    def test_csv_export(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = self.read_rows(response)
+        self.assertEqual(tuple(rows[0]), EXPORT_COLUMNS)
+        self.assertEqual(len(rows) - 1, self.data_set.data_points.count())
+        self.assertEqual(len(rows[1][0]), 5)
+
+    def test_gzip_export(self):
+        response = self.client.get(self.url, {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = self.read_rows(response, compressed=True)
+        self.assertEqual(len(rows) - 1, self.data_set.data_points.count())
+
+    def test_repeat_download_uses_stored_export(self):
+        first = self.read_rows(self.client.get(self.url))
+        self.assertEqual(len(self.stored_exports()), 1)
+        # only the version and fingerprint queries, not the rows
+        with self.assertNumQueries(3):
+            second = self.read_rows(self.client.get(self.url))
+        self.assertEqual(first, second)
+
+    def test_changed_data_set_is_exported_again(self):
+        self.read_rows(self.client.get(self.url))
+        self.data_set.data_points.first().delete()
+        rows = self.read_rows(self.client.get(self.url))
+        self.assertEqual(len(rows) - 1, self.data_set.data_points.count())
+        # the export for the old contents is cleaned up
+        self.assertEqual(len(self.stored_exports()), 1)
+
+    def test_edited_point_is_exported_again(self):
+        self.read_rows(self.client.get(self.url))
+        point = self.data_set.data_points.order_by('county__state__fips', 'county__fips').first()
+        point.value = 12345.0
+        point.save()
+        rows = self.read_rows(self.client.get(self.url))
+        self.assertEqual(float(rows[1][3]), 12345.0)
+
+    def test_deleting_data_set_removes_exports(self):
+        self.read_rows(self.client.get(self.url))
+        with commit_hooks_run():
+            self.data_set.delete()
+            # not until the deletion is committed
+            self.assertEqual(len(self.stored_exports()), 1)
+        self.assertEqual(self.stored_exports(), [])
+
+    def test_missing_data_set(self):
+        response = self.client.get('/api/data_set/9999/export.csv')
+        self.assertEqual(response.status_code, 404)
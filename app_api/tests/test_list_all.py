@@ -0,0 +1,85 @@
+import gzip
+import json
+
+from django.test import TestCase
+
+from app_api.views.list_all import ListEndpoint
+from hda_privileged.models import US_County, US_State
+from hda_privileged.versions import bump_data_version
+
+
+class ListAllTestCase(TestCase):
+
+    def setUp(self):
+        # don't let payloads built by other test cases leak into these ones
+        ListEndpoint.payloads.clear()
+
+    def read_json(self, response):
+        if response.streaming:
+            return json.loads(b''.join(response.streaming_content))
+        return json.loads(response.content)
+
+    def test_complete_list(self):
+        response = self.client.get('/api/county/list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.read_json(response)['values']), US_County.objects.count())
+
+    def test_complete_list_is_precomputed(self):
+        self.client.get('/api/state/list/')
+        # only the data version is read
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/state/list/')
+        self.assertEqual(len(self.read_json(response)['values']), US_State.objects.count())
+
+    def test_gzipped_list(self):
+        response = self.client.get('/api/state/list/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        values = json.loads(gzip.decompress(response.content))['values']
+        self.assertEqual(len(values), US_State.objects.count())
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/state/list/')['ETag']
+        response = self.client.get('/api/state/list/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_geography_change_rebuilds_payload(self):
+        before = self.read_json(self.client.get('/api/state/list/'))['values']
+        US_State.objects.create(short='ZZ', full='Zedland', fips='99')
+        after = self.read_json(self.client.get('/api/state/list/'))['values']
+        self.assertEqual(len(after), len(before) + 1)
+
+    def test_change_in_another_process_rebuilds_payload(self):
+        before = self.read_json(self.client.get('/api/state/list/'))['values']
+        # as if another process had added the state: this process's payload is kept, but the
+        # data version changes
+        US_State.objects.bulk_create([US_State(short='ZZ', full='Zedland', fips='99')])
+        bump_data_version()
+        after = self.read_json(self.client.get('/api/state/list/'))['values']
+        self.assertEqual(len(after), len(before) + 1)
+
+    def test_filtered_list_is_streamed(self):
+        response = self.client.get('/api/county/list/', {'state': 'tn'})
+        self.assertTrue(response.streaming)
+        page = self.read_json(response)
+        self.assertEqual(len(page['values']), US_County.objects.filter(state='TN').count())
+        self.assertIsNone(page['next'])
+        self.assertNotIn('cursor', page['values'][0])
+
+    def test_cursor_pagination(self):
+        seen = []
+        params = {'state': 'VA', 'limit': 40}
+        while True:
+            page = self.read_json(self.client.get('/api/county/list/', params))
+            self.assertLessEqual(len(page['values']), 40)
+            seen.extend(v['fips5'] for v in page['values'])
+            if page['next'] is None:
+                break
+            params['after'] = page['next']
+
+        expected = US_County.objects.filter(state='VA').values_list('fips5', flat=True)
+        self.assertEqual(sorted(seen), sorted(expected))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_bad_cursor(self):
+        response = self.client.get('/api/county/list/', {'after': 'abc'})
+        self.assertEqual(response.status_code, 400)
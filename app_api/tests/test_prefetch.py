@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from app_api.util import prefetch, search
+from hda_privileged.models import US_County, US_State
+from hda_privileged.tests import commit_hooks_run
+
+
+class PrefetchDataTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(PREFETCH_DIR=self.directory)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory)
+        # forget the manifest from the temporary directory
+        prefetch._manifest = (None, None)
+
+    def generate(self):
+        out = StringIO()
+        call_command('generate_prefetch_data', stdout=out)
+        return out.getvalue()
+
+    def read(self, kind):
+        manifest = prefetch.read_manifest(self.directory)
+        with open(os.path.join(self.directory, manifest[kind]), encoding='utf-8') as fp:
+            return json.load(fp)
+
+    def test_hashed_files_and_gzip(self):
+        self.generate()
+        files = sorted(os.listdir(self.directory))
+        self.assertEqual(len(files), 5)
+        self.assertIn(prefetch.MANIFEST_NAME, files)
+        manifest = prefetch.read_manifest(self.directory)
+        self.assertIn(manifest['county'] + '.gz', files)
+
+    def test_unchanged_data_is_not_rewritten(self):
+        self.assertIn('(written)', self.generate())
+        output = self.generate()
+        self.assertNotIn('(written)', output)
+
+    # decoding the compact county data the same way typeahead_config.js does should give
+    # the same datums as the search suggestion endpoint
+    def test_compact_counties_decode_to_datums(self):
+        self.generate()
+        data = self.read('county')
+        decoded = []
+        for (fips5, name, state_index) in data['counties']:
+            (usps, state_name) = data['states'][state_index]
+            value = f"{name} {usps}"
+            decoded.append({
+                'id': fips5, 'value': value, 'tokens': value.split(' '), 'name': name, 'state': state_name
+            })
+        query = US_County.objects.select_related('state').order_by('state', 'name')
+        self.assertEqual(decoded, [search.datum_for_county(c) for c in query])
+
+    def test_geography_change_rebuilds_after_commit(self):
+        self.generate()
+        before = prefetch.prefetch_static_path('state')
+        with commit_hooks_run():
+            US_State.objects.create(short='ZZ', full='Zedland', fips='99')
+            self.assertEqual(prefetch.prefetch_static_path('state'), before)
+        after = prefetch.prefetch_static_path('state')
+        self.assertNotEqual(before, after)
+        self.assertIn('Zedland', self.read('state'))
+        # pages rendered (or cached) by other processes may still link to the old file
+        old_file = os.path.join(self.directory, before[len(prefetch.STATIC_PREFIX):])
+        self.assertTrue(os.path.exists(old_file))
+        self.assertTrue(os.path.exists(old_file + '.gz'))
+
+        # until it has been out of the manifest for the grace period
+        later = time.time() + prefetch.RETIRED_FILE_GRACE + 1
+        prefetch.retire_files(self.directory, [], prefetch.read_manifest(self.directory), now=later)
+        self.assertFalse(os.path.exists(old_file))
+        self.assertFalse(os.path.exists(old_file + '.gz'))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, after[len(prefetch.STATIC_PREFIX):])))
+
+    def test_pages_only_read_the_manifest(self):
+        # nothing has been generated in the (empty) prefetch directory, and rendering a page
+        # doesn't generate it
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'county: ""')
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_pages_link_to_hashed_files(self):
+        self.generate()
+        response = self.client.get('/')
+        manifest = prefetch.read_manifest(self.directory)
+        self.assertContains(response, manifest['county'])
+        self.assertContains(response, manifest['state'])
@@ -0,0 +1,54 @@
+from django.test import TestCase, override_settings
+
+from app_api.util.search_backends import (
+    SimpleSearchBackend,
+    TrigramSearchBackend,
+    get_search_backend,
+)
+from app_api.views.search import Suggestions
+from hda_privileged.models import US_County
+
+
+class SearchBackendTestCase(TestCase):
+
+    def test_memory_by_default(self):
+        self.assertIsInstance(get_search_backend(), SimpleSearchBackend)
+        self.assertNotIsInstance(get_search_backend(), TrigramSearchBackend)
+
+    # trigram search needs PostgreSQL; our tests run on SQLite, where we should fall back
+    @override_settings(SEARCH_BACKEND='database')
+    def test_fallback_when_not_postgres(self):
+        self.assertNotIsInstance(get_search_backend(), TrigramSearchBackend)
+
+    # the trigram index is on the bare column; icontains would compare UPPER(name) instead
+    def test_trigram_substring_match_uses_bare_column(self):
+        sql = str(US_County.objects.filter(name__trigram_icontains='wash').query)
+        self.assertIn('"hda_privileged_us_county"."name" ILIKE', sql)
+        self.assertNotIn('UPPER', sql)
+
+    def test_simple_search_order(self):
+        counties = list(SimpleSearchBackend().search_counties('washington'))
+        states = [c.state_id for c in counties]
+        self.assertEqual(states, sorted(states))
+        self.assertTrue(all('washington' in c.search_str.lower() for c in counties))
+
+    @override_settings(SEARCH_BACKEND='database')
+    def test_database_suggestions_match_memory_suggestions(self):
+        Suggestions.indexes.clear()
+        for query in ['mont', 'lake', 'st. l', 'Montgomry', 'St Louis']:
+            with self.subTest(query=query):
+                from_database = self.client.get(f'/api/search/suggestions/county/{query}').json()
+                with self.settings(SEARCH_BACKEND='memory'):
+                    from_memory = self.client.get(f'/api/search/suggestions/county/{query}').json()
+                self.assertEqual(from_database, from_memory)
+
+    @override_settings(SEARCH_BACKEND='database')
+    def test_database_suggestions_query_database(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/search/suggestions/county/mont')
+        self.assertEqual(len(response.json()), 5)
+
+    def test_simple_fuzzy_counties(self):
+        counties = SimpleSearchBackend().fuzzy_counties('Jeferson', 3)
+        self.assertEqual(len(counties), 3)
+        self.assertTrue(all(c.name.startswith('Jefferson') for c in counties))
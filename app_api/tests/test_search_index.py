@@ -0,0 +1,122 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from app_api.util.search_index import FUZZY_BATCH, SearchIndex, normalize, substring_distance, top_k
+from app_api.views.search import Suggestions
+from hda_privileged.models import US_County, US_State
+
+
+class SearchIndexTestCase(TestCase):
+
+    def setUp(self):
+        words = ['Montgomery', 'Monty', 'Lamont', 'Clay', 'Clayton', 'McClay']
+        self.index = SearchIndex((w, w) for w in words)
+
+    def test_substring(self):
+        self.assertEqual(self.index.contains('mont'), ['Montgomery', 'Monty', 'Lamont'])
+        self.assertEqual(self.index.contains('clay'), ['Clay', 'Clayton', 'McClay'])
+
+    def test_short_substring(self):
+        self.assertEqual(self.index.contains('y'), ['Montgomery', 'Monty', 'Clay', 'Clayton', 'McClay'])
+
+    # every trigram of 'bcdbcd' is in 'abcdbc', but the query is not
+    def test_trigrams_out_of_order(self):
+        index = SearchIndex([('abcdbc', 'abcdbc')])
+        self.assertEqual(index.contains('bcdbcd'), [])
+        self.assertEqual(index.contains('bcdbc'), ['abcdbc'])
+
+    def test_prefix(self):
+        self.assertEqual(self.index.starts_with('CLAY'), ['Clay', 'Clayton'])
+        self.assertEqual(self.index.starts_with('zz'), [])
+
+    def test_normalize(self):
+        self.assertEqual(normalize('St. Louis'), 'st louis')
+        self.assertEqual(normalize('  Miami-Dade '), 'miami dade')
+        self.assertEqual(normalize('Doña Ana'), 'dona ana')
+
+    def test_substring_distance(self):
+        self.assertEqual(substring_distance('gomery', 'montgomery', 2), 0)
+        self.assertEqual(substring_distance('montgomry', 'montgomery', 2), 1)
+        self.assertEqual(substring_distance('mnotgomery', 'montgomery', 2), 1)
+        self.assertEqual(substring_distance('xyzzy', 'montgomery', 2), 3)
+
+    def test_fuzzy(self):
+        self.assertEqual(self.index.fuzzy('Montgomry', 5), ['Montgomery'])
+        self.assertEqual(self.index.fuzzy('Cleyton', 5), ['Clayton'])
+        # closest first, then shortest
+        self.assertEqual(self.index.fuzzy('clayy', 5), ['Clay', 'McClay', 'Clayton'])
+        # too short to guess at
+        self.assertEqual(self.index.fuzzy('cly', 5), [])
+
+    # even with no time to spare, the most promising candidates are compared
+    def test_fuzzy_out_of_time(self):
+        self.assertEqual(self.index.fuzzy('Montgomry', 5, budget=0), ['Montgomery'])
+
+    # the clock starts before the candidates are counted, so slow counting uses up the budget
+    def test_fuzzy_budget_includes_counting(self):
+        names = [f'Montgomery {i:03d}' for i in range(FUZZY_BATCH * 2)]
+        index = SearchIndex((name, name) for name in names)
+        self.assertEqual(len(index.fuzzy('Montgomry', len(names))), len(names))
+
+        clock = [0.0]
+
+        class SlowPostings(dict):
+            def get(self, *args):
+                clock[0] += 1.0
+                return super().get(*args)
+
+        index.fuzzy_postings = SlowPostings(index.fuzzy_postings)
+        with patch('app_api.util.search_index.time.monotonic', lambda: clock[0]):
+            matches = index.fuzzy('Montgomry', len(names), budget=0.5)
+        # only the first batch is compared
+        self.assertEqual(len(matches), FUZZY_BATCH)
+
+    def test_top_k_is_stable(self):
+        items = ['bb', 'a', 'cc', 'd', 'eee']
+        self.assertEqual(top_k(items, 3, key=len), ['a', 'd', 'bb'])
+
+
+class SuggestionsTestCase(TestCase):
+
+    def setUp(self):
+        Suggestions.indexes.clear()
+
+    # the index should find the same counties as the database
+    def test_counties_match_database(self):
+        for query in ['mont', 'wash', 'st. l', 'ar', 'x', 'county tn', 'zzz']:
+            with self.subTest(query=query):
+                db_matches = US_County.objects.filter(search_str__icontains=query)
+                index_matches = self.client.get(f'/api/search/suggestions/county/{query}').json()
+                expected = sorted(db_matches.iterator(), key=lambda c: len(c.search_str))[:5]
+                self.assertEqual([d['id'] for d in index_matches], [c.fips5 for c in expected])
+
+    def test_states(self):
+        response = self.client.get('/api/search/suggestions/state/new')
+        self.assertEqual(response.json(), ['New York', 'New Jersey', 'New Mexico', 'New Hampshire'])
+
+    def test_typos(self):
+        suggestions = self.client.get('/api/search/suggestions/county/Montgomry').json()
+        self.assertEqual(len(suggestions), Suggestions.limit)
+        self.assertTrue(all(d['name'] == 'Montgomery County' for d in suggestions))
+
+        suggestions = self.client.get('/api/search/suggestions/county/St Louis').json()
+        self.assertEqual(
+            [d['value'] for d in suggestions],
+            ['St. Louis city MO', 'St. Louis County MN', 'St. Louis County MO']
+        )
+
+    def test_exact_matches_come_first(self):
+        suggestions = self.client.get('/api/search/suggestions/state/virgina').json()
+        self.assertEqual(suggestions, ['Virginia', 'West Virginia', 'U.S. Virgin Islands'])
+
+    def test_no_database_access(self):
+        self.client.get('/api/search/suggestions/county/mont')
+        with self.assertNumQueries(0):
+            self.client.get('/api/search/suggestions/county/wash')
+
+    def test_geography_change_rebuilds_index(self):
+        self.client.get('/api/search/suggestions/state/zed')
+        US_State.objects.create(short='ZZ', full='Zedland', fips='99')
+        response = self.client.get('/api/search/suggestions/state/zed')
+        self.assertEqual(response.json(), ['Zedland'])
@@ -1,21 +1,37 @@
-from django.urls import path
+from django.urls import path, register_converter
 
 import app_api.views.county as county
 import app_api.views.state as state
 
 from app_api.views.search import StateSuggestions, CountySuggestions
-from app_api.views.chart import PercentileSeries, PointSeries
+from app_api.views.chart import PercentileSeries, PointSeries, PercentileRank, SeriesBatch, Sparkline
+from app_api.views.export import DataSetExport
+from hda_public.converters import FIPS5Converter
+
+# matches 5-digit county FIPS codes
+register_converter(FIPS5Converter, 'fips5')
 
 
 app_name = 'api'
 urlpatterns = [
     # entities
     path('county/list/', county.ListAll.as_view()),
+    path('county/names/', county.Names.as_view(), name='county_names'),
     path('state/list/', state.ListAll.as_view()),
+    path('county/<fips5:fips>/indicator/<int:indicator_id>/history',
+         county.History.as_view(), name='county_history'),
     # search suggestions
     path('search/suggestions/state/<str:query>', StateSuggestions.as_view(), name='suggest_state'),
     path('search/suggestions/county/<str:query>', CountySuggestions.as_view(), name='suggest_county'),
     # async chart series
     path('chart/percentiles/<int:data_set_id>/', PercentileSeries.as_view(), name='chart_percentiles'),
     path('chart/points/<int:data_set_id>', PointSeries.as_view(), name='chart_points'),
+    # both series, for several charts at once
+    path('chart/batch', SeriesBatch.as_view(), name='chart_batch'),
+    # static SVG previews of charts
+    path('chart/sparkline/<int:data_set_id>.svg', Sparkline.as_view(), name='chart_sparkline'),
+    # where arbitrary values would rank in a data set
+    path('chart/rank/<int:data_set_id>', PercentileRank.as_view(), name='chart_rank'),
+    # bulk downloads
+    path('data_set/<int:data_set_id>/export.csv', DataSetExport.as_view(), name='data_set_export'),
 ]
\ No newline at end of file
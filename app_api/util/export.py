@@ -0,0 +1,154 @@
+# Streaming CSV export of data sets.
+#
+# The first download of a data set streams rows straight out of the database, while also
+# gzipping them into a temporary file; once the last row has been sent, that file is saved
+# (using Django's default file storage) as the cached "artifact" for the data set. Later
+# downloads stream the artifact instead of querying the database again.
+#
+# Artifact names include the data set's version (see hda_privileged/versions.py), which changes
+# when a point is edited, and a fingerprint of its points (how many there are, and the largest
+# point ID), which changes when points are added or removed in bulk, without signals. Either way
+# the new contents get a new artifact name, rather than serving stale data.
+#
+# Memory use is flat: rows are fetched with QuerySet.iterator (which uses a server-side cursor
+# on PostgreSQL), and only a batch of rows or a block of the artifact is held at a time.
+
+import csv
+import gzip
+import tempfile
+import zlib
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+
+from hda_privileged.versions import data_set_version
+
+EXPORT_DIR = 'exports'
+EXPORT_COLUMNS = ('fips5', 'county', 'state', 'value', 'rank')
+
+# how many CSV rows to join together into one chunk of the response
+ROWS_PER_CHUNK = 500
+# how many bytes to read from a stored artifact at a time
+BLOCK_SIZE = 64 * 1024
+
+
+class Echo:
+    """
+    A file-like object that just returns what is written to it, so that csv.writer can
+    produce strings for a streaming response. From the Django docs:
+    https://docs.djangoproject.com/en/2.1/howto/outputting-csv/#streaming-large-csv-files
+    """
+    def write(self, value):
+        return value
+
+
+def artifact_prefix(data_set_id):
+    return f"{EXPORT_DIR}/data_set_{data_set_id}-"
+
+
+def artifact_name(data_set):
+    """
+    Returns the storage name of the cached export for the current contents of a data set.
+
+    :param data_set: the data set being exported
+    :type data_set: Data_Set
+    :rtype: str
+    """
+    version = data_set_version(data_set.id)
+    fingerprint = data_set.data_points.aggregate(count=Count('id'), last=Max('id'))
+    return f"{artifact_prefix(data_set.id)}{version}-{fingerprint['count']}-{fingerprint['last']}.csv.gz"
+
+
+def export_rows(data_set):
+    """
+    Generates a CSV header, then one (fips5, county, state, value, rank) tuple per data point
+    """
+    yield EXPORT_COLUMNS
+    query = data_set.data_points \
+        .order_by('county__state__fips', 'county__fips') \
+        .values_list('county__state__fips', 'county__fips', 'county__name',
+                     'county__state__short', 'value', 'rank')
+    for (state_fips, county_fips, county, state, value, rank) in query.iterator(chunk_size=2000):
+        yield (state_fips + county_fips, county, state, value, rank)
+
+
+def csv_chunks(rows):
+    """
+    Formats rows as CSV, generating UTF-8 encoded chunks of ROWS_PER_CHUNK rows each
+    """
+    writer = csv.writer(Echo())
+    batch = []
+    for row in rows:
+        batch.append(writer.writerow(row))
+        if len(batch) == ROWS_PER_CHUNK:
+            yield ''.join(batch).encode('utf-8')
+            batch = []
+    if batch:
+        yield ''.join(batch).encode('utf-8')
+
+
+def remove_artifacts(data_set_id, keep=None):
+    """
+    Deletes stored exports for a data set, except for the one named `keep`
+    """
+    if not default_storage.exists(EXPORT_DIR):
+        return
+    (_, filenames) = default_storage.listdir(EXPORT_DIR)
+    for filename in filenames:
+        name = f"{EXPORT_DIR}/{filename}"
+        if name.startswith(artifact_prefix(data_set_id)) and name != keep:
+            default_storage.delete(name)
+
+
+def export_and_store(data_set, name, compress):
+    """
+    Streams a fresh export of the data set, saving a gzipped copy under `name` once the
+    whole export has been generated. Yields gzipped bytes if `compress` is True, else CSV.
+    """
+    # wbits=31 makes zlib write the gzip format, so the output matches gzip.open
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    with tempfile.TemporaryFile() as artifact:
+        for chunk in csv_chunks(export_rows(data_set)):
+            packed = compressor.compress(chunk)
+            artifact.write(packed)
+            yield packed if compress else chunk
+        tail = compressor.flush()
+        artifact.write(tail)
+        if compress:
+            yield tail
+        # if the client went away part way through, we never get here, and nothing is saved
+        artifact.seek(0)
+        if not default_storage.exists(name):
+            default_storage.save(name, File(artifact))
+    remove_artifacts(data_set.id, keep=name)
+
+
+def read_stored(name, compress):
+    """
+    Streams a stored export, decompressing it on the way out unless `compress` is True
+    """
+    with default_storage.open(name, 'rb') as stored:
+        source = stored if compress else gzip.GzipFile(fileobj=stored)
+        block = source.read(BLOCK_SIZE)
+        while block:
+            yield block
+            block = source.read(BLOCK_SIZE)
+
+
+def export_data_set(data_set, compress=False):
+    """
+    Returns a generator of the bytes of a CSV export of the data set, gzipped if `compress`
+    is True. Uses the stored export for the data set if there is an up-to-date one.
+
+    :param data_set: the data set to export
+    :type data_set: Data_Set
+    :param compress: whether to gzip the generated bytes
+    :type compress: bool
+    :rtype: generator<bytes>
+    """
+    name = artifact_name(data_set)
+    if default_storage.exists(name):
+        return read_stored(name, compress)
+    else:
+        return export_and_store(data_set, name, compress)
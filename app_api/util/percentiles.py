@@ -0,0 +1,51 @@
+# Cached copies of each data set's percentile values, so that requests which only need the
+# percentile curve of a data set (and not its points) don't have to query the database.
+#
+# The percentiles of a data set are only written once, when it is uploaded, so the cached copy
+# is valid until the data set is deleted (see app_api/signals.py) - even if it is only marked as
+# deleted, and waiting to be purged.
+
+from django.core.cache import cache
+
+from hda_privileged.models import Data_Set, Percentile
+
+# a data set has 999 percentiles, so this is ~16 KB per data set
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def cache_key(data_set_id):
+    return f"percentiles:{data_set_id}"
+
+
+def percentile_arrays(data_set_id):
+    """
+    Returns two lists for a data set: its percentile ranks in ascending order, and the value at
+    each of those percentiles. Both are empty if the data set doesn't exist (or has been deleted)
+    or has no percentiles.
+
+    :param data_set_id: primary key of a Data_Set
+    :type data_set_id: int
+    :rtype: (List<float>, List<float>)
+    """
+    key = cache_key(data_set_id)
+    arrays = cache.get(key)
+    if arrays is None:
+        rows = Percentile.objects \
+            .filter(data_set=data_set_id, data_set__status=Data_Set.LIVE) \
+            .order_by('rank') \
+            .values_list('rank', 'value')
+        ranks = []
+        values = []
+        for (rank, value) in rows.iterator():
+            ranks.append(rank)
+            values.append(value)
+        arrays = (ranks, values)
+        # A data set is saved before its percentiles are calculated; don't cache the empty
+        # result if we happen to be asked about it in between
+        if ranks:
+            cache.set(key, arrays, CACHE_TIMEOUT)
+    return arrays
+
+
+def forget_percentiles(data_set_id):
+    cache.delete(cache_key(data_set_id))
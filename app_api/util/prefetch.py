@@ -0,0 +1,202 @@
+# Generates the prefetch data files that typeahead.js's Bloodhound downloads once, so it can
+# suggest states and counties without asking the server on every keystroke.
+#
+# County prefetch data uses a compact format: each state's USPS code and name is listed once,
+# and each county is a [fips5, name, state index] triple. The search tokens and display value
+# that Bloodhound needs are derived from these in the browser (see static/js/typeahead_config.js):
+#
+#     {"states": [["AL", "Alabama"], ...], "counties": [["01001", "Autauga County", 0], ...]}
+#
+# State prefetch data is just a list of state names.
+#
+# Each file is named after a hash of its contents (e.g. county.0123456789ab.json), so a web
+# server can tell browsers to cache it forever; a gzipped copy (.json.gz) is written next to it
+# for servers that can send precompressed files (e.g. nginx's gzip_static). A manifest in the
+# same directory maps each kind of data to its current file name, and is what templates use to
+# find the files (see hda_public/templatetags/prefetch.py).
+#
+# Files are only rewritten if their contents change. They are built by the
+# generate_prefetch_data command, and again whenever the geography changes (see
+# app_api/signals.py) - never while a page is being rendered: the template tag only reads the
+# manifest. Other processes (and cached pages) may still link to the files the manifest named
+# before, so replaced files are kept for RETIRED_FILE_GRACE seconds before they are removed.
+
+import gzip
+import hashlib
+import json
+import os
+import time
+
+from django.conf import settings
+
+from app_api.util import search
+from hda_privileged.models import US_County, US_State
+
+MANIFEST_NAME = 'manifest.json'
+
+# the prefix of the prefetch directory's path, relative to the static files root
+STATIC_PREFIX = 'prefetch/'
+
+# how long to keep files that are no longer in the manifest; longer than pages are cached for
+RETIRED_FILE_GRACE = 60 * 60 * 24
+
+# the manifest most recently read by this process, and the (inode, modification time) of its
+# file; the manifest is replaced by renaming a new file over it, which changes both
+_manifest = (None, None)
+
+
+def county_data():
+    states = list(US_State.objects.order_by('full').values_list('short', 'full'))
+    state_index = {short: i for (i, (short, _)) in enumerate(states)}
+    query = US_County.objects.order_by('state', 'name').values_list('fips5', 'name', 'state')
+    counties = [[fips5, name, state_index[state]] for (fips5, name, state) in query.iterator()]
+    return {
+        'states': [list(s) for s in states],
+        'counties': counties,
+    }
+
+
+def state_data():
+    query = US_State.objects.all().order_by('full')
+    data = [search.datum_for_state(obj) for obj in query.iterator()]
+    return data
+
+
+PREFETCH_KINDS = {
+    'county': county_data,
+    'state': state_data,
+}
+
+
+def prefetch_directory():
+    return settings.PREFETCH_DIR
+
+
+def serialize(data, pretty=False):
+    if pretty:
+        text = json.dumps(data, indent=2, separators=(',', ': '), sort_keys=True, ensure_ascii=False)
+    else:
+        text = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+    return text.encode('utf-8')
+
+
+def write_prefetch(kind, directory, pretty=False):
+    """
+    Writes the prefetch data file (and its gzipped copy) for one kind of data, unless a file
+    with the same contents already exists.
+
+    :param kind: a key of PREFETCH_KINDS
+    :type kind: str
+    :param directory: folder to write the files to
+    :type directory: str
+    :return: the name of the data file, and whether it was written
+    :rtype: (str, bool)
+    """
+    content = serialize(PREFETCH_KINDS[kind](), pretty)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    filename = f"{kind}.{digest}.json"
+    path = os.path.join(directory, filename)
+
+    written = not os.path.exists(path)
+    if written:
+        os.makedirs(directory, exist_ok=True)
+        with open(path + '.gz', 'wb') as fp:
+            # mtime=0 so the same data always produces the same bytes
+            with gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=fp, mtime=0) as gz:
+                gz.write(content)
+        with open(path, 'wb') as fp:
+            fp.write(content)
+
+    return (filename, written)
+
+
+def retire_files(directory, retired, manifest, now=None):
+    """
+    Marks the files that were just replaced in the manifest with the time they were replaced
+    (as their modification time), and removes files that were replaced more than
+    RETIRED_FILE_GRACE seconds ago.
+
+    :param retired: names of the data files that the previous manifest listed
+    :param manifest: the new manifest
+    """
+    now = now or time.time()
+    current = set()
+    for filename in manifest.values():
+        current.update((filename, filename + '.gz'))
+
+    for filename in retired:
+        for name in (filename, filename + '.gz'):
+            path = os.path.join(directory, name)
+            if name not in current and os.path.exists(path):
+                os.utime(path, (now, now))
+
+    for name in os.listdir(directory):
+        kind = name.split('.', 1)[0]
+        if kind not in PREFETCH_KINDS or name in current:
+            continue
+        path = os.path.join(directory, name)
+        if os.path.getmtime(path) < now - RETIRED_FILE_GRACE:
+            os.remove(path)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def build_prefetch(directory=None, pretty=False):
+    """
+    Makes sure every kind of prefetch data is up to date, and rewrites the manifest if any of
+    the file names changed. Files replaced more than RETIRED_FILE_GRACE seconds ago are removed.
+
+    :return: the manifest, mapping each kind of data to its file name, and the list of kinds
+        whose files were rewritten
+    :rtype: (dict<str, str>, List<str>)
+    """
+    directory = directory or prefetch_directory()
+
+    manifest = dict()
+    changed = []
+    for kind in PREFETCH_KINDS:
+        (filename, written) = write_prefetch(kind, directory, pretty)
+        manifest[kind] = filename
+        if written:
+            changed.append(kind)
+
+    previous = read_manifest(directory) or {}
+    if manifest != previous:
+        # write the new manifest next to the old one and rename it over the old one, so readers
+        # never see a half-written manifest
+        path = os.path.join(directory, MANIFEST_NAME)
+        with open(path + '.tmp', 'w', encoding='utf-8') as fp:
+            json.dump(manifest, fp, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    retire_files(directory, previous.values(), manifest)
+    return (manifest, changed)
+
+
+def prefetch_static_path(kind):
+    """
+    Returns the path of the current prefetch file for a kind of data, relative to the static
+    files root (e.g. 'prefetch/county.0123456789ab.json'), or None if there is no manifest
+    (run the generate_prefetch_data command). Only reads the manifest, and only when its file
+    has changed since it was last read.
+    """
+    global _manifest
+    path = os.path.join(prefetch_directory(), MANIFEST_NAME)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    identity = (stat.st_ino, stat.st_mtime_ns)
+    (manifest, read_from) = _manifest
+    if manifest is None or read_from != identity:
+        manifest = read_manifest(prefetch_directory())
+        _manifest = (manifest, identity)
+    if not manifest or kind not in manifest:
+        return None
+    return STATIC_PREFIX + manifest[kind]
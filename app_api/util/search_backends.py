@@ -0,0 +1,154 @@
+# Database search backends for finding counties by name.
+#
+# By default, search suggestions are answered from an in-memory index in each process (see
+# search_index.py). Deployments that would rather have the database own search - e.g. several
+# app servers that don't share a warm cache - can set SEARCH_BACKEND = 'database' in settings.
+#
+# On PostgreSQL the database backend uses the pg_trgm extension, whose GIN index on county names
+# (created by migration hda_privileged 0012) speeds up both substring matching and similarity
+# ranking: https://www.postgresql.org/docs/current/pgtrgm.html
+# The index is on the bare name column, so substrings are matched with ILIKE (see
+# TrigramIContains): Django's icontains compares UPPER(name), which the index can't answer.
+# On other databases (i.e. SQLite in development) it falls back to plain substring matching,
+# plus a typo-tolerant search of an in-memory index of county names when nothing matches.
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, Q
+from django.db.models.lookups import IContains
+
+from hda_privileged.geography import get_geography
+from hda_privileged.models import US_County
+
+from app_api.util.search_index import FUZZY_BUDGET, top_k
+
+MEMORY = 'memory'
+DATABASE = 'database'
+
+
+def fuzzy_budget():
+    """
+    :return: how many seconds a typo-tolerant search may take (see SearchIndex.fuzzy)
+    :rtype: float
+    """
+    return getattr(settings, 'SEARCH_FUZZY_BUDGET', FUZZY_BUDGET)
+
+
+class SimpleSearchBackend:
+    """
+    Finds counties whose search string ("<name> <USPS>") contains the query, in any database.
+    """
+
+    def filter_counties(self, query):
+        """
+        :return: every county matching the query
+        :rtype: QuerySet<US_County>
+        """
+        return US_County.objects.filter(search_str__icontains=query)
+
+    def search_counties(self, query):
+        """
+        Finds counties for a page of search results. Orders results first by state, then by name.
+        This does not put the most relevant result first, but groups results from the same state
+        together, which may make them easier to scan through.
+
+        :rtype: QuerySet<US_County>
+        """
+        return self.filter_counties(query).order_by('state', 'name')
+
+    def suggest_counties(self, query, limit):
+        """
+        Finds the best few counties to suggest while someone is typing the query,
+        preferring counties with shorter names.
+
+        :rtype: List<US_County>
+        """
+        matches = self.filter_counties(query).select_related('state')
+        return top_k(matches.iterator(), limit, key=lambda c: len(c.search_str))
+
+    def fuzzy_counties(self, query, limit):
+        """
+        Finds up to `limit` counties whose names are within a typo or two of the query,
+        e.g. "Montgomry" or "St Louis" (for "St. Louis"), closest first.
+        Used when searching for the query as it was typed finds too little.
+
+        :rtype: List<US_County>
+        """
+        # the same in-memory index that suggestions are answered from
+        from app_api.views.search import CountySuggestions
+        datums = CountySuggestions().get_index().fuzzy(query, limit, fuzzy_budget())
+        geography = get_geography()
+        records = [geography.county(datum['id']) for datum in datums]
+        pks = [record.id for record in records if record is not None]
+        counties = US_County.objects.select_related('state').in_bulk(pks)
+        return [counties[pk] for pk in pks if pk in counties]
+
+
+@CharField.register_lookup
+class TrigramIContains(IContains):
+    """
+    Case-insensitive substring match written as `column ILIKE '%query%'` (PostgreSQL only),
+    which a gin_trgm_ops index on the column can answer.
+    """
+    lookup_name = 'trigram_icontains'
+
+    def get_rhs_op(self, connection, rhs):
+        return f"ILIKE {rhs}"
+
+
+class TrigramSearchBackend(SimpleSearchBackend):
+    """
+    Finds counties on PostgreSQL using pg_trgm: counties whose names contain the query or are
+    similar to it (so small typos still match), ordered by how similar the name is to the query.
+
+    If the last word of the query is two letters long, it may be a state's USPS code
+    (e.g. "Washington TN"), so counties with that state and a name matching the rest of the
+    query are included too.
+    """
+
+    def filter_counties(self, query):
+        # only available with django.contrib.postgres installed (see settings.py)
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        name_query = query
+        matches = Q(name__trigram_icontains=query) | Q(name__trigram_similar=query)
+
+        words = query.split()
+        if len(words) > 1 and len(words[-1]) == 2:
+            name_query = ' '.join(words[:-1])
+            in_state = Q(state__short__iexact=words[-1])
+            matches |= in_state & (Q(name__trigram_icontains=name_query) | Q(name__trigram_similar=name_query))
+
+        return US_County.objects \
+            .filter(matches) \
+            .annotate(similarity=TrigramSimilarity('name', name_query))
+
+    def search_counties(self, query):
+        return self.filter_counties(query).order_by('-similarity', 'state', 'name')
+
+    def suggest_counties(self, query, limit):
+        matches = self.filter_counties(query).select_related('state')
+        return list(matches.order_by('-similarity', 'name')[:limit])
+
+    def fuzzy_counties(self, query, limit):
+        # similar names already match, and this backend keeps nothing in memory
+        return []
+
+
+def uses_database_search():
+    """
+    :return: whether search suggestions should come from the database instead of memory
+    :rtype: bool
+    """
+    return getattr(settings, 'SEARCH_BACKEND', MEMORY) == DATABASE
+
+
+def get_search_backend():
+    """
+    :return: the trigram search backend if it is configured and we are running on PostgreSQL,
+        otherwise the simple backend
+    :rtype: SimpleSearchBackend
+    """
+    if uses_database_search() and connection.vendor == 'postgresql':
+        return TrigramSearchBackend()
+    return SimpleSearchBackend()
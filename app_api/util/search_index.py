@@ -0,0 +1,226 @@
+# A small in-memory search index, for answering autocomplete requests without the database.
+#
+# There are only a few thousand counties and states, and they (practically) never change, so
+# each process can afford to keep every name in memory along with an inverted index of the
+# n-grams (substrings of length 1 to MAX_GRAM) in those names. A substring search then only has
+# to look at the names that contain every n-gram of the query, and a prefix search is a binary
+# search of the sorted names.
+#
+# Matching is case-insensitive, like the `icontains` lookups this replaces.
+#  ~ see https://en.wikipedia.org/wiki/N-gram#n-grams_for_approximate_matching
+#
+# The same trigrams (of normalized names, see `normalize`) are used to find names that are
+# close to a query with typos in it: a name within k edits of the query has to share all but
+# 3k of the query's trigrams, so only names sharing trigrams with the query are compared to it.
+#  ~ see Ukkonen, "Approximate string-matching with q-grams and maximal matches" (1992)
+
+import heapq
+import re
+import time
+import unicodedata
+
+from bisect import bisect_left
+from collections import Counter
+
+MAX_GRAM = 3
+
+# queries shorter than this are too short to guess what was meant
+FUZZY_MIN_LENGTH = 4
+
+# how long a fuzzy search may take, by default, in seconds
+FUZZY_BUDGET = 0.05
+
+# how many candidates to compare between checks of the clock
+FUZZY_BATCH = 64
+
+
+def ngrams(text, n):
+    """
+    Returns the set of every substring of length n in text
+    """
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def normalize(text):
+    """
+    Lower-cases text and removes what people tend to leave out when typing a place name:
+    accents ("Doña Ana" -> "dona ana"), punctuation ("St. Louis" -> "st louis"), hyphens
+    ("Miami-Dade" -> "miami dade") and extra spaces.
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'[-/]', ' ', text)
+    text = re.sub(r'[^\w\s]', '', text)
+    return ' '.join(text.split())
+
+
+def fuzzy_distance_limit(query):
+    """
+    :return: how many typos to allow in a query: one in short queries, two in longer ones
+    :rtype: int
+    """
+    return 1 if len(query) < 8 else 2
+
+
+def substring_distance(query, text, limit):
+    """
+    Returns the fewest edits (inserting, deleting or replacing a letter, or swapping two
+    adjacent letters) that turn the query into some substring of text, or limit + 1 if
+    that takes more than limit edits.
+
+    This is the usual edit distance table, except that the first row is all zeros, so the
+    match may start anywhere in the text, and the answer is the smallest value in the last row,
+    so it may end anywhere.
+     ~ see https://en.wikipedia.org/wiki/Approximate_string_matching
+    """
+    width = len(text) + 1
+    before = None
+    row = [0] * width
+    for i in range(1, len(query) + 1):
+        letter = query[i - 1]
+        current = [i] * width
+        for j in range(1, width):
+            cost = 0 if letter == text[j - 1] else 1
+            best = min(row[j] + 1, current[j - 1] + 1, row[j - 1] + cost)
+            # swapped letters
+            if before is not None and j > 1 and letter == text[j - 2] and query[i - 2] == text[j - 1]:
+                best = min(best, before[j - 2] + 1)
+            current[j] = best
+        # the distances only grow from here on (a swap can reach back one more row)
+        if min(current) > limit and min(row) >= limit:
+            return limit + 1
+        (before, row) = (row, current)
+    return min(min(row), limit + 1)
+
+
+class SearchIndex:
+    """
+    Indexes a collection of (key, item) pairs by their string keys, so that items can be looked
+    up by a prefix or substring of their key.
+
+    Results are returned as lists of items, in the order the pairs were given to the index.
+    """
+
+    def __init__(self, entries):
+        """
+        :param entries: the strings to search, and the item to return when each one matches
+        :type entries: iterable<(str, T)>
+        """
+        self.keys = []
+        self.items = []
+        # maps an n-gram to an ascending list of the positions of keys containing it
+        self.postings = dict()
+        # the same for the trigrams of normalized keys, for fuzzy searches
+        self.normalized = []
+        self.fuzzy_postings = dict()
+
+        for (position, (key, item)) in enumerate(entries):
+            self.items.append(item)
+            normalized = normalize(key)
+            self.normalized.append(normalized)
+            for gram in ngrams(normalized, MAX_GRAM):
+                self.fuzzy_postings.setdefault(gram, []).append(position)
+            key = key.lower()
+            self.keys.append(key)
+            for n in range(1, MAX_GRAM + 1):
+                for gram in ngrams(key, n):
+                    self.postings.setdefault(gram, []).append(position)
+
+        # (key, position) pairs in alphabetical order, for prefix searches
+        self.sorted_keys = sorted((key, position) for (position, key) in enumerate(self.keys))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def contains(self, query):
+        """
+        Returns every item whose key contains the query
+        :rtype: List<T>
+        """
+        query = query.lower()
+
+        if len(query) == 0:
+            return list(self.items)
+
+        if len(query) <= MAX_GRAM:
+            # the query is itself an n-gram, so its postings are exactly the matches
+            positions = self.postings.get(query, [])
+        else:
+            # every match has to contain all the trigrams of the query; start from the rarest
+            postings = sorted(
+                (self.postings.get(gram, []) for gram in ngrams(query, MAX_GRAM)),
+                key=len
+            )
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+            # ...but containing all the trigrams doesn't mean they are in the right order
+            positions = sorted(p for p in candidates if query in self.keys[p])
+
+        return [self.items[p] for p in positions]
+
+    def starts_with(self, query):
+        """
+        Returns every item whose key starts with the query
+        :rtype: List<T>
+        """
+        query = query.lower()
+        start = bisect_left(self.sorted_keys, (query, -1))
+        positions = []
+        for (key, position) in self.sorted_keys[start:]:
+            if not key.startswith(query):
+                break
+            positions.append(position)
+        return [self.items[p] for p in sorted(positions)]
+
+    def fuzzy(self, query, limit, budget=FUZZY_BUDGET):
+        """
+        Returns up to `limit` items whose normalized key contains something within a typo or two
+        of the normalized query, closest first (then shortest key first).
+
+        Names sharing the most trigrams with the query are compared first. Comparing stops once
+        `budget` seconds have passed, so a query that matches nothing well can't take long,
+        but may miss a few poor matches.
+
+        :rtype: List<T>
+        """
+        # the budget covers finding the candidates, too (but the most promising batch of them is
+        # always compared)
+        deadline = time.monotonic() + budget
+        query = normalize(query)
+        if len(query) < FUZZY_MIN_LENGTH:
+            return []
+
+        max_distance = fuzzy_distance_limit(query)
+        grams = ngrams(query, MAX_GRAM)
+        # each edit changes at most MAX_GRAM of the query's trigrams
+        min_shared = max(1, len(grams) - MAX_GRAM * max_distance)
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.fuzzy_postings.get(gram, []))
+        candidates = sorted(
+            (position for (position, count) in shared.items() if count >= min_shared),
+            key=lambda position: (-shared[position], position)
+        )
+
+        matches = []
+        for (checked, position) in enumerate(candidates):
+            if checked % FUZZY_BATCH == 0 and checked > 0 and time.monotonic() > deadline:
+                break
+            key = self.normalized[position]
+            distance = substring_distance(query, key, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, len(key), position))
+
+        return [self.items[position] for (_, _, position) in top_k(matches, limit, key=None)]
+
+
+def top_k(items, k, key):
+    """
+    Returns the k smallest items, using a heap rather than sorting all of them.
+    Items that compare equal stay in their original order (like `sorted(items, key=key)[:k]`)
+    """
+    return heapq.nsmallest(k, items, key=key)
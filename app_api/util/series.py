@@ -0,0 +1,160 @@
+# Highcharts series for charts of a data set: the percentile curve, and the values of some
+# counties as scatter points.
+#
+# The chart series API endpoints (see app_api/views/chart.py) send these as JSON, and pages can
+# also embed them, so the chart can be drawn without asking the API for anything.
+#
+# The percentile curve is built from the cached percentile arrays (see percentiles.py). Point
+# series are cached by the data set's version (see hda_privileged/versions.py) and the counties
+# requested, since the same few charts (e.g. every county in a state) are requested over and over.
+
+import hashlib
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from app_api.util.percentiles import percentile_arrays
+from hda_privileged.ingest import current_data_set_id
+from hda_privileged.models import Data_Point, Data_Set
+from hda_privileged.versions import data_set_version
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def percentile_series(data_set_id):
+    """
+    :return: the percentile spline series for a data set, as {'config': <Highcharts series>}
+    :rtype: dict
+    :raises Data_Set.DoesNotExist: if there is no such live data set (or replacement for it)
+    """
+    (ranks, values) = percentile_arrays(data_set_id)
+    # no percentiles might mean no data set, or one that has been replaced by a new upload
+    if not ranks:
+        current_id = current_data_set_id(data_set_id)
+        if current_id is None:
+            raise Data_Set.DoesNotExist(f"There is no data set matching ID {data_set_id}")
+        if current_id != data_set_id:
+            return percentile_series(current_id)
+
+    spline_points = [(round(r * 100, 2), v) for (r, v) in zip(ranks, values)]
+    config = {
+        'name': 'Percentiles',
+        'type': 'spline',
+        'color': 'gray',
+        'enableMouseTracking': False,
+        'marker': {
+            'enabled': False,
+        },
+        'zIndex': -1,
+        'data': spline_points,
+    }
+    return {'config': config}
+
+
+def point_to_dict(county, point):
+    return {
+        'x': round(point.rank * 100, 2),
+        'y': round(point.value, 2),
+        'name': county.name,
+    }
+
+
+def points_to_columns(points):
+    return {
+        'fips': [county.fips5 for (county, _) in points],
+        'x': [round(point.rank * 100, 2) for (_, point) in points],
+        'y': [round(point.value, 2) for (_, point) in points],
+        'names': reverse('api:county_names'),
+    }
+
+
+def get_requested_points(data_set_id, counties):
+    # one query for every requested county, instead of one query per county
+    point_query = Data_Point.objects.filter(
+        data_set=data_set_id,
+        county_id__in=[county.id for county in counties]
+    )
+    point_for_county = {point.county_id: point for point in point_query.iterator()}
+    # keep the points in the same order as the requested counties
+    query_results = [(county, point_for_county.get(county.id, None)) for county in counties]
+    points = [(county, point) for (county, point) in query_results if point]
+    unmatched = [county for (county, point) in query_results if not point]
+    return (points, unmatched)
+
+
+def point_cache_key(data_set_id, counties, compact):
+    ids = ','.join(str(county.id) for county in counties)
+    chart = hashlib.sha1(ids.encode('ascii')).hexdigest()[:16]
+    layout = 'compact' if compact else 'points'
+    return f"series:{data_set_id}:{data_set_version(data_set_id)}:{layout}:{chart}"
+
+
+def build_point_series(data_set_id, counties, compact):
+    (points, unmatched_counties) = get_requested_points(data_set_id, counties)
+
+    config = {
+        'name': 'Values',
+        'type': 'scatter',
+        'color': 'darkred',
+        'enableMouseTracking': True,
+        'marker': {
+            'radius': 3,
+            'symbol': 'circle',
+        },
+        'tooltip': {
+            'pointFormat': r'{point.name}<br/>p: <b>{point.x}%</b><br/>v: <b>{point.y}</b><br/>',
+            'valueDecimals': 1,
+        },
+    }
+
+    data = {'config': config}
+
+    if compact:
+        data['compact'] = points_to_columns(points)
+    else:
+        config['data'] = [point_to_dict(county, point) for (county, point) in points]
+
+    errors = dict()
+
+    if len(unmatched_counties) > 0:
+        errors['no_fips'] = '; '.join(
+            [f"{county.name}, {county.state.short}" for county in unmatched_counties]
+        )
+
+    data['errors'] = errors
+    return data
+
+
+def point_series(data_set_id, counties, unmatched_fips=(), compact=False):
+    """
+    Returns the scatter series of some counties' values in a data set, as
+    {'config': <Highcharts series>, 'errors': {...}}, and with the points either in the config
+    or (if `compact`) as parallel arrays under 'compact' (see PointSeries).
+
+    :param data_set_id: primary key of a Data_Set
+    :type data_set_id: int
+    :param counties: counties to include, in order (records from the geography registry)
+    :type counties: List<CountyRecord>
+    :param unmatched_fips: requested FIPS codes that didn't match a county, to report as errors
+    :type unmatched_fips: List<str>
+    :param compact: whether to use the compact format
+    :type compact: bool
+    :rtype: dict
+    :raises Data_Set.DoesNotExist: if there is no such live data set (or replacement for it)
+    """
+    # a replaced data set (that hasn't been purged yet) is answered with its replacement, which
+    # is cached under its own ID and version (if it is replaced in turn, its version changes)
+    current_id = current_data_set_id(data_set_id)
+    if current_id is None:
+        raise Data_Set.DoesNotExist(f"There is no data set matching ID {data_set_id}")
+    key = point_cache_key(current_id, counties, compact)
+    data = cache.get(key)
+    if data is None:
+        data = build_point_series(current_id, counties, compact)
+        cache.set(key, data, CACHE_TIMEOUT)
+
+    if len(unmatched_fips) > 0:
+        # don't change the cached copy
+        data = dict(data, errors=dict(data['errors'], no_county='; '.join(unmatched_fips)))
+
+    return data
@@ -0,0 +1,121 @@
+# Small SVG charts of a data set, rendered on the server.
+#
+# Overview pages show several small charts at once. Drawing them with Highcharts means loading
+# the library and fetching two series per chart before anything appears, so instead each chart
+# starts out as a static SVG "sparkline": the data set's percentile curve, with the values of
+# the counties being shown marked on it. (The interactive chart only replaces it if someone
+# clicks on it - see overview.html.)
+#
+# The curve comes from the cached percentile arrays (see percentiles.py), so only the
+# highlighted points have to be read from the database. Rendered SVGs are cached too, keyed by
+# the data set's version (see hda_privileged/versions.py) and the counties on the chart.
+#  ~ see https://developer.mozilla.org/en-US/docs/Web/SVG/Tutorial
+
+import hashlib
+
+from django.core.cache import cache
+from django.utils.html import escape
+
+from app_api.util.percentiles import percentile_arrays
+from hda_privileged.ingest import current_data_set_id
+from hda_privileged.models import Data_Point
+from hda_privileged.versions import data_set_version
+
+# size of the drawing, in SVG user units; it scales to the width of its container
+WIDTH = 320
+HEIGHT = 200
+MARGIN = 6
+
+# how many points of the percentile curve to draw (of 999)
+CURVE_POINTS = 100
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def cache_key(data_set_id, version, counties, title):
+    ids = ','.join(str(county.id) for county in sorted(counties, key=lambda c: c.id))
+    chart = hashlib.sha1(f"{ids}|{title}".encode('utf-8')).hexdigest()[:16]
+    return f"sparkline:{data_set_id}:{version}:{chart}"
+
+
+def every_nth(items, count):
+    """
+    Returns about `count` evenly spaced items from a list, always including the last one
+    """
+    step = max(1, len(items) // count)
+    picked = items[::step]
+    if picked[-1] is not items[-1]:
+        picked.append(items[-1])
+    return picked
+
+
+def render_svg(ranks, values, points, title):
+    """
+    Draws the percentile curve (ranks between 0 and 1, and the value at each rank)
+    and some (rank, value) points on it.
+
+    :rtype: str
+    """
+    low = min(values)
+    high = max(values)
+    # a flat curve still needs a non-zero range to scale into
+    spread = (high - low) or 1.0
+
+    def x(rank):
+        return round(MARGIN + rank * (WIDTH - 2 * MARGIN), 1)
+
+    def y(value):
+        value = min(max(value, low), high)
+        return round(HEIGHT - MARGIN - (value - low) / spread * (HEIGHT - 2 * MARGIN), 1)
+
+    curve = every_nth(list(zip(ranks, values)), CURVE_POINTS)
+    path = ' '.join(f"{x(r)},{y(v)}" for (r, v) in curve)
+    circles = ''.join(
+        f'<circle cx="{x(r)}" cy="{y(v)}" r="3"/>' for (r, v) in points if v is not None
+    )
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" '
+        f'width="100%" role="img" class="sparkline">'
+        f'<title>{escape(title)}</title>'
+        f'<polyline points="{path}" fill="none" stroke="gray" stroke-width="1.5"/>'
+        f'<g fill="darkred">{circles}</g>'
+        f'</svg>'
+    )
+
+
+def sparkline(data_set_id, counties, title='', version=None):
+    """
+    Returns an SVG chart of a data set with the given counties highlighted, or None if the
+    data set has no percentiles to draw. A data set that was replaced by a new upload (but not
+    purged yet) is drawn from its replacement.
+
+    :param data_set_id: primary key of a Data_Set
+    :type data_set_id: int
+    :param counties: counties to mark on the chart (records from the geography registry)
+    :type counties: List<CountyRecord>
+    :param title: text for screen readers and tooltips
+    :type title: str
+    :param version: (optional) the data set's version, if it has already been looked up
+    :type version: int
+    :rtype: str | None
+    """
+    if version is None:
+        version = data_set_version(data_set_id)
+    key = cache_key(data_set_id, version, counties, title)
+    svg = cache.get(key)
+    if svg is None:
+        (ranks, values) = percentile_arrays(data_set_id)
+        # no percentiles might mean the data set has been replaced; its replacement's chart is
+        # cached under the replacement's own ID and version
+        if not ranks:
+            current_id = current_data_set_id(data_set_id)
+            if current_id is None or current_id == data_set_id:
+                return None
+            return sparkline(current_id, counties, title)
+        points = Data_Point.objects \
+            .filter(data_set=data_set_id, county_id__in=[county.id for county in counties]) \
+            .values_list('rank', 'value')
+        svg = render_svg(ranks, values, list(points.iterator()), title)
+        cache.set(key, svg, CACHE_TIMEOUT)
+    return svg
@@ -1,109 +1,209 @@
 import json
+import math
 
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
+from django.views import View
+from django.views.decorators.cache import cache_control
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+
+from app_api.util.percentiles import percentile_arrays
+from app_api.util.series import percentile_series, point_series
+from app_api.util.sparkline import sparkline
 from app_api.views.get_json import GetJSON
-from hda_privileged.models import Data_Set, US_County, US_State
+from hda_privileged.geography import get_geography
+from hda_privileged.ingest import current_data_set_id
+from hda_privileged.percentile import PercentileBoundsError, ranks_for_values
+
+
+# Clients can ask for the compact, columnar version of the point series either with
+# a `?format=compact` query string parameter or by sending this media type in Accept
+COMPACT_FORMAT = 'compact'
+COMPACT_MEDIA_TYPE = 'application/vnd.hda.compact+json'
+
+
+def requested_counties(request):
+    """
+    Reads the counties to plot from a request's query string: either every county in a state
+    (`?state=<USPS>`) or a list of counties (`?county=<FIPS>,<FIPS>,...`).
+    Counties come from the geography registry, without querying the database.
+
+    :return: the matching counties, and any requested FIPS codes that don't match a county
+    :rtype: (List<CountyRecord>, List<str>)
+    :raises Exception: if there is no state or county parameter, or the state doesn't exist
+    """
+    geography = get_geography()
+    requested_state = request.GET.get('state', None)
+    if requested_state:
+        state = geography.state(requested_state)
+        if state is None:
+            raise Exception(f"The USPS code '{requested_state}' doesn't match a US State")
+        return (list(state.counties), [])
+    else:
+        requested_fips = request.GET.get('county', None)
+
+        if requested_fips is None:
+            raise Exception('Endpoint must be called with a state or county query string')
+
+        fips_list = requested_fips.split(',')
+        query_results = [(fips, geography.county(fips)) for fips in fips_list]
+        matched = [county for (_, county) in query_results if county]
+        unmatched = [fips for (fips, county) in query_results if not county]
+        return (matched, unmatched)
 
 
 class PercentileSeries(GetJSON):
 
     def get_data(self, data_set_id):
-        # THROWS
-        data_set = Data_Set.objects.get(pk=data_set_id)
-        percentiles = data_set.percentiles.all().order_by('rank')
-        spline_points = [(round(p.rank * 100, 2), p.value) for p in percentiles]
-        config = {
-            'name': 'Percentiles',
-            'type': 'spline',
-            'color': 'gray',
-            'enableMouseTracking': False,
-            'marker': {
-                'enabled': False,
-            },
-            'zIndex': -1,
-            'data': spline_points,
-        }
-        return {'config': config}
+        return percentile_series(data_set_id)  # THROWS
+
 
 class PointSeries(GetJSON):
+    '''
+    Returns a Highcharts scatter series of the data points for some counties in a data set.
 
-    def try_get_county(self, fips_code):
-        try:
-            return US_County.objects.get(fips5=fips_code)
-        except US_County.DoesNotExist:
-            return None
+    By default the series 'data' is a list of {x, y, name} objects, one per county. If the
+    client asks for the compact format (see wants_compact) the series is sent without 'data',
+    and the points are instead sent as parallel arrays under the 'compact' key:
+
+        {'fips': [...], 'x': [...], 'y': [...], 'names': <URL of county names dictionary>}
 
-    def try_get_point(self, data_set, county):
-        return data_set.data_points.filter(county=county).first()
+    The county names are not repeated in every response; the client fetches them once from
+    the names URL (see county.Names) and joins them to the points using the FIPS codes.
+
+    The series themselves are built (and cached) in app_api/util/series.py.
+    '''
+
+    def wants_compact(self):
+        requested_format = self.request.GET.get('format', None)
+        if requested_format is not None:
+            return requested_format.lower() == COMPACT_FORMAT
+        return COMPACT_MEDIA_TYPE in self.request.META.get('HTTP_ACCEPT', '')
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        # the format can depend on the Accept header, so caches must keep one copy for each
+        patch_vary_headers(response, ['Accept'])
+        return response
 
     def get_requested_counties(self):
-        requested_state = self.request.GET.get('state', None)
-        if requested_state:
-            state = US_State.objects.get(pk=requested_state.upper())  # THROWS
-            return ([county for county in state.counties.all().iterator()], [])
-        else:
-            requested_fips = self.request.GET.get('county', None)
-
-            if requested_fips is None:
-                raise Exception('Endpoint must be called with a state or county query string')
-
-            fips_list = requested_fips.split(',')
-            query_results = [(fips, self.try_get_county(fips)) for fips in fips_list]
-            matched = [county for (_, county) in query_results if county]
-            unmatched = [fips for (fips, county) in query_results if not county]
-            return (matched, unmatched)
-
-
-    def get_requested_points(self, data_set, counties):
-        query_results = [(county, self.try_get_point(data_set, county)) for county in counties]
-        points = [point for (_, point) in query_results if point]
-        unmatched = [county for (county, point) in query_results if not point]
-        return (points, unmatched)
-
-    def point_to_dict(self, point):
-        return {
-            'x': round(point.rank * 100, 2),
-            'y': round(point.value, 2),
-            'name': point.county.name,
-        }
+        return requested_counties(self.request)  # THROWS
 
     def get_data(self, data_set_id):
+        (counties, unmatched_fips) = self.get_requested_counties()  # THROWS
+        return point_series(data_set_id, counties, unmatched_fips, self.wants_compact())  # THROWS
 
-        data_set = Data_Set.objects.get(pk=data_set_id)  # THROWS
 
-        (counties, unmatched_fips) = self.get_requested_counties()  # THROWS
+class SeriesBatch(PointSeries):
+    '''
+    Returns the percentile and point series for several data sets at once, so a page showing
+    several charts for the same place can load them all with one request. The data sets are
+    listed in the 'data_sets' parameter; counties are chosen as for PointSeries, e.g.
+
+        /api/chart/batch?data_sets=3,7,9&state=TN&format=compact
+
+    The response maps each data set ID to the same series the individual endpoints return:
+
+        {'3': {'percentiles': {...}, 'points': {...}}, ...}
+    '''
+
+    max_data_sets = 20
+
+    def get_data_set_ids(self):
+        requested = self.request.GET.get('data_sets', '')
+        ids = [int(i) for i in requested.split(',') if i]  # THROWS
+        if not 0 < len(ids) <= self.max_data_sets:
+            raise Exception(f'Endpoint must be called with 1 to {self.max_data_sets} data sets')
+        return ids
 
-        (points, unmatched_counties) = self.get_requested_points(data_set, counties)
-
-        config = {
-            'name': 'Values',
-            'type': 'scatter',
-            'color': 'darkred',
-            'enableMouseTracking': True,
-            'marker': {
-                'radius': 3,
-                'symbol': 'circle',
-            },
-            'tooltip': {
-                'pointFormat': r'{point.name}<br/>p: <b>{point.x}%</b><br/>v: <b>{point.y}</b><br/>',
-                'valueDecimals': 1,
-            },
-            'data': [self.point_to_dict(p) for p in points]
+    def get_data(self):
+        data_set_ids = self.get_data_set_ids()  # THROWS
+        (counties, unmatched_fips) = self.get_requested_counties()  # THROWS
+        compact = self.wants_compact()
+        return {
+            str(data_set_id): {
+                'percentiles': percentile_series(data_set_id),  # THROWS
+                'points': point_series(data_set_id, counties, unmatched_fips, compact),
+            }
+            for data_set_id in data_set_ids
         }
 
-        errors = dict()
 
-        if len(unmatched_fips) > 0:
-            errors['no_county'] = '; '.join(unmatched_fips)
+class PercentileRank(GetJSON):
+    '''
+    Answers "where would a value of X rank in this data set?" for values that don't have to
+    belong to any county in the data set. Values are given in the 'value' query string
+    parameter, either repeated or as a comma-separated list, e.g.
+
+        /api/chart/rank/3?value=12.5,30&value=42
+
+    The ranks come from a binary search of the data set's (cached) percentile values, so this
+    never reads the data points. The response lists the values in the order they were given:
+
+        {'data_set_id': 3, 'ranks': [{'value': 12.5, 'rank': 0.1063, 'x': 10.63}, ...]}
+
+    where 'rank' is between 0 and 1, and 'x' is the same percentile as plotted on charts. A data
+    set that was replaced by a new upload is answered by its replacement, whose ID is reported.
+    '''
+
+    def get_values(self):
+        requested = ','.join(self.request.GET.getlist('value'))
+        values = [float(v) for v in requested.split(',') if v]  # THROWS
+        if len(values) == 0:
+            raise Exception('Endpoint must be called with at least one value')
+        # float() also reads 'nan' and 'inf', which have no rank (and aren't valid JSON)
+        if not all(math.isfinite(v) for v in values):
+            raise Exception('Values must be finite numbers')
+        return values
+
+    def get_data(self, data_set_id):
+        values = self.get_values()  # THROWS
 
-        if len(unmatched_counties) > 0:
-            errors['no_fips'] = '; '.join(
-                [f"{county.name}, {county.state.short}" for county in unmatched_counties]
-            )
+        (ranks, percentile_values) = percentile_arrays(data_set_id)
+        # no percentiles might mean the data set has been replaced by a new upload
+        if len(ranks) == 0:
+            current_id = current_data_set_id(data_set_id)
+            if current_id is not None and current_id != data_set_id:
+                data_set_id = current_id
+                (ranks, percentile_values) = percentile_arrays(data_set_id)
+        if len(ranks) == 0:
+            raise PercentileBoundsError(f"There are no percentiles for data set {data_set_id}")
+
+        value_ranks = ranks_for_values(values, ranks, percentile_values)
 
         return {
-            'config': config,
-            'errors': errors,
+            'data_set_id': data_set_id,
+            'ranks': [
+                {'value': v, 'rank': round(r, 4), 'x': round(r * 100, 2)}
+                for (v, r) in zip(values, value_ranks)
+            ],
         }
 
 
+# sparklines are cached by data set version on the server; browsers can keep them for a while too
+SPARKLINE_MAX_AGE = 60 * 60
+
+
+@method_decorator(cache_control(public=True, max_age=SPARKLINE_MAX_AGE), name='get')
+class Sparkline(View):
+    '''
+    Returns a small SVG chart of a data set's percentile curve, with some counties' values
+    marked on it. Counties are chosen with the same query strings as PointSeries, e.g.
+
+        /api/chart/sparkline/3.svg?state=TN
+        /api/chart/sparkline/3.svg?county=47179
+
+    The same SVG can be put straight into a page (see app_api/util/sparkline.py).
+    '''
+
+    def get(self, request, data_set_id):
+        try:
+            (counties, _) = requested_counties(request)
+        except Exception as exc:
+            return HttpResponseBadRequest(str(exc))
+
+        svg = sparkline(data_set_id, counties, request.GET.get('title', ''))
+        if svg is None:
+            raise Http404(f"There is no chart for data set {data_set_id}")
 
+        return HttpResponse(svg, content_type='image/svg+xml')
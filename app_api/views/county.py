@@ -1,16 +1,141 @@
 from django.db.models import Value, F
 from django.db.models.functions import Concat
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.cache import cache_control
 
+from app_api.views.get_json import GetJSON
 from app_api.views.list_all import ListEndpoint
-from hda_privileged.models import US_County
+from hda_privileged.models import Data_Point, Data_Set, Percentile, US_County
+
+# counties are loaded once by a migration and (practically) never change,
+# so browsers and proxies can keep the name dictionary for a day
+NAMES_MAX_AGE = 60 * 60 * 24
 
 
 class ListAll(ListEndpoint):
 
     model = US_County
 
+    filters = {
+        'state': 'state__short__iexact',
+        'name': 'name__istartswith',
+    }
+
     def get_values_queryset(self, request):
         return US_County.objects.values(
             'name', 'fips5', 'state',
             search=Concat('name', Value(' '), 'state__short')
         )
+
+
+@method_decorator(cache_control(public=True, max_age=NAMES_MAX_AGE), name='get')
+class Names(View):
+    '''
+    Returns a JSON dictionary mapping every county's 5-digit FIPS code to its name.
+    Used by clients of the compact point series format (see chart.PointSeries), which
+    sends FIPS codes instead of repeating county names in every response.
+    '''
+
+    def get(self, request):
+        names = US_County.objects.values_list('fips5', 'name')
+        return JsonResponse(dict(names.iterator()))
+
+
+class History(GetJSON):
+    '''
+    Returns every year of data for one county and one or more health indicators, so a client can
+    plot how the county has changed over time without requesting each year's data set separately.
+
+    The indicator is part of the URL; more can be requested with a comma-separated list of
+    indicator IDs in the 'indicators' query string parameter, e.g.
+
+        /api/county/47179/indicator/3/history?indicators=4,7
+
+    The response looks like:
+
+        {
+            'county': {'fips5': '47179', 'name': 'Washington County', 'state': 'TN'},
+            'indicators': {
+                '3': {
+                    'name': 'Obesity',
+                    'history': [
+                        {'year': 2017, 'data_set_id': 12, 'value': 31.2, 'rank': 0.564,
+                         'percentiles': {'25': 29.0, '50': 31.0, '75': 33.8}},
+                        ...
+                    ]
+                },
+                ...
+            }
+        }
+
+    with each history list in ascending order of year. The 'percentiles' give each year's value
+    some context: they are the data set's quartiles, keyed by percentile, or null if the data set
+    has none stored. Requested indicators with no data for the county have an empty history and a
+    null name.
+    '''
+
+    percentile_context = (0.25, 0.5, 0.75)
+
+    def get_indicator_ids(self, indicator_id):
+        ids = [indicator_id]
+        requested = self.request.GET.get('indicators', '')
+        ids.extend(int(i) for i in requested.split(',') if i)  # THROWS
+        return ids
+
+    def get_data(self, fips, indicator_id):
+        indicator_ids = self.get_indicator_ids(indicator_id)
+
+        # look the county up by its separate state & county codes, which are real columns
+        county = US_County.objects.select_related('state').get(
+            state__fips=fips[0:2],
+            fips=fips[2:5]
+        )  # THROWS
+
+        # one row per data point, for all years of all requested indicators
+        rows = Data_Point.objects \
+            .filter(
+                county=county,
+                data_set__indicator__in=indicator_ids,
+                data_set__status=Data_Set.LIVE) \
+            .order_by('data_set__year', 'data_set') \
+            .values_list(
+                'data_set__indicator', 'data_set__indicator__name', 'data_set', 'data_set__year',
+                'value', 'rank')
+
+        indicators = {str(i): {'name': None, 'history': []} for i in indicator_ids}
+        # maps data set ID -> entry in a history list
+        years = dict()
+
+        for (ind_id, ind_name, ds_id, year, value, rank) in rows.iterator():
+            years[ds_id] = {
+                'year': year,
+                'data_set_id': ds_id,
+                'value': value,
+                'rank': rank,
+                'percentiles': None,
+            }
+            indicator = indicators[str(ind_id)]
+            indicator['name'] = ind_name
+            indicator['history'].append(years[ds_id])
+
+        # the quartiles are read separately, so a data set without them still has its year
+        quartiles = Percentile.objects \
+            .filter(data_set__in=years.keys(), rank__in=self.percentile_context) \
+            .values_list('data_set', 'rank', 'value')
+
+        for (ds_id, p, pv) in quartiles.iterator():
+            entry = years[ds_id]
+            if entry['percentiles'] is None:
+                entry['percentiles'] = dict()
+            entry['percentiles'][str(round(p * 100))] = pv
+
+        return {
+            'county': {
+                'fips5': fips,
+                'name': county.name,
+                'state': county.state.short,
+            },
+            'indicators': indicators,
+        }
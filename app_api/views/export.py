@@ -0,0 +1,30 @@
+from django.http import Http404, StreamingHttpResponse
+from django.views import View
+
+from app_api.util.export import export_data_set
+from hda_privileged.models import Data_Set
+
+
+class DataSetExport(View):
+    '''
+    Downloads a data set as a CSV file with the columns (fips5, county, state, value, rank).
+    Add `?gzip=1` to the URL to download a gzipped copy instead.
+    '''
+
+    def get(self, request, data_set_id):
+        try:
+            data_set = Data_Set.objects.live().get(pk=data_set_id)
+        except Data_Set.DoesNotExist:
+            raise Http404(f"There is no data set matching ID {data_set_id}")
+
+        compress = request.GET.get('gzip', '') not in ('', '0', 'false')
+
+        if compress:
+            response = StreamingHttpResponse(export_data_set(data_set, True), content_type='application/gzip')
+            filename = f"data_set_{data_set.id}.csv.gz"
+        else:
+            response = StreamingHttpResponse(export_data_set(data_set, False), content_type='text/csv')
+            filename = f"data_set_{data_set.id}.csv"
+
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
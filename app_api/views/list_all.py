@@ -1,15 +1,130 @@
+import gzip
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.views import View
-from django.http import JsonResponse
+
+from hda_privileged.versions import data_version
 
 
 class ListEndpoint(View):
+    '''
+    Returns every object of a model as a JSON list, under the key 'values'.
+
+    The complete list never changes between requests (these endpoints list static geography),
+    so it is serialized and gzipped once and the same bytes are sent to every client, until
+    the data version changes (see hda_privileged/versions.py). Changes in this process also
+    throw the payload away straight away (see the `geography_changed` receiver in
+    app_api/signals.py); the version is how every other process finds out.
+
+    If the request filters the list (see `filters`) or asks for a page of it (`after` and/or
+    `limit`), the matching objects are instead streamed from the database in primary key order,
+    at most `limit` at a time. The response includes a 'next' cursor that can be passed back as
+    `after` to get the following page, or null on the last page.
+
+    Subclasses set `model`, may override get_values_queryset, and may set `filters` to a
+    dictionary of {query string parameter: field lookup} pairs.
+    '''
 
     model = None
 
+    # query string parameters that select a subset of the list, e.g. {'state': 'state'}
+    filters = {}
+
+    default_page_size = 500
+    max_page_size = 5000
+
+    # precomputed payloads, shared by every instance of every subclass
+    # maps view class -> (data version, etag, json bytes, gzipped json bytes)
+    payloads = {}
+
     def get_values_queryset(self, request):
         return self.model.objects.values()
 
+    def get_filter_kwargs(self, request):
+        return {
+            lookup: request.GET[param]
+            for (param, lookup) in self.filters.items()
+            if param in request.GET
+        }
+
+    def get_payload(self, request):
+        version = data_version()
+        payload = ListEndpoint.payloads.get(type(self), None)
+        if payload is None or payload[0] != version:
+            query = self.get_values_queryset(request)
+            items = list(query.iterator())
+            body = json.dumps({'values': items}, cls=DjangoJSONEncoder).encode('utf-8')
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            payload = (version, etag, body, gzip.compress(body))
+            ListEndpoint.payloads[type(self)] = payload
+        return payload[1:]
+
+    def get_complete(self, request):
+        (etag, body, compressed) = self.get_payload(request)
+
+        if request.META.get('HTTP_IF_NONE_MATCH', None) == etag:
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type='application/json')
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def stream_page(self, query, limit):
+        '''
+        Generates a JSON object containing a page of results piece by piece,
+        so that we never hold the whole page (or its serialized form) in memory.
+        '''
+        yield '{"values":['
+        cursor = None
+        for (count, item) in enumerate(query.iterator()):
+            # we asked for one more item than the page size, to find out if there is a next page
+            if count == limit:
+                break
+            cursor = item.pop('cursor')
+            yield (',' if count > 0 else '') + json.dumps(item, cls=DjangoJSONEncoder)
+        else:
+            cursor = None
+        yield '],"next":' + json.dumps(cursor, cls=DjangoJSONEncoder) + '}'
+
+    def get_page(self, request, filter_kwargs):
+        try:
+            limit = int(request.GET.get('limit', self.default_page_size))
+        except ValueError:
+            return HttpResponseBadRequest('limit must be an integer')
+        limit = max(1, min(limit, self.max_page_size))
+
+        query = self.get_values_queryset(request) \
+            .filter(**filter_kwargs) \
+            .annotate(cursor=F('pk')) \
+            .order_by('pk')
+
+        after = request.GET.get('after', None)
+        if after is not None:
+            try:
+                query = query.filter(pk__gt=after)
+            except ValueError:
+                return HttpResponseBadRequest('after must be a cursor from a previous page')
+
+        return StreamingHttpResponse(
+            self.stream_page(query[:limit + 1], limit),
+            content_type='application/json'
+        )
+
     def get(self, request):
-        query = self.get_values_queryset(request)
-        items = list(query.iterator())
-        return JsonResponse({'values': items})
+        filter_kwargs = self.get_filter_kwargs(request)
+        paged = 'after' in request.GET or 'limit' in request.GET
+
+        if filter_kwargs or paged:
+            return self.get_page(request, filter_kwargs)
+        else:
+            return self.get_complete(request)
@@ -1,11 +1,11 @@
 from django.http import JsonResponse
 from django.views import View
 
-from django.db.models import F
-
 from hda_privileged.models import US_State, US_County
 
 from app_api.util import search
+from app_api.util.search_backends import fuzzy_budget, get_search_backend, uses_database_search
+from app_api.util.search_index import SearchIndex, top_k
 
 
 class Suggestions(View):
@@ -15,23 +15,50 @@ class Suggestions(View):
     results for what the user is typing, so the JSON objects use the same format as
     the Bloodhound prefetch data (see also management/commands/generate_prefetch_data.py)
 
+    Matches are found in an in-memory SearchIndex (see app_api/util/search_index.py),
+    which each subclass builds once per process, the first time it is needed. The indexes
+    are thrown away if the geography changes (see app_api/signals.py).
+
+    If fewer than `limit` objects contain the query, the rest of the suggestions are
+    objects within a typo or two of it.
+
     MUST BE SUBCLASSED
     '''
     limit = 5
 
+    # maps subclass -> SearchIndex, shared by all instances
+    indexes = {}
+
     def make_datum(self, object):
         pass
 
     def stringify_datum(self, result):
         return str(result)
 
-    def filter_model(self, query):
+    def get_queryset(self):
         pass
 
+    def build_index(self):
+        datums = (self.make_datum(obj) for obj in self.get_queryset().iterator())
+        return SearchIndex((self.stringify_datum(d), d) for d in datums)
+
+    def get_index(self):
+        index = Suggestions.indexes.get(type(self), None)
+        if index is None:
+            index = self.build_index()
+            Suggestions.indexes[type(self)] = index
+        return index
+
+    def filter_model(self, query):
+        return self.get_index().contains(query)
+
+    def fuzzy_model(self, query):
+        return self.get_index().fuzzy(query, self.limit, fuzzy_budget())
+
     # sort results by the difference between the length of the query and
     # the length of the field we were searching in when matching the result
     # (If query is "Mont" and we have results "Monty" and "Montgomery", we want
-    # "Monty" to rank higher)
+    # "Monty" to rank higher). Only the top few are kept, using a heap.
     def rank(self, query, results):
         query_len = len(query)
 
@@ -39,15 +66,27 @@ class Suggestions(View):
             as_str = self.stringify_datum(result)
             return len(as_str) - query_len
 
-        return sorted(results, key=compare)
+        return top_k(results, self.limit, key=compare)
+
+    def fill_with_fuzzy(self, objects, fuzzy_objects):
+        '''
+        Adds close matches to the end of the exact matches, without repeats, up to the limit
+        '''
+        for obj in fuzzy_objects:
+            if len(objects) >= self.limit:
+                break
+            if obj not in objects:
+                objects.append(obj)
+        return objects
 
     def get(self, request, query=None):
         objects = []
 
         if query:
-            matches = self.filter_model(query)
-            datums = [self.make_datum(m) for m in matches.iterator()]
-            objects = self.rank(query, datums)[:self.limit]
+            datums = self.filter_model(query)
+            objects = self.rank(query, datums)
+            if len(objects) < self.limit:
+                objects = self.fill_with_fuzzy(objects, self.fuzzy_model(query))
 
         return JsonResponse(objects, safe=False)
 
@@ -57,8 +96,8 @@ class StateSuggestions(Suggestions):
     def make_datum(self, obj):
         return search.datum_for_state(obj)
 
-    def filter_model(self, query):
-        return US_State.objects.filter(full__icontains=query)
+    def get_queryset(self):
+        return US_State.objects.all()
 
 
 class CountySuggestions(Suggestions):
@@ -69,5 +108,17 @@ class CountySuggestions(Suggestions):
     def stringify_datum(self, result):
         return result['value']
 
-    def filter_model(self, query):
-        return US_County.objects.filter(search_str__icontains=query)
+    def get_queryset(self):
+        return US_County.objects.select_related('state')
+
+    def get(self, request, query=None):
+        # the database search backend does its own matching and ranking
+        if query and uses_database_search():
+            backend = get_search_backend()
+            objects = [self.make_datum(c) for c in backend.suggest_counties(query, self.limit)]
+            if len(objects) < self.limit:
+                fuzzy = backend.fuzzy_counties(query, self.limit)
+                objects = self.fill_with_fuzzy(objects, [self.make_datum(c) for c in fuzzy])
+            return JsonResponse(objects, safe=False)
+
+        return super(CountySuggestions, self).get(request, query)
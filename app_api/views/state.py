@@ -9,6 +9,10 @@ class ListAll(ListEndpoint):
 
     model = US_State
 
+    filters = {
+        'name': 'full__istartswith',
+    }
+
     def get_values_queryset(self, request):
         return US_State.objects.values(
             'fips',
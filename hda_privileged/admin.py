@@ -1,40 +1,143 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from .models import *
+from .versions import bump_data_set_version, bump_data_version
 
 # Register your models here.
+#
+# Data sets have thousands of data points, and there are millions of points in total, so points
+# are never shown as inlines on other models' pages: each data set and county links to the
+# (paginated) data point list, filtered to its points. Foreign keys to big tables use raw ID
+# or autocomplete widgets, so forms don't build a <select> with every row as an option.
+
+# only use the planner's estimate for tables bigger than this; smaller ones are cheap to count
+ESTIMATE_THRESHOLD = 100000
+
+
+def estimated_row_count(model, using):
+    """
+    Returns PostgreSQL's estimate of how many rows a model's table has (kept up to date by
+    VACUUM and ANALYZE), or None with other databases.
+    ~ see https://wiki.postgresql.org/wiki/Count_estimate
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counting every row of a huge table means reading all of it. When the list isn't filtered,
+    use the database's estimate of the table size for the page count instead.
+    (Filtered lists, e.g. one data set's points, are counted exactly.)
+    """
+
+    @cached_property
+    def count(self):
+        query = self.object_list
+        if not query.query.where:
+            estimate = estimated_row_count(query.model, query.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def data_points_link(filter_field, obj):
+    """
+    Links to the data point list, filtered to the points with `filter_field` equal to `obj`
+    """
+    if obj.pk is None:
+        # nothing to link to until it has been saved
+        return '-'
+    url = reverse('admin:hda_privileged_data_point_changelist')
+    return format_html('<a href="{}?{}__id__exact={}">View data points</a>', url, filter_field, obj.pk)
 
-class Data_Point_Inline(admin.TabularInline):
-    model = Data_Point
 
 class Data_Set_Inline(admin.StackedInline):
     model = Data_Set
+    raw_id_fields = ('source_document',)
+    # only set by replace_data_set (see hda_privileged/ingest.py)
+    readonly_fields = ('replaced_by',)
+
+    def get_queryset(self, request):
+        # each form's heading names the data set's indicator
+        return super().get_queryset(request).select_related('indicator')
 
 class US_County_Inline(admin.TabularInline):
     model = US_County
 
 @admin.register(US_State)
 class US_State_Admin(admin.ModelAdmin):
+    search_fields = ('full', 'short')
     inlines = (US_County_Inline,)
 
 
 @admin.register(US_County)
 class US_Counties_Admin(admin.ModelAdmin):
-    inlines = (Data_Point_Inline,)
+    list_display = ('name', 'state', 'fips')
+    list_select_related = ('state',)
+    search_fields = ('name', 'state__full')
+    autocomplete_fields = ('state',)
+    readonly_fields = ('data_points',)
+
+    def data_points(self, obj):
+        return data_points_link('county', obj)
 
 @admin.register(Health_Indicator)
 class Health_Indicator_Admin(admin.ModelAdmin):
+    search_fields = ('name',)
     inlines = (Data_Set_Inline,)
 
 @admin.register(Document)
 class Document_Admin(admin.ModelAdmin):
     date_hierarchy = 'uploaded_at'
-    readonly_fields = ('uploaded_at',)
+    readonly_fields = ('uploaded_at', 'content_hash', 'compressed')
+    search_fields = ('source', 'content_hash')
 
 @admin.register(Data_Set)
 class Data_Set_Admin(admin.ModelAdmin):
+    list_display = ('__str__', 'indicator', 'year', 'source_document', 'status')
+    list_filter = ('status',)
+    list_select_related = ('indicator', 'source_document')
     search_fields = ('indicator__name',)
-    inlines = (Data_Point_Inline,)
+    autocomplete_fields = ('indicator',)
+    raw_id_fields = ('source_document',)
+    readonly_fields = ('data_points', 'replaced_by')
+
+    def data_points(self, obj):
+        return data_points_link('data_set', obj)
 
 @admin.register(Data_Point)
 class Data_Point_Admin(admin.ModelAdmin):
-    search_fields = ('county__name', 'county__state__name',)
+    list_display = ('county', 'data_set', 'value', 'rank')
+    list_select_related = ('county', 'data_set__indicator')
+    search_fields = ('county__name', 'county__state__full',)
+    raw_id_fields = ('county', 'data_set')
+    # no COUNT(*) of the whole table, see EstimatedCountPaginator
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # saving a point bumps the versions through post_save, but there is no post_delete receiver
+    # for points (see app_api/signals.py), so deletions here have to do it
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_data_set_version(obj.data_set_id)
+        bump_data_version()
+
+    def delete_queryset(self, request, queryset):
+        data_set_ids = set(queryset.values_list('data_set_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for data_set_id in data_set_ids:
+            bump_data_set_version(data_set_id)
+        bump_data_version()
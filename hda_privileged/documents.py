@@ -0,0 +1,120 @@
+# Storing uploaded files.
+#
+# Each upload's SHA-256 hash is computed as it is copied into storage (in one pass over the
+# file), and saved on its Document. If the same bytes are uploaded again for the same indicator,
+# year and column format, the data set already made from them can be used instead of reading,
+# ranking and saving every data point again (see `find_duplicate`).
+#
+# With the UPLOAD_COMPRESSION setting on, stored uploads are gzipped; `open_document` reads
+# either kind back as text.
+# ~ see https://docs.python.org/3/library/gzip.html
+
+import gzip
+import hashlib
+import io
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import Data_Set
+
+# uploads up to this size are compressed in memory, bigger ones in a temporary file
+SPOOL_SIZE = 10 * 1024 * 1024
+
+
+def compress_uploads():
+    return getattr(settings, 'UPLOAD_COMPRESSION', False)
+
+
+def hash_upload(uploaded_file):
+    """
+    :param uploaded_file: an uploaded file, from request.FILES
+    :return: the hex SHA-256 hash of the file's contents
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compress_upload(uploaded_file):
+    """
+    Gzips an uploaded file, and hashes its (uncompressed) contents on the way.
+
+    :param uploaded_file: an uploaded file, from request.FILES
+    :return: the compressed file, named after the upload with '.gz' added, and the hex SHA-256
+        hash of the upload's contents
+    :rtype: (File, str)
+    """
+    digest = hashlib.sha256()
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    with gzip.GzipFile(fileobj=spooled, mode='wb') as compressed:
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            compressed.write(chunk)
+    spooled.seek(0)
+    return (File(spooled, name=f"{uploaded_file.name}.gz"), digest.hexdigest())
+
+
+def store_upload(document, uploaded_file, content_hash=None):
+    """
+    Sets a (not yet saved) Document's file to an upload, compressing it if the UPLOAD_COMPRESSION
+    setting is on, and records the upload's content hash.
+
+    :type document: Document
+    :param uploaded_file: an uploaded file, from request.FILES
+    :param content_hash: (optional) the upload's hash, if it is already known (see
+        upload_handlers.py); saves reading the file again when it isn't compressed
+    :type content_hash: str
+    """
+    if compress_uploads():
+        (document.file, document.content_hash) = compress_upload(uploaded_file)
+        document.compressed = True
+    else:
+        document.content_hash = content_hash or hash_upload(uploaded_file)
+        document.file = uploaded_file
+        document.compressed = False
+
+
+@contextmanager
+def open_document(document):
+    """
+    Opens a Document's file as text (in a `with` statement), uncompressing it if it was stored
+    compressed.
+
+    :type document: Document
+    """
+    if document.compressed:
+        document.file.open(mode='rb')
+        try:
+            with gzip.GzipFile(fileobj=document.file, mode='rb') as uncompressed:
+                yield io.TextIOWrapper(uncompressed, encoding='utf-8')
+        finally:
+            document.file.close()
+    else:
+        document.file.open(mode='rt')
+        try:
+            yield document.file
+        finally:
+            document.file.close()
+
+
+def find_duplicate(content_hash, indicator, year, column_format):
+    """
+    Finds a live data set that was made from a byte-identical file, for the same indicator and
+    year, read with the same column format.
+
+    :return: the data set, or None if there isn't one
+    :rtype: Data_Set | None
+    """
+    if not content_hash:
+        return None
+    return Data_Set.objects.live().filter(
+        indicator=indicator,
+        year=year,
+        source_document__content_hash=content_hash,
+        source_document__column_format=column_format
+    ).order_by('-id').first()
@@ -33,6 +33,33 @@ class LoginForm(forms.Form):
     )
 
 
+class ReplaceDataSetForm(forms.Form):
+    """
+    Form subclass for uploading a new file to replace an existing data set. The indicator and
+    year stay the same as the data set being replaced.
+    """
+    file = forms.FileField(
+        label='Data File',
+        help_text='File containing data in CSV format'
+    )
+
+    column_format = forms.ChoiceField(
+        label='CSV file format',
+        help_text='What columns to use to identify counties in the uploaded CSV file',
+        widget=forms.RadioSelect,
+        choices=UPLOAD_FORMAT_CHOICES,
+        required=True,
+        initial=CHOICE_NAME
+    )
+
+    source = forms.CharField(
+        label='Data source',
+        help_text='The source/provenance of the data',
+        required=False,
+        widget=forms.Textarea(attrs={'rows': 3})
+    )
+
+
 # Not using a ModelForm because this needs to include data for
 # both Document and Data_Set model classes - we could make an
 # additional Model class (e.g. NewDataUpload entity) with the
@@ -59,7 +86,7 @@ class UploadNewDataForm(forms.Form):
     # TODO #
     # This needs to be required once we have a way to create new ones #
     indicator = forms.ModelChoiceField(
-        queryset=Health_Indicator.objects.all(),
+        queryset=Health_Indicator.objects.live(),
         label='Health indicator',
         help_text='The health indicator/metric that this file contains data for',
         required=False
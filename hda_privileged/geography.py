@@ -0,0 +1,222 @@
+# A process-local registry of every US state and county.
+#
+# States and counties are loaded once, by migration 0003, and (practically) never change -
+# yet most pages and API endpoints need to look up a state or a few counties. Instead of asking
+# the database every time, each process reads them all once (on first use, after the app
+# registry is ready) into small read-only records, and answers lookups from dictionaries.
+#
+# Records are *not* model instances: they have the same field names as US_State and US_County
+# (plus the annotated fips5 and search_str for counties), but they can't be saved, and have no
+# related managers. Use `county.id` / `state.short` to filter querysets, e.g.
+# Data_Point.objects.filter(county_id=county.id)
+#
+# The registry is thrown away when a state or county is saved or deleted (see signals.py).
+# Anything that changes them without sending model signals should call `reload_geography`.
+#
+# ~ see https://docs.python.org/3/reference/datamodel.html#slots
+
+from .models import US_State, US_County
+
+
+class ReadOnlyRecord:
+    """
+    Base class for registry records, whose fields are fixed once the registry is built
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} records are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} records are read-only")
+
+    def _set(self, name, value):
+        object.__setattr__(self, name, value)
+
+
+class StateRecord(ReadOnlyRecord):
+    """
+    A US state, from the registry
+    """
+    __slots__ = ('short', 'full', 'fips', 'counties')
+
+    def __init__(self, short, full, fips):
+        self._set('short', short)
+        self._set('full', full)
+        self._set('fips', fips)
+        # tuple of CountyRecords, filled in once all the counties are read
+        self._set('counties', ())
+
+    @property
+    def pk(self):
+        return self.short
+
+    def __str__(self):
+        return self.fips + ' - ' + self.short + ' - ' + self.full
+
+    def __repr__(self):
+        return f"<StateRecord {self.short}>"
+
+
+class CountyRecord(ReadOnlyRecord):
+    """
+    A US county or county-equivalent, from the registry.
+    `ordinal` is the county's position in Geography.counties, for packing per-county values
+    into lists or arrays.
+    """
+    __slots__ = ('id', 'fips', 'name', 'state', 'fips5', 'search_str', 'ordinal')
+
+    def __init__(self, id, fips, name, state, ordinal):
+        self._set('id', id)
+        self._set('fips', fips)
+        self._set('name', name)
+        self._set('state', state)
+        self._set('fips5', state.fips + fips)
+        self._set('search_str', f"{name} {state.short}")
+        self._set('ordinal', ordinal)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def state_id(self):
+        return self.state.short
+
+    def __str__(self):
+        return f'{self.fips} - {self.name} - {self.state.short}'
+
+    def __repr__(self):
+        return f"<CountyRecord {self.fips5}>"
+
+
+class Geography:
+    """
+    Every state and county, with constant time lookups by their codes and names
+    """
+
+    def __init__(self, states, counties):
+        """
+        :param states: (USPS code, full name, 2-digit FIPS code) for every state
+        :type states: iterable<(str, str, str)>
+        :param counties: (ID, 3-digit FIPS code, name, state USPS code) for every county
+        :type counties: iterable<(int, str, str, str)>
+        """
+        self.states = tuple(StateRecord(*row) for row in states)
+        self.state_for_usps = {s.short: s for s in self.states}
+        self.state_for_fips = {s.fips: s for s in self.states}
+        self.state_for_name = {s.full: s for s in self.states}
+
+        self.counties = tuple(
+            CountyRecord(id, fips, name, self.state_for_usps[usps], ordinal)
+            for (ordinal, (id, fips, name, usps)) in enumerate(counties)
+        )
+        self.county_for_id = {c.id: c for c in self.counties}
+        self.county_for_fips5 = {c.fips5: c for c in self.counties}
+
+        in_state = dict()
+        for county in self.counties:
+            in_state.setdefault(county.state.short, []).append(county)
+        for state in self.states:
+            state._set('counties', tuple(in_state.get(state.short, [])))
+
+        # maps (state USPS code, start of a county name) -> the county with the shortest name
+        # starting with it (the first one, if several are as short); every start of every name
+        # is only a few thousand entries per state
+        self.county_for_name_start = dict()
+        for county in self.counties:
+            for end in range(len(county.name) + 1):
+                key = (county.state.short, county.name[:end])
+                best = self.county_for_name_start.get(key, None)
+                if best is None or len(county.name) < len(best.name):
+                    self.county_for_name_start[key] = county
+
+    def state(self, usps):
+        """
+        :param usps: 2-letter USPS code, in any case
+        :rtype: StateRecord | None
+        """
+        return self.state_for_usps.get(usps.upper(), None)
+
+    def state_with_fips(self, fips):
+        """
+        :param fips: 2-digit state FIPS code
+        :rtype: StateRecord | None
+        """
+        return self.state_for_fips.get(fips, None)
+
+    def state_named(self, name):
+        """
+        :param name: the state's full name, exactly
+        :rtype: StateRecord | None
+        """
+        return self.state_for_name.get(name, None)
+
+    def county(self, fips5):
+        """
+        :param fips5: 5-digit county FIPS code
+        :rtype: CountyRecord | None
+        """
+        return self.county_for_fips5.get(fips5, None)
+
+    def county_with_id(self, id):
+        """
+        :param id: primary key of the US_County
+        :rtype: CountyRecord | None
+        """
+        return self.county_for_id.get(id, None)
+
+    def county_in_state(self, state, fips):
+        """
+        :param state: the county's state
+        :type state: StateRecord
+        :param fips: 3-digit county FIPS code
+        :rtype: CountyRecord | None
+        """
+        return self.county_for_fips5.get(state.fips + fips, None)
+
+    def county_named(self, state, name):
+        """
+        Finds the county in a state whose name starts with the given name (case sensitive). If
+        several do, the one with the shortest name is the most exact match (e.g. "Clay" matches
+        both Clay County and Clayton County, GA).
+
+        :param state: the county's state
+        :type state: StateRecord
+        :param name: the start of the county's name, e.g. "Wahkiakum" for "Wahkiakum County"
+        :rtype: CountyRecord | None
+        """
+        return self.county_for_name_start.get((state.short, name), None)
+
+
+def load_geography():
+    """
+    Reads every state and county from the database
+    :rtype: Geography
+    """
+    states = US_State.objects.order_by('short').values_list('short', 'full', 'fips')
+    counties = US_County.objects.order_by('id').values_list('id', 'fips', 'name', 'state')
+    return Geography(states.iterator(), counties.iterator())
+
+
+# the registry for this process, or None until it is needed
+_geography = None
+
+
+def get_geography():
+    """
+    :return: the geography registry, loading it if this is the first time it's used
+    :rtype: Geography
+    """
+    global _geography
+    if _geography is None:
+        _geography = load_geography()
+    return _geography
+
+
+def reload_geography():
+    """
+    Throws away the registry; it will be read from the database again when next used
+    """
+    global _geography
+    _geography = None
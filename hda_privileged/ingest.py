@@ -0,0 +1,137 @@
+# Reading uploaded files into data sets, and putting them in front of the public.
+#
+# An upload is read into a new data set in the 'staging' state: its data points and percentiles
+# are all saved before anyone can see it. Then either
+#
+# - `publish` makes it live (a new upload), or
+# - `replace_data_set` swaps it in for an existing data set: in one transaction, the new data set
+#   goes live and the old one is marked as deleted, pointing at its replacement. Readers see
+#   either the old data set or the new one, complete - never neither, or half of one. The old
+#   data set's rows are purged in the background afterwards (see purge.py).
+#
+# Until it is purged, requests for the old data set's ID are answered with its replacement
+# (see `current_data_set_id`), so pages that were loaded before the swap keep working.
+
+from django.db import transaction
+
+from .documents import open_document
+from .models import Data_Point, Data_Set, Percentile
+from .percentile import get_percentiles_for_points, assign_percentiles_to_points
+from .purge import start_purge
+from .upload_reading import read_data_points_from_file, read_data_points_from_rows
+
+# how many replacements to follow before giving up (a replacement can itself be replaced
+# before the first one is purged)
+MAX_REPLACEMENTS = 10
+
+
+def ingest_document(document, indicator, year, column_format, rows=None):
+    """
+    Reads the data points in an uploaded document into a new staging data set, and calculates
+    its percentiles. If anything goes wrong, the staging data set is marked as deleted (so it
+    will be purged) and the exception is raised again.
+
+    :param document: the uploaded file
+    :type document: Document
+    :param indicator: the indicator the data is for
+    :type indicator: Health_Indicator
+    :param year: the year the data is for
+    :type year: int
+    :param column_format: one of the choice codes from UPLOAD_FORMAT_CHOICES
+    :type column_format: str
+    :param rows: (optional) the document's CSV rows, if they were already read while it was
+        uploaded (see upload_handlers.py); otherwise the stored file is read
+    :type rows: list
+    :return: the staging data set, and the counties and states in the file that didn't match
+        a county
+    :rtype: (Data_Set, dict)
+    """
+    data_set = Data_Set.objects.create(
+        indicator=indicator,
+        year=year,
+        source_document=document,
+        status=Data_Set.STAGING
+    )
+
+    try:
+        if rows is not None:
+            (points, invalid_counties_and_states) = read_data_points_from_rows(rows, column_format, data_set)
+        else:
+            with open_document(document) as file:
+                # read_data_points_from_file returns two values: successful_datapoints, and unsuccessful datapoints
+                (points, invalid_counties_and_states) = read_data_points_from_file(
+                    file, column_format, data_set)
+
+        # calculate the percentile-values for this data set
+        percentile_values = get_percentiles_for_points(points)
+
+        # assign a percentile to each data point
+        assign_percentiles_to_points(points, percentile_values)
+
+        # transform our list of tuples List<(P, PV)> into a list of Percentile model objects
+        percentile_models = [Percentile(rank=p, value=pv, data_set=data_set) for (p, pv) in percentile_values]
+
+        # save all the data points and percentile values using bulk_create, for speed
+        Data_Point.objects.bulk_create(points)
+        Percentile.objects.bulk_create(percentile_models)
+    except Exception:
+        data_set.status = Data_Set.DELETED
+        data_set.save(update_fields=['status'])
+        start_purge()
+        raise
+
+    return (data_set, invalid_counties_and_states)
+
+
+def publish(data_set):
+    """
+    Makes a staging data set live. Saving it tells every cache about the new data.
+    """
+    data_set.status = Data_Set.LIVE
+    data_set.save(update_fields=['status'])
+
+
+def replace_data_set(old, new):
+    """
+    Swaps a (complete) staging data set in for a live one, in a single transaction, and starts
+    purging the old one once that is committed.
+
+    :param old: the live data set to replace
+    :type old: Data_Set
+    :param new: its replacement, with all of its points and percentiles saved
+    :type new: Data_Set
+    :raises Data_Set.DoesNotExist: if the old data set isn't live (any more)
+    """
+    with transaction.atomic():
+        # lock the old data set, so two replacements of it can't both go live
+        current = Data_Set.objects.select_for_update().live().get(pk=old.pk)
+        publish(new)
+        current.status = Data_Set.DELETED
+        current.replaced_by = new
+        current.save(update_fields=['status', 'replaced_by'])
+        transaction.on_commit(start_purge)
+    old.status = current.status
+    old.replaced_by = current.replaced_by
+
+
+def current_data_set_id(data_set_id):
+    """
+    Returns the ID of the live data set to show for a data set ID: the same ID if that data set
+    is live, or the ID of its replacement if it was replaced but hasn't been purged yet.
+
+    :param data_set_id: primary key of a Data_Set
+    :type data_set_id: int
+    :return: primary key of a live Data_Set, or None if there isn't one
+    :rtype: int | None
+    """
+    for _ in range(MAX_REPLACEMENTS):
+        row = Data_Set.objects.filter(pk=data_set_id).values_list('status', 'replaced_by').first()
+        if row is None:
+            return None
+        (status, replaced_by) = row
+        if status == Data_Set.LIVE:
+            return data_set_id
+        if replaced_by is None:
+            return None
+        data_set_id = replaced_by
+    return None
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from hda_privileged.purge import purge_batch_size, purge_deleted, purge_progress
+
+
+class Command(BaseCommand):
+    help = 'Removes deleted data sets (and their data points) and deleted indicators from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--batch-size',
+            type=int,
+            default=None,
+            help='How many data points to delete at a time (defaults to the PURGE_BATCH_SIZE setting)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or purge_batch_size()
+        waiting = purge_progress()
+        self.stdout.write(f"{waiting['data_sets']} data sets ({waiting['points']} data points) to purge")
+
+        def progress(data_set_id, points):
+            self.stdout.write(f"Data set {data_set_id}: {points} data points deleted")
+
+        (data_sets, indicators) = purge_deleted(batch_size, progress)
+        self.stdout.write(f"Removed {data_sets} data sets and {indicators} indicators")
@@ -0,0 +1,21 @@
+# Generated by Django 2.1.5 on 2026-10-19 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hda_privileged', '0010_health_indicator_important'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='data_point',
+            index=models.Index(fields=['county', 'data_set'], name='hda_privile_county__808fd5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='percentile',
+            index=models.Index(fields=['data_set', 'rank'], name='hda_privile_data_se_560354_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Adds a trigram index for searching county names, used by the 'database' search backend
+# (see app_api/util/search_backends.py). It only exists on PostgreSQL; on any other database
+# this migration does nothing.
+#
+# Creating the pg_trgm extension requires a database user with the CREATE privilege
+# (or a superuser, before PostgreSQL 13).
+
+from django.db import migrations
+
+INDEXES = [
+    ('hda_privileged_us_county_name_trgm', 'hda_privileged_us_county', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for (index, table, column) in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index} ON {schema_editor.quote_name(table)} '
+            f'USING gin ({schema_editor.quote_name(column)} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # leave the extension installed, in case something else uses it
+    for (index, _, _) in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hda_privileged', '0011_data_point_percentile_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
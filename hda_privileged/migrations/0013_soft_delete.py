@@ -0,0 +1,23 @@
+# Generated by Django 2.1.5 on 2026-10-19 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hda_privileged', '0012_trigram_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='data_set',
+            name='status',
+            field=models.CharField(choices=[('live', 'Live'), ('deleted', 'Deleted')], db_index=True, default='live', help_text='Only live data sets are shown to the public', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='health_indicator',
+            name='deleted',
+            field=models.BooleanField(default=False, help_text='Waiting to be removed from the database; hidden everywhere else'),
+        ),
+    ]
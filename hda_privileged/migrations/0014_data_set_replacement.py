@@ -0,0 +1,24 @@
+# Generated by Django 2.1.5 on 2026-10-19 13:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hda_privileged', '0013_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='data_set',
+            name='replaced_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replaces', to='hda_privileged.Data_Set'),
+        ),
+        migrations.AlterField(
+            model_name='data_set',
+            name='status',
+            field=models.CharField(choices=[('staging', 'Staging'), ('live', 'Live'), ('deleted', 'Deleted')], db_index=True, default='live', help_text='Only live data sets are shown to the public', max_length=10),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.1.5 on 2026-10-19 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hda_privileged', '0014_data_set_replacement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='column_format',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='compressed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.1.5 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hda_privileged', '0015_document_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cache_Version',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
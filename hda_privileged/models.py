@@ -28,6 +28,13 @@ def get_upload_path(instance, filename):
 
 # model classes
 
+class Health_Indicator_QuerySet(models.QuerySet):
+
+    def live(self):
+        """Indicators that haven't been deleted (see Health_Indicator.deleted)"""
+        return self.filter(deleted=False)
+
+
 class Health_Indicator(models.Model):
     """
     Represents some health metric that we want to store data sets for,
@@ -41,6 +48,15 @@ class Health_Indicator(models.Model):
     )
     slug = models.SlugField()
 
+    # Deleting an indicator only sets this flag; the row is removed later by the purge
+    # (see hda_privileged/purge.py), once all of its data sets are gone.
+    deleted = models.BooleanField(
+        default=False,
+        help_text='Waiting to be removed from the database; hidden everywhere else'
+    )
+
+    objects = Health_Indicator_QuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if self.slug is None or self.slug == '':
             self.slug = slugify(self.name)
@@ -83,12 +99,63 @@ class Document(models.Model):
     # the file
     file = models.FileField(upload_to=get_upload_path)
 
+    # SHA-256 of the uploaded file's contents (before any compression), so an identical
+    # re-upload can reuse the data set made from this one; see hda_privileged/documents.py
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+
+    # how the file's columns were read (one of the codes in UPLOAD_FORMAT_CHOICES)
+    column_format = models.CharField(max_length=20, blank=True)
+
+    # whether the stored file is gzipped (see the UPLOAD_COMPRESSION setting)
+    compressed = models.BooleanField(default=False)
+
+
+class Data_Set_QuerySet(models.QuerySet):
+
+    def live(self):
+        """Data sets that can be shown publicly (see Data_Set.status)"""
+        return self.filter(status=Data_Set.LIVE)
+
 
 class Data_Set(models.Model):
     """
     A collection of data points for a single year and health indicator, generated from a document
     """
 
+    # Deleting a data set only changes its status, which hides it from every public page and API
+    # endpoint straight away. Its data points and percentiles are deleted later, a batch at a
+    # time, and then the data set itself (see hda_privileged/purge.py).
+    # Uploads are read into a new 'staging' data set, which only goes live once all of its
+    # points and percentiles are saved (see hda_privileged/ingest.py).
+    STAGING = 'staging'
+    LIVE = 'live'
+    DELETED = 'deleted'
+    STATUS_CHOICES = (
+        (STAGING, 'Staging'),
+        (LIVE, 'Live'),
+        (DELETED, 'Deleted'),
+    )
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=LIVE,
+        db_index=True,
+        help_text='Only live data sets are shown to the public'
+    )
+
+    # the data set that took this one's place, if it was replaced by a new upload; requests for
+    # this data set are answered with that one until this one is purged
+    replaced_by = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='replaces'
+    )
+
+    objects = Data_Set_QuerySet.as_manager()
+
     # the health indicator/metric this data set is for
     indicator = models.ForeignKey(
         Health_Indicator,
@@ -206,6 +273,11 @@ class Data_Point(models.Model):
 
     class Meta:
         verbose_name = 'Data point'
+        indexes = [
+            # finds every data set a county has a point in (e.g. a county's history over
+            # several years) without scanning all the points in those data sets
+            models.Index(fields=['county', 'data_set']),
+        ]
 
 
 # As an alternative to this, if we need more efficiency we can pack arrays of percentile values
@@ -234,3 +306,25 @@ class Percentile(models.Model):
     # by creating instances of this class that reference a specific Data_Set instance.
     # To read them back, use the property 'percentiles' on a Data_Set instance.
     data_set = models.ForeignKey(Data_Set, models.CASCADE, related_name='percentiles')
+
+    class Meta:
+        indexes = [
+            # finds specific percentiles (e.g. the quartiles) of a data set
+            models.Index(fields=['data_set', 'rank']),
+        ]
+
+
+class Cache_Version(models.Model):
+    """
+    A version number for cached copies of some data, shared by every process that caches it
+    (see hda_privileged/versions.py)
+    """
+
+    # what the version is for, e.g. 'data' for all of the public data
+    key = models.CharField(max_length=100, primary_key=True)
+
+    # changed (increased) whenever the data changes
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.value}"
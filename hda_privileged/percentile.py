@@ -1,3 +1,4 @@
+from bisect import bisect_left
 from math import floor
 from itertools import dropwhile
 
@@ -142,3 +143,57 @@ def assign_percentiles_to_points(points, percentiles):
             # assign that percentile (between 0 and 1) to the point
             (p, _) = percentiles[0]
             pt.rank = p
+
+
+def rank_for_value(value, ranks, values, lo=0):
+    """
+    The inverse of `percentile`: finds where a value would rank among a data set's percentiles,
+    even if no point in the data set has that value.
+
+    ranks - the percentiles that were calculated for the data set, in ascending order
+    (e.g. [0.001, 0.002, ... 0.999])
+
+    values - the percentile value for each of those percentiles, i.e. values[i] is the value
+    at percentile ranks[i]. Since percentile values never decrease as the percentile increases,
+    this is sorted in ascending order too, so we can binary search it.
+
+    lo - optional index to start searching from; the result is only correct if value is
+    greater than values[lo - 1] (see ranks_for_values)
+
+    If the value falls between two percentile values, the rank is linearly interpolated between
+    their percentiles, the same way `percentile` interpolates values between ranks. If several
+    percentiles share the value, the lowest of them is returned. Values smaller than the first
+    percentile value get the first percentile, and values larger than the last percentile value
+    get 1, the same as `assign_percentiles_to_points`.
+
+    Returns (rank, index), where index is where the value was found in `values`
+    """
+    if len(values) == 0:
+        raise PercentileBoundsError("Can't rank a value without any percentile values!")
+
+    index = bisect_left(values, value, lo)
+
+    if index == len(values):
+        # larger than every percentile value
+        return (1, index)
+    elif index == 0 or values[index] == value:
+        return (ranks[index], index)
+    else:
+        # values[index - 1] < value < values[index]: interpolate between the two percentiles
+        lower_v, upper_v = values[index - 1], values[index]
+        lower_p, upper_p = ranks[index - 1], ranks[index]
+        fraction = (value - lower_v) / (upper_v - lower_v)
+        return (lower_p + fraction * (upper_p - lower_p), index)
+
+
+def ranks_for_values(query_values, ranks, values):
+    """
+    Calls `rank_for_value` for many values at once, returning a list of ranks in the same order
+    as query_values. The query values are visited in ascending order, so each binary search
+    only has to search the part of the percentile values after the previous one's result.
+    """
+    results = [None] * len(query_values)
+    lo = 0
+    for i in sorted(range(len(query_values)), key=lambda i: query_values[i]):
+        (results[i], lo) = rank_for_value(query_values[i], ranks, values, lo)
+    return results
@@ -0,0 +1,157 @@
+# Removing deleted data sets and indicators from the database.
+#
+# A data set has thousands of data points, and deleting them all in one go (as a cascade from
+# the data set, inside the request that deleted it) holds locks on the data point table for as
+# long as that takes, and can make the request time out. Instead, deleting a data set or
+# indicator just marks it (see Data_Set.status and Health_Indicator.deleted), which hides it
+# from the public straight away, and the rows are purged afterwards:
+#
+# - each data set's points are deleted a batch at a time, each batch in its own short
+#   transaction, then its percentiles, and then the data set itself (which sends the usual
+#   post_delete signals, so caches and exports are cleaned up);
+# - deleted indicators are removed once they have no data sets left.
+#
+# `start_purge` runs the purge in a background thread of the web process, if the
+# PURGE_IN_BACKGROUND setting is on. The `purge_deleted_data` management command does the same
+# thing (e.g. from cron, or if the server restarted while a purge was running).
+
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+
+from .models import Data_Point, Data_Set, Health_Indicator, Percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+# only one purge runs at a time in each process
+_purge_lock = threading.Lock()
+
+
+def purge_batch_size():
+    return getattr(settings, 'PURGE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def delete_points_batch(data_set_id, batch_size):
+    """
+    Deletes up to `batch_size` data points of a data set.
+    :return: how many points were deleted
+    :rtype: int
+    """
+    ids = list(
+        Data_Point.objects
+        .filter(data_set_id=data_set_id)
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if ids:
+        # data points have no dependents or signal receivers, so this is a single DELETE
+        Data_Point.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def purge_data_set(data_set_id, batch_size=None, progress=None):
+    """
+    Deletes a deleted data set's points (a batch at a time), percentiles and then the data set.
+    Does nothing if the data set is live, or already gone.
+
+    :param data_set_id: primary key of a Data_Set with status DELETED
+    :type data_set_id: int
+    :param batch_size: how many data points to delete at a time
+    :type batch_size: int
+    :param progress: (optional) called with the number of points deleted after each batch
+    :type progress: callable
+    :return: how many data points were deleted
+    :rtype: int
+    """
+    batch_size = batch_size or purge_batch_size()
+    deleted_points = 0
+    while True:
+        # check every batch, in case the data set has been restored or purged by someone else
+        if not Data_Set.objects.filter(pk=data_set_id, status=Data_Set.DELETED).exists():
+            return deleted_points
+        count = delete_points_batch(data_set_id, batch_size)
+        if count == 0:
+            break
+        deleted_points += count
+        if progress is not None:
+            progress(deleted_points)
+
+    Percentile.objects.filter(data_set_id=data_set_id).delete()
+    data_set = Data_Set.objects.filter(pk=data_set_id, status=Data_Set.DELETED).first()
+    if data_set is not None:
+        data_set.delete()
+    return deleted_points
+
+
+def purge_deleted(batch_size=None, progress=None):
+    """
+    Purges every deleted data set, then every deleted indicator that has no data sets left.
+
+    :param progress: (optional) called with (data set ID, points deleted so far) after each batch
+    :type progress: callable
+    :return: how many data sets and indicators were removed
+    :rtype: (int, int)
+    """
+    data_set_ids = list(
+        Data_Set.objects.filter(status=Data_Set.DELETED).order_by('id').values_list('id', flat=True)
+    )
+    for data_set_id in data_set_ids:
+        on_batch = (lambda points: progress(data_set_id, points)) if progress else None
+        purge_data_set(data_set_id, batch_size, on_batch)
+
+    indicators = Health_Indicator.objects \
+        .filter(deleted=True) \
+        .annotate(data_set_count=Count('data_sets')) \
+        .filter(data_set_count=0)
+    removed_indicators = 0
+    for indicator in indicators:
+        indicator.delete()
+        removed_indicators += 1
+
+    return (len(data_set_ids), removed_indicators)
+
+
+def purge_progress():
+    """
+    :return: how many deleted data sets are waiting to be purged, and how many data points
+        they still have (shown on the dashboard)
+    :rtype: dict
+    """
+    return {
+        'data_sets': Data_Set.objects.filter(status=Data_Set.DELETED).count(),
+        'points': Data_Point.objects.filter(data_set__status=Data_Set.DELETED).count(),
+    }
+
+
+def _run_purge():
+    try:
+        # keep going until nothing is left, including anything deleted while this was running
+        while purge_deleted() != (0, 0):
+            pass
+    except Exception:
+        logger.exception('Purging deleted data failed; run the purge_deleted_data command to retry')
+    finally:
+        # threads get their own database connection, which Django won't close for us
+        connection.close()
+        _purge_lock.release()
+
+
+def start_purge():
+    """
+    Starts purging deleted data sets and indicators in a background thread, if the
+    PURGE_IN_BACKGROUND setting is on and a purge isn't already running in this process.
+    :return: whether a purge was started
+    :rtype: bool
+    """
+    if not getattr(settings, 'PURGE_IN_BACKGROUND', False):
+        return False
+    if not _purge_lock.acquire(blocking=False):
+        # the running purge will find whatever was just deleted
+        return False
+    thread = threading.Thread(target=_run_purge, name='purge-deleted-data', daemon=True)
+    thread.start()
+    return True
@@ -0,0 +1,48 @@
+# Signals sent by the data model, and the receivers that send them.
+#
+# States and counties are loaded once by a migration and are effectively static, so several
+# parts of the app keep precomputed copies of them (API payloads, search indexes, etc.).
+# Instead of each of those listening to save/delete signals for both models, they can listen
+# to the single `geography_changed` signal defined here, and throw away their copy when it fires.
+#
+# Note that QuerySet.update() and bulk_create() do not send model signals - code that changes
+# states or counties that way should send `geography_changed` itself.
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .geography import reload_geography
+from .models import Data_Point, Data_Set, Health_Indicator, US_State, US_County
+from .versions import bump_data_version
+
+# sent (with sender=the model class) whenever a US_State or US_County is saved or deleted
+geography_changed = Signal()
+
+
+@receiver(post_save, sender=US_State)
+@receiver(post_delete, sender=US_State)
+@receiver(post_save, sender=US_County)
+@receiver(post_delete, sender=US_County)
+def send_geography_changed(sender, **kwargs):
+    geography_changed.send(sender=sender)
+
+
+@receiver(geography_changed)
+def forget_geography(sender, **kwargs):
+    reload_geography()
+
+
+# Anything that changes what the public pages show makes cached pages stale. (Uploads also
+# bump the version once their data points are saved, since bulk_create sends no signals.)
+@receiver(post_save, sender=Data_Set)
+@receiver(post_delete, sender=Data_Set)
+@receiver(post_save, sender=Health_Indicator)
+@receiver(post_delete, sender=Health_Indicator)
+@receiver(post_save, sender=Data_Point)
+def change_data_version(sender, **kwargs):
+    bump_data_version()
+
+
+@receiver(geography_changed)
+def change_data_version_for_geography(sender, **kwargs):
+    bump_data_version()
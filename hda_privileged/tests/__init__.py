@@ -0,0 +1,18 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def commit_hooks_run():
+    """
+    Runs whatever was passed to transaction.on_commit in the block when the block ends, as if
+    the transaction had been committed. (TestCase never commits, so they wouldn't run at all;
+    Django 3.2 adds TestCase.captureOnCommitCallbacks for this.)
+    """
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for (savepoint_ids, func) in callbacks:
+        func()
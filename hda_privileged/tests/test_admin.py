@@ -0,0 +1,104 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from hda_privileged import admin
+from hda_privileged.models import Data_Point, Data_Set, US_County
+from hda_privileged.versions import data_set_version
+
+
+class DataPointAdminTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('load_random_data_set', '--count', '60', stdout=StringIO())
+        cls.data_set = Data_Set.objects.get()
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(username='admin', email='admin@example.com', password='12345')
+
+    def setUp(self):
+        self.client.login(username='admin', password='12345')
+
+    def get(self, path, params=None):
+        response = self.client.get(path, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_data_set_page_links_to_points(self):
+        response = self.get(f'/admin/hda_privileged/data_set/{self.data_set.id}/change/')
+        self.assertContains(response, f'/admin/hda_privileged/data_point/?data_set__id__exact={self.data_set.id}')
+        # no inline form rows for the points
+        self.assertNotContains(response, 'data_points-0-value')
+
+    def test_editing_points_changes_data_set_version(self):
+        point = self.data_set.data_points.first()
+        version = data_set_version(self.data_set.id)
+        point.value = 1.0
+        point.save()
+        self.assertNotEqual(data_set_version(self.data_set.id), version)
+
+        version = data_set_version(self.data_set.id)
+        response = self.client.post(f'/admin/hda_privileged/data_point/{point.id}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotEqual(data_set_version(self.data_set.id), version)
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(path)
+        return len(queries)
+
+    def add_data_sets(self, count):
+        Data_Set.objects.bulk_create(
+            Data_Set(indicator_id=self.data_set.indicator_id, year=2000 + i) for i in range(count))
+
+    # replaced_by isn't a <select> of every data set, each naming its indicator, and the inline
+    # forms on the indicator's page don't each query their indicator
+    def test_data_set_pages_query_count_does_not_grow(self):
+        paths = [
+            f'/admin/hda_privileged/data_set/{self.data_set.id}/change/',
+            f'/admin/hda_privileged/health_indicator/{self.data_set.indicator_id}/change/',
+        ]
+        # the first requests also load things that are cached afterwards
+        for path in paths:
+            self.get(path)
+        few = [self.count_queries(path) for path in paths]
+        Data_Set.objects.bulk_create(
+            Data_Set(indicator_id=self.data_set.indicator_id, year=2000 + i) for i in range(10))
+        many = [self.count_queries(path) for path in paths]
+        self.assertEqual(many, few)
+
+    def test_county_page_links_to_points(self):
+        county = US_County.objects.get(state='AL', fips='001')
+        response = self.get(f'/admin/hda_privileged/us_county/{county.id}/change/')
+        self.assertContains(response, f'/admin/hda_privileged/data_point/?county__id__exact={county.id}')
+        self.assertNotContains(response, 'data_points-0-value')
+
+    def test_filtered_point_list(self):
+        response = self.get('/admin/hda_privileged/data_point/', {'data_set__id__exact': self.data_set.id})
+        self.assertEqual(response.context['cl'].result_count, 60)
+
+    # rows don't each query their county or data set, and there's no extra full count
+    def test_point_list_query_count_does_not_grow(self):
+        path = '/admin/hda_privileged/data_point/'
+        with CaptureQueriesContext(connection) as few:
+            self.get(path, {'data_set__id__exact': self.data_set.id, 'q': 'Autauga'})
+        with CaptureQueriesContext(connection) as many:
+            self.get(path)
+        self.assertEqual(len(few), len(many))
+
+    def test_estimated_count_when_unfiltered(self):
+        with patch.object(admin, 'estimated_row_count', return_value=10 ** 7):
+            unfiltered = admin.EstimatedCountPaginator(Data_Point.objects.order_by('pk'), 100)
+            filtered = admin.EstimatedCountPaginator(Data_Point.objects.filter(data_set=self.data_set).order_by('pk'), 100)
+            self.assertEqual(unfiltered.count, 10 ** 7)
+            self.assertEqual(filtered.count, 60)
+
+    def test_exact_count_without_estimate(self):
+        # SQLite has no estimates
+        paginator = admin.EstimatedCountPaginator(Data_Point.objects.order_by('pk'), 100)
+        self.assertEqual(paginator.count, 60)
@@ -0,0 +1,75 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from hda_privileged.geography import get_geography
+from hda_privileged.models import Data_Set, Document, Health_Indicator
+from hda_privileged.views import PrivDashboardView
+
+
+class PrivDashboardTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        for year in (2015, 2016, 2017):
+            call_command('load_random_data_set', '--year', str(year), '--count', str(year - 2010), stdout=out)
+        call_command('load_random_data_set', '--indicator', 'Other', '--count', '3', stdout=out)
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='testuser', password='12345')
+        cls.indicator = Health_Indicator.objects.get(name='Test Indicator')
+
+    def setUp(self):
+        self.client.login(username='testuser', password='12345')
+
+    def dashboard(self, path='/priv/home/', **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_point_counts_and_coverage(self):
+        datasets = self.dashboard(sort='year').context['datasets']
+        counts = [(ds.year, ds.point_count) for ds in datasets]
+        self.assertEqual(counts, [(2015, 5), (2016, 6), (2017, 7), (2018, 3)])
+        county_count = len(get_geography().counties)
+        self.assertAlmostEqual(datasets[0].coverage, 5 * 100.0 / county_count)
+
+    def test_sorting(self):
+        years = [ds.year for ds in self.dashboard(sort='-points').context['datasets']]
+        self.assertEqual(years, [2017, 2016, 2015, 2018])
+        names = [ds.indicator.name for ds in self.dashboard(sort='indicator').context['datasets']]
+        self.assertEqual(names, ['Other', 'Test Indicator', 'Test Indicator', 'Test Indicator'])
+        # unknown sort keys fall back to the default
+        self.assertEqual(self.dashboard(sort='nonsense').context['sort'], '-uploaded')
+
+    def test_selected_indicator(self):
+        response = self.dashboard(f'/priv/home/{self.indicator.id}/')
+        self.assertEqual(response.context['selected_indicator'], self.indicator)
+        self.assertEqual(len(response.context['datasets']), 3)
+
+    def test_pagination(self):
+        with patch.object(PrivDashboardView, 'paginate_by', 3):
+            first = self.dashboard(sort='year')
+            second = self.dashboard(sort='year', page=2)
+        self.assertTrue(first.context['is_paginated'])
+        self.assertEqual([ds.year for ds in first.context['datasets']], [2015, 2016, 2017])
+        self.assertEqual([ds.year for ds in second.context['datasets']], [2018])
+        # the next page link keeps the sort order
+        self.assertContains(first, '?page=2&amp;sort=year')
+
+    # rows don't each query their indicator, document, user or points
+    def test_query_count_does_not_grow(self):
+        with CaptureQueriesContext(connection) as few:
+            self.dashboard()
+        document = Document.objects.create(source='test', user=self.user, file='test.csv')
+        Data_Set.objects.filter(indicator=self.indicator).update(source_document=document)
+        for year in range(2000, 2010):
+            self.indicator.data_sets.create(year=year, source_document=document)
+        with CaptureQueriesContext(connection) as many:
+            self.dashboard()
+        self.assertEqual(len(few), len(many))
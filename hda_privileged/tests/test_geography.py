@@ -0,0 +1,65 @@
+from django.test import TestCase
+
+from hda_privileged.geography import get_geography, reload_geography
+from hda_privileged.models import US_County, US_State
+
+
+class GeographyTestCase(TestCase):
+
+    def setUp(self):
+        reload_geography()
+        self.geography = get_geography()
+
+    def test_matches_database(self):
+        self.assertEqual(len(self.geography.states), US_State.objects.count())
+        self.assertEqual(len(self.geography.counties), US_County.objects.count())
+        for county in US_County.objects.select_related('state').order_by('?')[:20]:
+            with self.subTest(county=county.fips5):
+                record = self.geography.county(county.fips5)
+                self.assertEqual(record.id, county.id)
+                self.assertEqual(record.name, county.name)
+                self.assertEqual(record.search_str, county.search_str)
+                self.assertEqual(record.state.full, county.state.full)
+
+    def test_state_lookups(self):
+        tn = self.geography.state('tn')
+        self.assertEqual(tn.full, 'Tennessee')
+        self.assertIs(self.geography.state_with_fips('47'), tn)
+        self.assertIs(self.geography.state_named('Tennessee'), tn)
+        self.assertIsNone(self.geography.state('ZZ'))
+        self.assertEqual(len(tn.counties), US_County.objects.filter(state='TN').count())
+
+    def test_county_lookups(self):
+        washington = self.geography.county('47179')
+        self.assertEqual(washington.name, 'Washington County')
+        self.assertIs(self.geography.county_with_id(washington.id), washington)
+        self.assertIs(self.geography.county_in_state(washington.state, '179'), washington)
+        self.assertIs(self.geography.counties[washington.ordinal], washington)
+        self.assertIsNone(self.geography.county('47999'))
+
+    def test_county_names(self):
+        ga = self.geography.state('GA')
+        self.assertEqual(self.geography.county_named(ga, 'Clay').fips5, '13061')
+        self.assertEqual(self.geography.county_named(ga, 'Clayton').fips5, '13063')
+        self.assertIsNone(self.geography.county_named(ga, 'Not a county'))
+        # the same matching as the database lookup it replaced: the start of the name, in the
+        # same case
+        self.assertEqual(self.geography.county_named(ga, 'Clayton County').fips5, '13063')
+        self.assertIsNone(self.geography.county_named(ga, 'clay'))
+        self.assertIsNone(self.geography.county_named(self.geography.state('TN'), 'Clayton'))
+
+    def test_records_are_read_only(self):
+        with self.assertRaises(AttributeError):
+            self.geography.county('47179').name = 'Something else'
+        with self.assertRaises(AttributeError):
+            self.geography.county('47179').population = 0
+
+    def test_lookups_do_not_query(self):
+        with self.assertNumQueries(0):
+            get_geography().county('47179')
+
+    def test_geography_change_reloads(self):
+        US_State.objects.create(short='ZZ', full='Zedland', fips='99')
+        self.assertEqual(get_geography().state('ZZ').full, 'Zedland')
+        US_State.objects.filter(short='ZZ').delete()
+        self.assertIsNone(get_geography().state('ZZ'))
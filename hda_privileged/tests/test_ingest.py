@@ -0,0 +1,252 @@
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+
+from app_api.util.percentiles import cache_key as percentiles_key
+from hda_privileged.documents import find_duplicate, open_document, store_upload
+from hda_privileged.ingest import current_data_set_id, ingest_document, publish, replace_data_set
+from hda_privileged.models import Data_Point, Data_Set, Document, Health_Indicator, Percentile
+from hda_privileged.tests import commit_hooks_run
+from hda_privileged.upload_reading import CHOICE_1FIPS
+
+FIPS = ['01001', '01003', '01005', '47179']
+
+
+def csv_content(values):
+    rows = [f'{fips},{value}' for (fips, value) in zip(FIPS, values)]
+    return '\n'.join(['FIPS,Value'] + rows) + '\n'
+
+
+@override_settings(PURGE_IN_BACKGROUND=False)
+class IngestTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.indicator = Health_Indicator.objects.create(name='Ingested')
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='testuser', password='12345')
+
+    def setUp(self):
+        cache.clear()
+
+    def document(self, values):
+        document = Document(source='test')
+        document.file.save('data.csv', ContentFile(csv_content(values).encode('utf-8')))
+        return document
+
+    def ingest(self, values):
+        return ingest_document(self.document(values), self.indicator, 2018, CHOICE_1FIPS)
+
+    def live(self, values):
+        (data_set, _) = self.ingest(values)
+        publish(data_set)
+        return data_set
+
+    def test_staging_data_set_is_complete_but_hidden(self):
+        (data_set, invalid) = self.ingest([1, 2, 3, 4])
+        self.assertEqual(invalid, {})
+        self.assertEqual(data_set.status, Data_Set.STAGING)
+        self.assertEqual(data_set.data_points.count(), 4)
+        self.assertTrue(Percentile.objects.filter(data_set=data_set).exists())
+        self.assertFalse(Data_Set.objects.live().filter(pk=data_set.id).exists())
+        self.assertEqual(self.client.get(f'/api/chart/percentiles/{data_set.id}/').status_code, 500)
+        publish(data_set)
+        self.assertEqual(self.client.get(f'/api/chart/percentiles/{data_set.id}/').status_code, 200)
+
+    def test_failed_ingest_is_thrown_away(self):
+        with self.assertRaises(TypeError):
+            ingest_document(self.document([1, 2, 3, 4]), self.indicator, 2018, 'no such format')
+        self.assertEqual(list(Data_Set.objects.values_list('status', flat=True)), [Data_Set.DELETED])
+
+    def test_replace_swaps_data_sets(self):
+        old = self.live([1, 2, 3, 4])
+        (new, _) = self.ingest([10, 20, 30, 40])
+        replace_data_set(old, new)
+        old.refresh_from_db()
+        new.refresh_from_db()
+        self.assertEqual((old.status, old.replaced_by), (Data_Set.DELETED, new))
+        self.assertEqual(new.status, Data_Set.LIVE)
+        self.assertEqual(current_data_set_id(old.id), new.id)
+        self.assertEqual(current_data_set_id(new.id), new.id)
+
+    def test_cached_copies_are_forgotten_after_commit(self):
+        old = self.live([1, 2, 3, 4])
+        (new, _) = self.ingest([10, 20, 30, 40])
+        self.client.get(f'/api/chart/percentiles/{old.id}/')
+        self.assertIsNotNone(cache.get(percentiles_key(old.id)))
+        with commit_hooks_run():
+            replace_data_set(old, new)
+            # other requests still see the old data set as live until the swap is committed,
+            # and would just cache it again
+            self.assertIsNotNone(cache.get(percentiles_key(old.id)))
+        self.assertIsNone(cache.get(percentiles_key(old.id)))
+
+    def test_replaced_data_set_is_answered_with_replacement(self):
+        old = self.live([1, 2, 3, 4])
+        (new, _) = self.ingest([10, 20, 30, 40])
+        replace_data_set(old, new)
+        params = {'county': '01001'}
+        points = self.client.get(f'/api/chart/points/{old.id}', params).json()
+        self.assertEqual(points['config']['data'][0]['y'], 10.0)
+        percentiles = self.client.get(f'/api/chart/percentiles/{old.id}/').json()
+        self.assertEqual(percentiles, self.client.get(f'/api/chart/percentiles/{new.id}/').json())
+        chart = self.client.get(f'/chart/{old.id}', params)
+        self.assertEqual(chart.context['data_set_id'], new.id)
+
+    def test_replaced_data_set_ranks_with_replacement(self):
+        old = self.live([1, 2, 3, 4])
+        (new, _) = self.ingest([10, 20, 30, 40])
+        replace_data_set(old, new)
+        ranks = self.client.get(f'/api/chart/rank/{old.id}', {'value': '25'}).json()
+        self.assertEqual(ranks, self.client.get(f'/api/chart/rank/{new.id}', {'value': '25'}).json())
+        self.assertEqual(ranks['data_set_id'], new.id)
+
+    def test_replaced_data_set_sparkline_is_replacement(self):
+        old = self.live([1, 2, 3, 4])
+        (new, _) = self.ingest([40, 30, 20, 10])
+        params = {'county': '01001'}
+        before = self.client.get(f'/api/chart/sparkline/{old.id}.svg', params).content
+        with commit_hooks_run():
+            replace_data_set(old, new)
+        response = self.client.get(f'/api/chart/sparkline/{old.id}.svg', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.content, before)
+        self.assertEqual(response.content, self.client.get(f'/api/chart/sparkline/{new.id}.svg', params).content)
+
+    def test_replacement_of_replacement(self):
+        first = self.live([1, 2, 3, 4])
+        params = {'county': '01001'}
+        (second, _) = self.ingest([10, 20, 30, 40])
+        replace_data_set(first, second)
+        points = self.client.get(f'/api/chart/points/{first.id}', params).json()
+        self.assertEqual(points['config']['data'][0]['y'], 10.0)
+        (third, _) = self.ingest([100, 200, 300, 400])
+        replace_data_set(second, third)
+        points = self.client.get(f'/api/chart/points/{first.id}', params).json()
+        self.assertEqual(points['config']['data'][0]['y'], 100.0)
+
+    def test_only_live_data_sets_are_replaced(self):
+        (staging, _) = self.ingest([1, 2, 3, 4])
+        (new, _) = self.ingest([10, 20, 30, 40])
+        with self.assertRaises(Data_Set.DoesNotExist):
+            replace_data_set(staging, new)
+        new.refresh_from_db()
+        self.assertEqual(new.status, Data_Set.STAGING)
+
+    def test_replace_view(self):
+        old = self.live([1, 2, 3, 4])
+        self.client.login(username='testuser', password='12345')
+        upload = SimpleUploadedFile('new.csv', csv_content([5, 6, 7, 8]).encode('utf-8'))
+        response = self.client.post(f'/priv/dataset/replace/{old.id}/', {
+            'file': upload,
+            'column_format': CHOICE_1FIPS,
+            'source': 'corrected',
+        })
+        self.assertEqual(response.status_code, 200)
+        new = Data_Set.objects.live().get()
+        self.assertEqual((new.indicator, new.year), (self.indicator, 2018))
+        self.assertEqual(new.source_document.source, 'corrected')
+        self.assertEqual(sorted(new.data_points.values_list('value', flat=True)), [5, 6, 7, 8])
+        old.refresh_from_db()
+        self.assertEqual(old.replaced_by, new)
+        # the old points stay until the purge removes them
+        self.assertEqual(Data_Point.objects.filter(data_set=old).count(), 4)
+
+    def upload(self, values, year=2018, column_format=CHOICE_1FIPS):
+        upload = SimpleUploadedFile('data.csv', csv_content(values).encode('utf-8'))
+        return self.client.post('/priv/upload/', {
+            'file': upload,
+            'column_format': column_format,
+            'indicator': self.indicator.id,
+            'year': year,
+            'source': 'test',
+        })
+
+    def test_identical_upload_reuses_data_set(self):
+        self.client.login(username='testuser', password='12345')
+        self.assertEqual(self.upload([1, 2, 3, 4]).status_code, 200)
+        first = Data_Set.objects.live().get()
+        self.assertEqual(len(first.source_document.content_hash), 64)
+        self.assertEqual(first.source_document.column_format, CHOICE_1FIPS)
+
+        # the duplicate is found before the upload is stored (or compressed)
+        with patch('hda_privileged.views.store_upload') as store:
+            response = self.upload([1, 2, 3, 4])
+        self.assertFalse(store.called)
+        self.assertContains(response, f'data set {first.id}')
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertEqual(list(Data_Set.objects.values_list('id', flat=True)), [first.id])
+
+        # different contents, or the same file for another year, are read as usual
+        self.upload([1, 2, 3, 5])
+        self.upload([1, 2, 3, 4], year=2017)
+        self.assertEqual(Data_Set.objects.live().count(), 3)
+
+    def test_replacing_with_same_file_does_nothing(self):
+        self.client.login(username='testuser', password='12345')
+        self.upload([1, 2, 3, 4])
+        old = Data_Set.objects.live().get()
+        upload = SimpleUploadedFile('same.csv', csv_content([1, 2, 3, 4]).encode('utf-8'))
+        self.client.post(f'/priv/dataset/replace/{old.id}/', {
+            'file': upload,
+            'column_format': CHOICE_1FIPS,
+            'source': 'again',
+        })
+        self.assertEqual(list(Data_Set.objects.values_list('id', 'status')), [(old.id, Data_Set.LIVE)])
+
+    @override_settings(UPLOAD_COMPRESSION=True)
+    def test_compressed_upload(self):
+        content = csv_content([1, 2, 3, 4])
+        document = Document(source='test', column_format=CHOICE_1FIPS)
+        store_upload(document, SimpleUploadedFile('data.csv', content.encode('utf-8')))
+        document.save()
+        self.assertTrue(document.compressed)
+        self.assertTrue(document.file.name.endswith('.csv.gz'))
+        with open_document(document) as file:
+            self.assertEqual(file.read(), content)
+
+        (data_set, invalid) = ingest_document(document, self.indicator, 2018, CHOICE_1FIPS)
+        self.assertEqual((data_set.data_points.count(), invalid), (4, {}))
+        publish(data_set)
+        # the hash is of the uncompressed contents
+        plain = Document(source='test')
+        store_upload(plain, SimpleUploadedFile('data.csv', content.encode('utf-8')))
+        self.assertEqual(find_duplicate(plain.content_hash, self.indicator, 2018, CHOICE_1FIPS), data_set)
+
+    def test_upload_still_checks_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='testuser', password='12345')
+        upload = SimpleUploadedFile('data.csv', csv_content([1, 2, 3, 4]).encode('utf-8'))
+        response = client.post('/priv/upload/', {
+            'file': upload,
+            'column_format': CHOICE_1FIPS,
+            'indicator': self.indicator.id,
+            'year': 2018,
+        })
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Data_Set.objects.exists())
+
+    def test_rows_read_during_upload_are_used(self):
+        document = self.document([1, 2, 3, 4])
+        rows = [{'FIPS': '47179', 'Value': '9'}]
+        (data_set, _) = ingest_document(document, self.indicator, 2018, CHOICE_1FIPS, rows)
+        self.assertEqual(list(data_set.data_points.values_list('value', flat=True)), [9])
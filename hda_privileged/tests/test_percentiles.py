@@ -5,7 +5,9 @@ from hda_privileged.percentile import (
     percentile,
     get_percentile_values,
     get_percentiles_for_points,
-    assign_percentiles_to_points)
+    assign_percentiles_to_points,
+    rank_for_value,
+    ranks_for_values)
 from functools import reduce
 
 
@@ -328,3 +330,48 @@ class AddToPointsTestCase(TestCase):
                 if rank is not None:  # because this can happen...
                     percentile_value = percentile_values[rank]
                     self.assertLessEqual(value, percentile_value)
+
+
+class RankForValueTestCase(TestCase):
+
+    def setUp(self):
+        self.values = list(range(1, 101))
+        self.pvs = get_percentiles_for_points([MockPoint(v) for v in self.values])
+        self.ranks = [p for (p, _) in self.pvs]
+        self.percentile_values = [pv for (_, pv) in self.pvs]
+
+    # ranking a percentile value should give back its percentile
+    def test_inverts_percentile(self):
+        for (p, pv) in self.pvs[10:990:37]:
+            with self.subTest(p=p):
+                (r, _) = rank_for_value(pv, self.ranks, self.percentile_values)
+                self.assertAlmostEqual(r, p)
+
+    # values between two percentile values are interpolated
+    def test_interpolates(self):
+        (p1, v1), (p2, v2) = self.pvs[500], self.pvs[501]
+        (r, _) = rank_for_value((v1 + v2) / 2, self.ranks, self.percentile_values)
+        self.assertAlmostEqual(r, (p1 + p2) / 2)
+
+    def test_out_of_range(self):
+        (low, _) = rank_for_value(-1000, self.ranks, self.percentile_values)
+        (high, _) = rank_for_value(1000, self.ranks, self.percentile_values)
+        self.assertEqual(low, self.ranks[0])
+        self.assertEqual(high, 1)
+
+    # when several percentiles have the same value, use the lowest one
+    def test_repeated_values(self):
+        ranks = [0.25, 0.5, 0.75]
+        values = [1, 2, 2]
+        (r, _) = rank_for_value(2, ranks, values)
+        self.assertEqual(r, 0.5)
+
+    def test_no_percentiles(self):
+        with self.assertRaises(PercentileBoundsError):
+            rank_for_value(1, [], [])
+
+    # the batch version should agree with ranking each value separately, in the original order
+    def test_many_values(self):
+        queries = [50.5, -3, 12, 12, 99.9, 1000, 0.5, 73.25]
+        expected = [rank_for_value(q, self.ranks, self.percentile_values)[0] for q in queries]
+        self.assertEqual(ranks_for_values(queries, self.ranks, self.percentile_values), expected)
@@ -0,0 +1,94 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from hda_privileged.models import Data_Point, Data_Set, Health_Indicator, Percentile
+from hda_privileged.purge import purge_data_set, purge_deleted, purge_progress, start_purge
+from hda_privileged.tests import commit_hooks_run
+
+
+@override_settings(PURGE_IN_BACKGROUND=False)
+class SoftDeleteTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('load_random_data_set', '--count', '20', stdout=StringIO())
+        cls.data_set = Data_Set.objects.get()
+        cls.indicator = cls.data_set.indicator
+        Percentile.objects.bulk_create(
+            Percentile(data_set=cls.data_set, rank=r / 10, value=float(r)) for r in range(1, 10))
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='testuser', password='12345')
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='testuser', password='12345')
+
+    def delete_data_set(self):
+        response = self.client.post(f'/priv/dataset/delete/{self.data_set.id}/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_delete_only_marks_data_set(self):
+        self.delete_data_set()
+        self.assertEqual(Data_Set.objects.get(pk=self.data_set.id).status, Data_Set.DELETED)
+        self.assertEqual(Data_Point.objects.filter(data_set=self.data_set).count(), 20)
+        self.assertEqual(purge_progress(), {'data_sets': 1, 'points': 20})
+
+    def test_deleted_data_set_is_hidden(self):
+        api_url = f'/api/chart/percentiles/{self.data_set.id}/'
+        self.assertEqual(self.client.get(api_url).status_code, 200)
+        with commit_hooks_run():
+            self.delete_data_set()
+        self.assertEqual(self.client.get(api_url).status_code, 500)
+        self.assertEqual(self.client.get(f'/api/chart/points/{self.data_set.id}', {'county': '01001'}).status_code, 500)
+        self.assertEqual(self.client.get(f'/api/data_set/{self.data_set.id}/export.csv').status_code, 404)
+        chart = self.client.get(f'/chart/{self.data_set.id}', {'county': '01001'})
+        self.assertIn('error', chart.context)
+        overview = self.client.get('/county/AL/001')
+        self.assertEqual(overview.context['all_indicators'], [])
+
+    def test_dashboard_shows_progress(self):
+        self.delete_data_set()
+        response = self.client.get('/priv/home/')
+        self.assertEqual(response.context['purge'], {'data_sets': 1, 'points': 20})
+        self.assertContains(response, 'Removing 1 deleted data set:')
+
+    def test_purge_in_batches(self):
+        self.delete_data_set()
+        progress = []
+        (data_sets, indicators) = purge_deleted(batch_size=7, progress=lambda ds, n: progress.append(n))
+        self.assertEqual((data_sets, indicators), (1, 0))
+        self.assertEqual(progress, [7, 14, 20])
+        self.assertFalse(Data_Set.objects.filter(pk=self.data_set.id).exists())
+        self.assertFalse(Percentile.objects.filter(data_set=self.data_set.id).exists())
+        self.assertEqual(purge_progress(), {'data_sets': 0, 'points': 0})
+
+    def test_live_data_sets_are_not_purged(self):
+        self.assertEqual(purge_data_set(self.data_set.id, batch_size=7), 0)
+        self.assertEqual(Data_Point.objects.filter(data_set=self.data_set).count(), 20)
+
+    def test_indicator_with_live_data_sets_is_kept(self):
+        self.client.post(f'/priv/indicator/delete/{self.indicator.id}/')
+        self.assertFalse(Health_Indicator.objects.get(pk=self.indicator.id).deleted)
+
+    def test_indicator_removed_after_its_data_sets(self):
+        self.delete_data_set()
+        self.client.post(f'/priv/indicator/delete/{self.indicator.id}/')
+        self.assertTrue(Health_Indicator.objects.get(pk=self.indicator.id).deleted)
+        self.assertNotIn(self.indicator, self.client.get('/priv/home/').context['indicators'])
+        self.assertEqual(purge_deleted(), (1, 1))
+        self.assertFalse(Health_Indicator.objects.filter(pk=self.indicator.id).exists())
+
+    def test_command(self):
+        self.delete_data_set()
+        out = StringIO()
+        call_command('purge_deleted_data', '--batch-size', '10', stdout=out)
+        self.assertIn('1 data sets (20 data points) to purge', out.getvalue())
+        self.assertIn('Removed 1 data sets and 0 indicators', out.getvalue())
+        self.assertFalse(Data_Point.objects.filter(data_set=self.data_set.id).exists())
+
+    def test_no_background_purge_when_turned_off(self):
+        self.assertFalse(start_purge())
@@ -0,0 +1,67 @@
+import csv
+import hashlib
+import io
+
+from django.test import SimpleTestCase
+
+from hda_privileged.upload_handlers import CSVStreamParser, ParsingUploadHandler
+
+CONTENT = 'State,County,Value\r\nPuerto Rico,Peñuelas,1.5\r\n"Tennessee","Washington\nCounty",2\r\n\r\nGeorgia,Clay,\r\nGeorgia,"Clay ""B""",3'
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class CSVStreamParserTestCase(SimpleTestCase):
+
+    def expected(self):
+        return list(csv.DictReader(io.StringIO(CONTENT, newline='')))
+
+    def test_rows_match_dict_reader_for_any_chunk_size(self):
+        data = CONTENT.encode('utf-8')
+        # chunks of 1 and 2 bytes split the 'ñ' in half, and every line and quoted value
+        for size in (1, 2, 3, 7, len(data)):
+            with self.subTest(size=size):
+                parser = CSVStreamParser()
+                for chunk in chunked(data, size):
+                    parser.feed(chunk)
+                self.assertEqual(parser.close(), self.expected())
+
+    def test_rows_are_read_before_the_end(self):
+        parser = CSVStreamParser()
+        parser.feed('FIPS,Value\n01001,1\n0100'.encode('utf-8'))
+        self.assertEqual(parser.rows, [{'FIPS': '01001', 'Value': '1'}])
+        parser.feed(b'3,2')
+        self.assertEqual(len(parser.rows), 1)
+        self.assertEqual(parser.close()[-1], {'FIPS': '01003', 'Value': '2'})
+
+    def test_invalid_text(self):
+        parser = CSVStreamParser()
+        with self.assertRaises(UnicodeDecodeError):
+            parser.feed(b'FIPS,Value\n\xff\xfe\n')
+
+
+class ParsingUploadHandlerTestCase(SimpleTestCase):
+
+    def upload(self, handler, field_name, data):
+        handler.new_file(field_name, 'data.csv', 'text/csv', len(data))
+        for (i, chunk) in enumerate(chunked(data, 4)):
+            # chunks are passed on to the next handler unchanged
+            self.assertEqual(handler.receive_data_chunk(chunk, i * 4), chunk)
+        self.assertIsNone(handler.file_complete(len(data)))
+
+    def test_hashes_and_parses_watched_field(self):
+        data = 'FIPS,Value\n01001,1\n'.encode('utf-8')
+        handler = ParsingUploadHandler(field_name='file')
+        self.upload(handler, 'other', b'not,this\n')
+        self.assertIsNone(handler.content_hash)
+        self.upload(handler, 'file', data)
+        self.assertEqual(handler.content_hash, hashlib.sha256(data).hexdigest())
+        self.assertEqual(handler.rows, [{'FIPS': '01001', 'Value': '1'}])
+
+    def test_unparseable_file_is_only_hashed(self):
+        handler = ParsingUploadHandler(field_name='file')
+        self.upload(handler, 'file', b'FIPS,Value\n\xff\xfe,1\n')
+        self.assertEqual(len(handler.content_hash), 64)
+        self.assertIsNone(handler.rows)
@@ -0,0 +1,153 @@
+# Reading uploaded CSV files while they are being received.
+#
+# Without this, an upload is written to storage, and then opened again and read from the start
+# once the request is complete. `ParsingUploadHandler` sits in front of Django's own upload
+# handlers (which still write the file to a temporary file or memory, to be saved as usual) and
+# sees every chunk of the file as it arrives: it hashes it (see documents.py) and splits it into
+# CSV rows, so a big file has been read by the time its last byte arrives.
+#
+# The rows can't be turned into data points yet: which columns identify the county depends on
+# the column format, which is a form field, and the form is only available once the whole request
+# has been read. Matching rows to counties is done in memory (see geography.py), so it is quick.
+#
+# If the file isn't valid UTF-8 or CSV, the handler gives up on it (`rows` is None) and the file
+# is read back from storage as before, which reports the error.
+# ~ see https://docs.djangoproject.com/en/2.1/topics/http/file-uploads/#upload-handlers
+
+import codecs
+import csv
+import hashlib
+from collections import deque
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class _Records:
+    """
+    An iterator over complete CSV records that are fed to it a few at a time. Unlike a list
+    iterator, it can be read again after it has run out, once more records have been added.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+        return self.pending.popleft()
+
+
+class CSVStreamParser:
+    """
+    Reads rows (as csv.DictReader does) out of a CSV file that arrives in chunks of bytes.
+    Chunks can end anywhere: in the middle of a UTF-8 character, a line, or a quoted value with
+    line breaks in it. Only complete records are passed on to the CSV reader.
+    """
+
+    def __init__(self, encoding='utf-8'):
+        self.rows = []
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        # text received after the last complete record
+        self._partial = ''
+        self._records = _Records()
+        self._reader = csv.DictReader(self._records)
+
+    def _split_records(self, text):
+        """
+        :return: the complete records in `text`, and whatever is left after them
+        :rtype: (list, str)
+        """
+        records = []
+        record = ''
+        for line in text.splitlines(keepends=True):
+            record += line
+            # a line break ends the record, unless it is inside quotes (quotes in values are
+            # doubled, so a record with an odd number of them isn't finished)
+            if line[-1] in '\r\n' and record.count('"') % 2 == 0:
+                records.append(record)
+                record = ''
+        return (records, record)
+
+    def _read_records(self, records):
+        self._records.pending.extend(records)
+        self.rows.extend(self._reader)
+
+    def feed(self, data):
+        """
+        :param data: the next chunk of the file
+        :type data: bytes
+        :raises UnicodeDecodeError, csv.Error: if the file isn't valid text, or CSV
+        """
+        text = self._partial + self._decoder.decode(data)
+        (records, self._partial) = self._split_records(text)
+        self._read_records(records)
+
+    def close(self):
+        """
+        Reads whatever is left (a last line without a line break).
+        :return: the rows of the file
+        :rtype: list
+        """
+        text = self._partial + self._decoder.decode(b'', final=True)
+        self._partial = ''
+        if text:
+            self._read_records([text])
+        return self.rows
+
+
+class ParsingUploadHandler(FileUploadHandler):
+    """
+    Hashes and parses one file field of an upload as it is received, passing every chunk on to
+    the next upload handler unchanged. Has to be the first upload handler, so:
+
+        handler = ParsingUploadHandler(request, 'file')
+        request.upload_handlers.insert(0, handler)
+
+    before anything reads request.POST or request.FILES. Afterwards, `content_hash` and `rows`
+    are set if a file was uploaded in that field (`rows` stays None if it couldn't be parsed).
+    """
+
+    def __init__(self, request=None, field_name='file'):
+        super().__init__(request)
+        self.watched_field = field_name
+        self.content_hash = None
+        self.rows = None
+        self._digest = None
+        self._parser = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name == self.watched_field:
+            self._digest = hashlib.sha256()
+            self._parser = CSVStreamParser()
+        else:
+            self._digest = None
+            self._parser = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self._digest is not None:
+            self._digest.update(raw_data)
+        if self._parser is not None:
+            try:
+                self._parser.feed(raw_data)
+            except (UnicodeDecodeError, csv.Error):
+                # leave it to be read from storage
+                self._parser = None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self._digest is not None:
+            self.content_hash = self._digest.hexdigest()
+            self.rows = None
+            if self._parser is not None:
+                try:
+                    self.rows = self._parser.close()
+                except (UnicodeDecodeError, csv.Error):
+                    pass
+        self._digest = None
+        self._parser = None
+        # the next handler makes the uploaded file object
+        return None
@@ -5,7 +5,8 @@
 
 import csv
 
-from hda_privileged.models import US_State, US_County, Data_Point
+from hda_privileged.geography import get_geography
+from hda_privileged.models import Data_Point
 
 # constants
 
@@ -24,24 +25,21 @@ UPLOAD_FORMAT_CHOICES = [
 # the heavy lifting of FIPS code matching is done here: both get_county_2fips
 # and get_county_1fips call this method after extracting the appropriate codes
 # from the CSV rows.
+# Counties are looked up in the geography registry (see geography.py), not the database,
+# so reading a file doesn't cost a query (or two) per row.
 def get_county_with_fips(state_fips, county_fips):
-    try:
-        state = US_State.objects.get(fips=state_fips)
-        county = state.counties.get(fips=county_fips)
-        return (county, None)
-    except US_State.DoesNotExist:
-        msg = {county_fips:state_fips}
-        return (None, msg)
-    except US_County.DoesNotExist:
+    county = get_geography().county(state_fips + county_fips)
+    if county is None:
         msg = {county_fips: state_fips}
         return (None, msg)
+    return (county, None)
 
 # Defines functions that can translate a DictReader row into a county model object
 # based on the selected column format. e.g. if 'choice' is 'NAME', we want a
 # function that takes in a DictReader row and uses the state name and county name
-# to query and return a unique US_County instance.
+# to look up a unique county record.
 # These functions have the signature:
-#     func(row: dict<str, str>): (US_County, None) | (None, String)
+#     func(row: dict<str, str>): (CountyRecord, None) | (None, String)
 # i.e. they return a tuple where either the first member is a county instance,
 # OR the second member is an error message.
 
@@ -62,30 +60,20 @@ def get_county_with_1fips(row):
 def get_county_with_name(row):
     state_name = row['State']
     county_name = row['County']
-    try:
-        state = US_State.objects.get(full=state_name)
-    except US_State.DoesNotExist:
+    geography = get_geography()
+    state = geography.state_named(state_name)
+    if state is None:
         msg = {county_name: state_name}
         return (None, msg)
-    # can't use get with startswith for counties, because of situations like:
+    # can't require an exact match for county names, since files often leave out the
+    # "County" part; but a name can be the start of several counties, like:
     # Clay County, GA and Clayton County, GA
-    # trying to use startswith=Clay will match both of these
-    # county = state.counties.get(name__startswith=county_name)
-    possible_counties = state.counties.filter(name__startswith=county_name)
-    # how do we narrow this down?
-    if possible_counties.count() == 1:
-        return (possible_counties.first(), None)
-    elif possible_counties.count() > 1:
-        # if we matched a substring of multiple  county names, prefer the shortest as being
-        # the most exact; first evaluate the query
-        county_iter = possible_counties.iterator()
-        # sort in ascending order of name length, returning a list
-        shortest_first = sorted(county_iter, key=lambda c: len(c.name))
-        # return the first county (shortest name)
-        return (shortest_first[0], None)
-    else:
+    # in which case the shortest name is the most exact match
+    county = geography.county_named(state, county_name)
+    if county is None:
         msg = {county_name: state_name}
         return (None, msg)
+    return (county, None)
 
 # map choice options to the appropriate function for parsing counties
 UPLOAD_FORMAT_FUNCTIONS = {
@@ -111,6 +99,17 @@ def read_data_points_from_file(file, choice, data_set):
         A list of Data_Point model objects, one per row in the CSV file, all pointing to
         the indicated Data_Set instance.
     """
+    return read_data_points_from_rows(csv.DictReader(file), choice, data_set)
+
+
+def read_data_points_from_rows(rows, choice, data_set):
+    """ Like read_data_points_from_file, for rows that have already been read from a CSV file
+    (e.g. by the upload handler in upload_handlers.py, while the file was being uploaded).
+    PARAMETERS:
+        rows : an iterable of dicts, as produced by csv.DictReader
+        choice : one of the choice codes from UPLOAD_FORMAT_CHOICES
+        data_set : a Data_Set model instance
+    """
     county_getter = UPLOAD_FORMAT_FUNCTIONS.get(choice, None)
     if not county_getter:
         raise TypeError(f"Choice {choice} did not match to a county parsing function")
@@ -119,7 +118,7 @@ def read_data_points_from_file(file, choice, data_set):
     successful_counties_datapoints = []
 
     count = 0
-    for row in csv.DictReader(file):
+    for row in rows:
         # read a row
         (county, error) = county_getter(row)
         # handle the results
@@ -130,7 +129,7 @@ def read_data_points_from_file(file, choice, data_set):
             value_str = row.get('Value', None)
             value = float(value_str) if value_str else None
             # create and collect (but do not save!) the data point
-            data_point = Data_Point(county=county, data_set=data_set, value=value)
+            data_point = Data_Point(county_id=county.id, data_set=data_set, value=value)
             successful_counties_datapoints.append(data_point)
         elif error is not None:
             unsuccessful_counties_datapoints.update(error)
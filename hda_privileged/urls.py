@@ -30,6 +30,11 @@ urlpatterns = [
          login_required(views.DataSetDelete.as_view(),
                         login_url='priv:login'),
          name='deleteDataset'),
+    # replace an existing dataset with a new upload
+    path('dataset/replace/<int:post_pk>/',
+         login_required(views.ReplaceDataSetView.as_view(),
+                        login_url='priv:login'),
+         name='replaceDataset'),
     # upload page
     path('upload/',
          login_required(views.UploadNewDataView.as_view(), login_url='priv:login'),
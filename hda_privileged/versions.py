@@ -0,0 +1,90 @@
+# Version numbers for cached copies of data.
+#
+# Anything derived from a data set (rendered charts, serialized series...) can include the data
+# set's version in its cache key. Bumping the version makes every one of those keys miss, so
+# nothing has to know which cache entries exist in order to throw them away.
+# There is also a single version for all the public data, for things (like whole pages) that
+# depend on more than one data set.
+#
+# Versions are stored in the database (see Cache_Version), since every web process has to see a
+# bump straight away, and the default cache is local to each process. Reading one is a primary
+# key lookup. Rows are never deleted, so a version never goes back to a number that has already
+# been used (even for a data set whose ID is reused).
+
+from django.db.models import F
+
+from .models import Cache_Version
+
+
+def get_version(key):
+    """
+    :return: the version stored for a key (0 until it is first bumped)
+    :rtype: int
+    """
+    value = Cache_Version.objects.filter(key=key).values_list('value', flat=True).first()
+    return value or 0
+
+
+def bump_version(key):
+    # an UPDATE is atomic, so bumps from different processes at once all count
+    if not Cache_Version.objects.filter(key=key).update(value=F('value') + 1):
+        (version, created) = Cache_Version.objects.get_or_create(key=key, defaults={'value': 1})
+        if not created:
+            # someone else created it in between
+            Cache_Version.objects.filter(key=key).update(value=F('value') + 1)
+
+
+def data_set_version_key(data_set_id):
+    return f"data_set:{data_set_id}"
+
+
+def data_set_version(data_set_id):
+    """
+    :param data_set_id: primary key of a Data_Set
+    :type data_set_id: int
+    :return: the current version of the data set's contents
+    :rtype: int
+    """
+    return get_version(data_set_version_key(data_set_id))
+
+
+def data_set_versions(data_set_ids):
+    """
+    Looks up the versions of several data sets in one query.
+
+    :param data_set_ids: primary keys of Data_Sets
+    :type data_set_ids: List<int>
+    :return: the current version of each data set's contents, by ID
+    :rtype: dict
+    """
+    keys = {data_set_version_key(data_set_id): data_set_id for data_set_id in data_set_ids}
+    versions = {data_set_id: 0 for data_set_id in data_set_ids}
+    for (key, value) in Cache_Version.objects.filter(key__in=keys).values_list('key', 'value'):
+        versions[keys[key]] = value
+    return versions
+
+
+def bump_data_set_version(data_set_id):
+    """
+    Changes the version of a data set, so that anything cached for the old version is ignored
+    """
+    bump_version(data_set_version_key(data_set_id))
+
+
+DATA_VERSION_KEY = 'data'
+
+
+def data_version():
+    """
+    :return: the current version of *all* the public data - indicators, data sets and
+        geography. Whole pages are cached by this version (see hda_public/page_cache.py)
+    :rtype: int
+    """
+    return get_version(DATA_VERSION_KEY)
+
+
+def bump_data_version():
+    """
+    Changes the version of all the public data, after an upload, a deletion, or an edit
+    """
+    bump_version(DATA_VERSION_KEY)
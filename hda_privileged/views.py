@@ -1,19 +1,24 @@
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, get_user, logout
 from django.http import HttpResponse, HttpResponseRedirect
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views import View
-from django.views.generic import TemplateView
+from django.views.generic import ListView, TemplateView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-# Error message for user if trying to delete a foreign key
-from django.db.models.deletion import ProtectedError
+from django.db.models import Count, ExpressionWrapper, F, FloatField
 import json
 
-from .forms import LoginForm, UploadNewDataForm, HealthIndicatorForm
-from .models import Document, Data_Set, Data_Point, Percentile, Health_Indicator
-from .percentile import get_percentiles_for_points, assign_percentiles_to_points
-from .upload_reading import read_data_points_from_file
+from .documents import find_duplicate, hash_upload, store_upload
+from .forms import LoginForm, UploadNewDataForm, ReplaceDataSetForm, HealthIndicatorForm
+from .geography import get_geography
+from .ingest import ingest_document, publish, replace_data_set
+from .models import Document, Data_Set, Health_Indicator
+from .purge import purge_progress, start_purge
+from .upload_handlers import ParsingUploadHandler
+from hda_public.page_cache import page_cache_stats
 
 
 # ------------------------------------------------
@@ -80,6 +85,8 @@ class HealthIndicatorUpdate(UpdateView):
 
 # Allows user to delete an indicator. Indicators are protected and cannot be deleted if tied to data records.
 # Developed by Kim Hawkins
+# Deleting only marks the indicator as deleted; it is removed from the database once its (deleted)
+# data sets have been purged, see hda_privileged/purge.py
 class HealthIndicatorDelete(DeleteView):
     """
     :param DeleteView: Generic Class-Based View Django Template
@@ -94,11 +101,13 @@ class HealthIndicatorDelete(DeleteView):
         :returns: Returns current template with protected indicator error message
         """
         self.object = self.get_object()
-        try:
-            self.object.delete()
+        if not self.object.data_sets.live().exists():
+            self.object.deleted = True
+            self.object.save(update_fields=['deleted'])
+            start_purge()
             # user can confirm indicator was deleted by reviewing list on dashboard
             return HttpResponseRedirect(reverse_lazy('priv:dashboard1'))
-        except ProtectedError:
+        else:
             msg = messages.add_message(
                 self.request, messages.ERROR, ' is tied to existing datasets and cannot be deleted.')
         # This code found at https://stackoverflow.com/questions/39560175/django-redirect-to-same-page-after-post-method-using-class-based-views
@@ -107,6 +116,8 @@ class HealthIndicatorDelete(DeleteView):
 
 
 # to delete an existing dataset
+# The data set is hidden straight away, and its data points are purged in the background
+# (see hda_privileged/purge.py); the dashboard shows how many are left.
 class DataSetDelete(DeleteView):
     model = Data_Set
     fields = ('source_document.file',)
@@ -116,48 +127,122 @@ class DataSetDelete(DeleteView):
 
     def delete(self, request, *args, **kwargs):
         self.object = self.get_object()
-        self.object.delete()
+        self.object.status = Data_Set.DELETED
+        self.object.save(update_fields=['status'])
+        start_purge()
         return HttpResponseRedirect(self.success_url)
 
 
 # Displays Privileged users dashboard
-class PrivDashboardView(TemplateView):
+class PrivDashboardView(ListView):
+    """
+    Lists the data sets (of every indicator, or of the selected one) a page at a time, with how
+    many data points each has and what fraction of all counties that covers. The whole page
+    comes from one query for the indicators, and one each to count and fetch the data sets -
+    however many data sets there are.
+
+    The listing can be sorted with `?sort=<key>` (see `sort_orders`; prefix the key with '-'
+    to reverse it), and paged with `?page=<n>`.
+    """
     template_name = 'hda_privileged/privdashboard.html'
+    context_object_name = 'datasets'
+    paginate_by = 50
+
+    # sort key -> order_by fields; ties are broken by ID so pages don't overlap
+    sort_orders = {
+        'year': ('year', 'id'),
+        'indicator': ('indicator__name', 'year', 'id'),
+        'uploaded': ('source_document__uploaded_at', 'id'),
+        'points': ('point_count', 'id'),
+    }
+    default_sort = '-uploaded'
+
+    def get_selected_indicator(self):
+        # did the URL specify an indicator? use filter + first, because get would throw an
+        # error if the ID doesn't exist, whereas this will have a value of None
+        selected_id = self.kwargs.get('indicator', None)
+        if selected_id is None:
+            return None
+        return Health_Indicator.objects.live().filter(pk=selected_id).first()
+
+    def get_sort(self):
+        """
+        :return: the requested sort key (e.g. 'year' or '-points'), or the default if the
+            request didn't ask for one we know
+        :rtype: str
+        """
+        sort = self.request.GET.get('sort', self.default_sort)
+        if sort.lstrip('-') not in self.sort_orders:
+            sort = self.default_sort
+        return sort
+
+    def get_ordering(self):
+        sort = self.get_sort()
+        fields = self.sort_orders[sort.lstrip('-')]
+        if sort.startswith('-'):
+            return [f"-{field}" for field in fields]
+        return list(fields)
+
+    def get_queryset(self):
+        # coverage is the percentage of all counties that have a point in the data set
+        county_count = len(get_geography().counties) or 1
+        query = Data_Set.objects \
+            .select_related('indicator', 'source_document__user') \
+            .annotate(point_count=Count('data_points')) \
+            .annotate(coverage=ExpressionWrapper(
+                F('point_count') * 100.0 / county_count, output_field=FloatField()))
+
+        if self.selected_indicator is not None:
+            # if a valid indicator was selected, only show data sets from that indicator
+            query = query.filter(indicator=self.selected_indicator)
+
+        return query.order_by(*self.get_ordering())
+
+    def get(self, request, *args, **kwargs):
+        self.selected_indicator = self.get_selected_indicator()
+        return super().get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
-        # call super to get the base context
+        # call super to get the base context, including the page of data sets
         context = super().get_context_data(**kwargs)
 
         # get indicators for left side of view
-        indicators = Health_Indicator.objects.all()
-        context['indicators'] = indicators
+        context['indicators'] = Health_Indicator.objects.live()
+        context['selected_indicator'] = self.selected_indicator
 
-        # did the URL specify an indicator? Get indicator and save in context
-        selected_id = self.kwargs.get('indicator', None)
-        # now check if that ID is valid - is there an indicator with that ID?
-        # use filter + first because get will throw an error if the object doesn't exist;
-        # whereas this will have a value of None if it doesn't exist
-        selected_indicator = indicators.filter(pk=selected_id).first()
-        context['selected_indicator'] = selected_indicator
-
-        if selected_indicator is not None:
-            # if a valid indiactor was selected, only show datasets from that indicator
-            context['indicator_message'] = f'Data sets for {selected_indicator.name}'
-            context['datasets'] = selected_indicator.data_sets.all()
+        if self.selected_indicator is not None:
+            context['indicator_message'] = f'Data sets for {self.selected_indicator.name}'
         else:
-            # otherwise, show all the data sets
             context['indicator_message'] = 'Data sets for all indicators'
-            context['datasets'] = Data_Set.objects.all()
+
+        context['sort'] = self.get_sort()
+
+        # deleted data sets whose data points haven't all been removed yet
+        context['purge'] = purge_progress()
+
+        # how well the public page cache is working
+        context['page_cache'] = page_cache_stats()
 
         return context
 
 
 # to upload New DataSet
+# The uploaded file is hashed and read into CSV rows while it is being received (see
+# hda_privileged/upload_handlers.py), instead of being read back from storage afterwards.
+# The upload handler has to be added before request.POST is read, and the CSRF middleware reads
+# it, so the CSRF check is made in dispatch instead.
+# ~ see https://docs.djangoproject.com/en/2.1/topics/http/file-uploads/#modifying-upload-handlers-on-the-fly
+@method_decorator(csrf_exempt, name='dispatch')
 class UploadNewDataView(View):
     form_class = UploadNewDataForm
     template_name = 'hda_privileged/upload_metric.html'
     file_field_name = 'file'
 
+    def dispatch(self, request, *args, **kwargs):
+        self.upload_handler = ParsingUploadHandler(request, self.file_field_name)
+        request.upload_handlers.insert(0, self.upload_handler)
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
     def _get_uploaded_file(self, request):
         return request.FILES[self.file_field_name]
 
@@ -172,57 +257,58 @@ class UploadNewDataView(View):
 
         return okay
 
-    def _handle_form_submission(self, request, form):
+    def _get_content_hash(self, request):
+        # the file was hashed as it was received (see hda_privileged/upload_handlers.py)
+        return self.upload_handler.content_hash or hash_upload(self._get_uploaded_file(request))
+
+    def _make_document(self, request, form, content_hash):
         myfile = self._get_uploaded_file(request)
 
         # create a Document class instance
+        # (only once the upload is known not to be a duplicate, since storing it may compress it,
+        # see hda_privileged/documents.py)
         doc = Document(
-            file=myfile,
-            source=form.cleaned_data['source']
+            source=form.cleaned_data['source'],
+            column_format=form.cleaned_data['column_format']
         )
+        store_upload(doc, myfile, content_hash)
 
         # add a user if we have one
         if request.user.is_authenticated:
             doc.user = get_user(request)
 
+        return doc
+
+    def _save_document(self, request, doc):
         # this saves the file in the directory specified
         # in the Document model FileField.upload_to attribute
         # and saves the rest of the model in the database
         doc.save()
         messages.success(request, "Document uploaded successfully")
+        return doc
+
+    def _handle_form_submission(self, request, form):
+        content_hash = self._get_content_hash(request)
 
         # Create and save a Data Set here! ##
+        # (it is read into a staging data set, which is only published once it is complete)
         indicator = form.cleaned_data['indicator']
         year = form.cleaned_data['year']
-
-        data_set = Data_Set(
-            indicator=indicator,
-            year=year,
-            source_document=doc
-        )
-
-        data_set.save()
-
         format_choice = form.cleaned_data['column_format']
-        doc.file.open(mode='rt')
-        # read_data_points_from_file returns two values: successful_datapoints, and unsuccessful datapoints
-        successful_data_points, invalid_counties_and_states = read_data_points_from_file(doc.file, format_choice,
-                                                                                         data_set)
-        doc.file.close()
 
-        # calculate the percentile-values for this data set
-        percentile_values = get_percentiles_for_points(successful_data_points)
+        # the same file was already uploaded for this indicator and year: its data set is still live,
+        # so there is nothing to read or rank again
+        duplicate = find_duplicate(content_hash, indicator, year, format_choice)
+        if duplicate is not None:
+            messages.info(request, f"This file was already uploaded as {duplicate!s} (data set {duplicate.id}), "
+                                   "so it was not read again")
+            return {}
 
-        # assign a percentile to each data point
-        assign_percentiles_to_points(successful_data_points, percentile_values)
-
-        # transform our list of tuples List<(P, PV)> into a list of Percentile model objects
-        percentile_models = [Percentile(rank=p, value=pv, data_set=data_set) for (p, pv) in percentile_values]
-
-        # save all the data points and percentile values using bulk_create, for speed
-        Data_Point.objects.bulk_create(successful_data_points)
-        Percentile.objects.bulk_create(percentile_models)
-        #
+        doc = self._make_document(request, form, content_hash)
+        self._save_document(request, doc)
+        (data_set, invalid_counties_and_states) = ingest_document(
+            doc, indicator, year, format_choice, self.upload_handler.rows)
+        publish(data_set)
 
         # This is mostly for debugging, but it's a useful example of using the messages API
         messages.info(request, f"Indicator was {indicator!s}")
@@ -237,6 +323,7 @@ class UploadNewDataView(View):
     def post(self, request, *args, **kwargs):
         # bind the form
         form = self.form_class(request.POST, request.FILES)
+        invalid_counties_and_states = {}
 
         if form.is_valid() and self._check_file_ext(request):
             # Is there a Django-y way of adding more validation?
@@ -246,6 +333,64 @@ class UploadNewDataView(View):
                       {'form': form, 'invalid_counties_and_states': invalid_counties_and_states})
 
 
+# to replace an existing dataset with a new upload of the same indicator and year
+# The new file is read into a staging data set, which is swapped in for the old one in a single
+# transaction (see hda_privileged/ingest.py), so public pages never show a missing or partly
+# uploaded data set. The old data set is then purged in the background.
+class ReplaceDataSetView(UploadNewDataView):
+    form_class = ReplaceDataSetForm
+    template_name = 'hda_privileged/replace_dataset.html'
+
+    def _get_data_set(self):
+        query = Data_Set.objects.live().select_related('indicator')
+        return get_object_or_404(query, pk=self.kwargs.get('post_pk', None))
+
+    def _handle_form_submission(self, request, form):
+        old = self.data_set
+        content_hash = self._get_content_hash(request)
+        format_choice = form.cleaned_data['column_format']
+
+        if find_duplicate(content_hash, old.indicator, old.year, format_choice) == old:
+            messages.info(request, f"This file is the one {old!s} was made from, so nothing was replaced")
+            return {}
+
+        doc = self._make_document(request, form, content_hash)
+        self._save_document(request, doc)
+        (new, invalid_counties_and_states) = ingest_document(
+            doc, old.indicator, old.year, format_choice, self.upload_handler.rows)
+
+        try:
+            replace_data_set(old, new)
+            messages.info(request, f"{old!s} was replaced by data set {new.id}")
+        except Data_Set.DoesNotExist:
+            # someone else deleted or replaced it while this file was being read
+            new.status = Data_Set.DELETED
+            new.save(update_fields=['status'])
+            start_purge()
+            messages.warning(request, f"{old!s} was deleted or replaced before this upload finished")
+
+        return invalid_counties_and_states
+
+    def get(self, request, *args, **kwargs):
+        self.data_set = self._get_data_set()
+        form = self.form_class()
+        return render(request, self.template_name, {'form': form, 'data_set': self.data_set})
+
+    def post(self, request, *args, **kwargs):
+        self.data_set = self._get_data_set()
+        form = self.form_class(request.POST, request.FILES)
+        invalid_counties_and_states = {}
+
+        if form.is_valid() and self._check_file_ext(request):
+            invalid_counties_and_states = self._handle_form_submission(request, form)
+
+        return render(request, self.template_name, {
+            'form': form,
+            'data_set': self.data_set,
+            'invalid_counties_and_states': invalid_counties_and_states,
+        })
+
+
 class HealthIndicator(TemplateView):
     model = Health_Indicator
     template_name = 'hda_privileged/create_metric.html'
@@ -32,3 +32,15 @@ class FIPS3Converter():
 
     def to_url(self, value):
         return value
+
+
+class FIPS5Converter():
+    """ Matches full 5-digit county FIPS codes (2-digit state + 3-digit county), as a string
+    """
+    regex = '[0-9]{5}'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
@@ -0,0 +1,121 @@
+# Whole-page caching for public pages that look the same to every visitor.
+#
+# Overview, chart and location list pages only change when the data does, so their HTML is
+# cached under a key made from the URL path, the (sorted) query string, and the global data
+# version (see hda_privileged/versions.py). Uploading, deleting or editing anything bumps the
+# version, so stale pages are never served; they just expire.
+#
+# Pages are only cached and served from the cache for anonymous visitors with no pending
+# messages. Responses that set cookies or add messages (e.g. ChartView's warnings about unknown
+# FIPS codes) are not cached either. Hits and misses are counted, so the hit ratio can be shown
+# on the dashboard.
+#
+# This is like Django's cache_page decorator, but that can only expire pages after a timeout:
+# https://docs.djangoproject.com/en/2.1/topics/cache/#the-per-view-cache
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from hda_privileged.versions import data_version
+
+DEFAULT_TIMEOUT = 60 * 60
+
+HITS_KEY = 'page_cache:hits'
+MISSES_KEY = 'page_cache:misses'
+
+
+def page_cache_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def page_key(request):
+    """
+    :return: the cache key for the page at the request's URL, for the current data version
+    :rtype: str
+    """
+    # parameter order doesn't change the page, but the order of a parameter's values might
+    params = sorted((key, request.GET.getlist(key)) for key in request.GET)
+    query = '&'.join(f"{key}={','.join(values)}" for (key, values) in params)
+    url = hashlib.sha1(f"{request.path}?{query}".encode('utf-8')).hexdigest()
+    return f"page:{data_version()}:{url}"
+
+
+def is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # without a session cookie there is no user to look up, so skip the query
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+        return False
+    # pending messages have to be shown on whichever page comes next
+    return len(get_messages(request)) == 0
+
+
+def is_cacheable_response(request, response):
+    return response.status_code == 200 \
+        and not response.streaming \
+        and not response.cookies \
+        and len(get_messages(request)) == 0
+
+
+def count(key):
+    # add is a no-op if the counter exists; incr is atomic in most cache backends
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def page_cache_stats():
+    """
+    :return: how many cacheable requests were answered from the cache or not, and the ratio
+    :rtype: dict
+    """
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'ratio': hits / total if total else None,
+    }
+
+
+def reset_page_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def cache_page_by_data_version(view):
+    """
+    Decorates a view function so that anonymous requests are answered from the page cache
+    when possible. Responses from the cache include an `X-Page-Cache: hit` header.
+    """
+    @wraps(view)
+    def cached_view(request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        key = page_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            count(HITS_KEY)
+            (content, content_type) = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        count(MISSES_KEY)
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if is_cacheable_response(request, response):
+            cache.set(key, (response.content, response['Content-Type']), page_cache_timeout())
+        response['X-Page-Cache'] = 'miss'
+        return response
+
+    return cached_view
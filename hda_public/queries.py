@@ -1,5 +1,6 @@
-from hda_privileged.models import Data_Set, Health_Indicator
+from hda_privileged.models import Data_Point, Data_Set, Health_Indicator
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db.models import Exists, OuterRef, Subquery
 
 DEMO_INDICATOR = 'Obesity'
 
@@ -7,7 +8,7 @@ DEMO_INDICATOR = 'Obesity'
 def dataSetForYear(year, indicator_name=DEMO_INDICATOR):
     try:
         # get throws exceptions if more than one result matches the query
-        result = Data_Set.objects.get(year=year, indicator__name=indicator_name)
+        result = Data_Set.objects.live().get(year=year, indicator__name=indicator_name)
         return result
     except ObjectDoesNotExist:
         # if nothing matched the query, swallow that exception and return None
@@ -20,11 +21,61 @@ def dataSetForYear(year, indicator_name=DEMO_INDICATOR):
 # This method will be used to test the return of all the data sets pointing to a particular year
 def dataSetYearsForIndicator(indicator_name=DEMO_INDICATOR):
     """ This function takes in a KPI name then returns all the years liked to it """
-    results = Data_Set.objects.all().filter(indicator__name = indicator_name).order_by('year')
+    results = Data_Set.objects.live().filter(indicator__name = indicator_name).order_by('year')
     return [ds.year for ds in results]
 
 
 def mostRecentDataSetForIndicator(indicator_id):
-    hi = Health_Indicator.objects.get(pk=indicator_id)
-    sets = hi.data_sets.order_by('-source_document__uploaded_at')
+    hi = Health_Indicator.objects.live().get(pk=indicator_id)
+    sets = hi.data_sets.live().order_by('-source_document__uploaded_at')
     return sets.first()
+
+
+def latestDataSetsForLocation(**point_filters):
+    """
+    Finds every indicator with data for a location, along with the most recent data set for that
+    indicator which has data for the location - all in a single query.
+
+    For each indicator, a subquery picks the latest data set (by year, then by upload) that has
+    at least one matching data point (deleted data sets are skipped). Checking that a data point exists stops at the first one
+    found (using the (county, data set) index), so the cost doesn't grow with the number of
+    data points or earlier data sets.
+
+    :param point_filters: Data_Point field lookups that select the location's data points,
+        e.g. county_id=12 or county__state_id='TN'
+    :return: dictionaries of {'id', 'name', 'important', 'data_set_id'}, one per indicator,
+        in order of indicator ID
+    :rtype: List<dict>
+    """
+    points_for_location = Data_Point.objects.filter(data_set=OuterRef('pk'), **point_filters)
+    latest = Data_Set.objects.live() \
+        .annotate(has_location=Exists(points_for_location)) \
+        .filter(indicator=OuterRef('pk'), has_location=True) \
+        .order_by('-year', '-id') \
+        .values('id')[:1]
+    indicators = Health_Indicator.objects \
+        .annotate(data_set_id=Subquery(latest)) \
+        .filter(data_set_id__isnull=False) \
+        .order_by('id') \
+        .values('id', 'name', 'important', 'data_set_id')
+    return list(indicators)
+
+
+def indicatorsForLocation(**point_filters):
+    """
+    Finds every indicator with at least one data point for a location, in a single query.
+
+    :param point_filters: Data_Point field lookups that select the location's data points,
+        e.g. county_id=12 or county__state_id='TN'
+    :return: the indicators, in order of name
+    :rtype: QuerySet<Health_Indicator>
+    """
+    points_for_location = Data_Point.objects.filter(
+        data_set__indicator=OuterRef('pk'),
+        data_set__status=Data_Set.LIVE,
+        **point_filters
+    )
+    return Health_Indicator.objects \
+        .annotate(has_location=Exists(points_for_location)) \
+        .filter(has_location=True) \
+        .order_by('name')
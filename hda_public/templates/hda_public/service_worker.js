@@ -0,0 +1,59 @@
+/*{% comment %}
+Service worker that serves static files cache-first (see hda_public/views/service_worker.py).
+Pages, API responses and everything else go to the network as usual; chart series and
+prefetch data are kept in IndexedDB by static/js/series_cache.js instead.
+{% endcomment %}*/
+const CACHE_NAME = "{{ cache_name }}";
+const STATIC_URL = "{{ static_url|escapejs }}";
+const CDN_PREFIXES = [{% for prefix in cdn_prefixes %}"{{ prefix|escapejs }}"{% if not forloop.last %}, {% endif %}{% endfor %}];
+
+function isCacheable(request) {
+    if (request.method !== 'GET') {
+        return false;
+    }
+    const url = new URL(request.url);
+    if (url.origin === self.location.origin) {
+        return url.pathname.startsWith(STATIC_URL);
+    }
+    return CDN_PREFIXES.some(prefix => request.url.startsWith(prefix));
+}
+
+self.addEventListener('install', event => {
+    // nothing to download up front; files are cached as pages use them
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+    // throw away caches made by older versions of this worker (for older static files)
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names
+                    .filter(name => name.startsWith('hda-static-') && name !== CACHE_NAME)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    if (!isCacheable(event.request)) {
+        return;
+    }
+    event.respondWith(
+        caches.open(CACHE_NAME).then(cache => {
+            return cache.match(event.request).then(cached => {
+                if (cached) {
+                    return cached;
+                }
+                return fetch(event.request).then(response => {
+                    // opaque (cross-origin, no-cors) responses have status 0 but are still usable
+                    if (response.ok || response.type === 'opaque') {
+                        cache.put(event.request, response.clone());
+                    }
+                    return response;
+                });
+            });
+        })
+    );
+});
@@ -0,0 +1,26 @@
+# Template tag for linking to the typeahead prefetch data files, whose names include a hash
+# of their contents and so change whenever the data does (see app_api/util/prefetch.py)
+
+from django import template
+from django.templatetags.static import static
+
+from app_api.util.prefetch import prefetch_static_path
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_url(kind):
+    """
+    Usage:
+
+        {% load prefetch %}
+        <script>const url = "{% prefetch_url 'county' %}";</script>
+
+    :param kind: which prefetch data to link to, 'county' or 'state'
+    :return: the static URL of the current prefetch data file, or an empty string if the prefetch
+        data hasn't been generated (then suggestions only come from the search API)
+    :rtype: str
+    """
+    path = prefetch_static_path(kind)
+    return static(path) if path else ''
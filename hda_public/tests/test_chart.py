@@ -0,0 +1,77 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from hda_privileged.models import Data_Set, US_County
+from hda_public.views import ChartView
+
+
+class ChartViewTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('load_random_data_set', stdout=StringIO())
+        cls.data_set = Data_Set.objects.first()
+
+    def setUp(self):
+        # the page cache would answer repeated requests without a template context
+        cache.clear()
+
+    def chart(self, fips_list):
+        return self.client.get(f'/chart/{self.data_set.id}', {'county': ','.join(fips_list)})
+
+    def test_counties_keep_requested_order(self):
+        fips_list = ['01005', '47179', '01001']
+        response = self.chart(fips_list)
+        self.assertEqual(response.context['counties'], fips_list)
+        self.assertNotIn('unknown_fips', response.context)
+
+    def test_unknown_fips_warning(self):
+        response = self.chart(['01001', '99999', '01003', '00000'])
+        self.assertEqual(response.context['counties'], ['01001', '01003'])
+        self.assertEqual(response.context['unknown_fips'], '99999, 00000')
+
+    def test_single_county(self):
+        response = self.chart(['47179'])
+        self.assertEqual(response.context['place_name'], 'Washington County, TN')
+        self.assertEqual(response.context['parent_state'], 'TN')
+
+    # looking up the counties costs the same number of queries no matter how many there are
+    def test_county_queries_do_not_grow(self):
+        few = [c.fips5 for c in US_County.objects.all()[:2]]
+        many = [c.fips5 for c in US_County.objects.all()[:50]]
+        # load anything that is cached for the whole data set (e.g. its percentiles)
+        self.chart(few[:1])
+        with CaptureQueriesContext(connection) as few_queries:
+            self.chart(few)
+        with CaptureQueriesContext(connection) as many_queries:
+            self.chart(many)
+        self.assertEqual(len(few_queries), len(many_queries))
+
+    # the page includes the chart's series, from the same serializers as the API
+    def test_initial_series_inline(self):
+        response = self.chart(['01001', '01003'])
+        series = response.context['initial_series']
+        api_points = self.client.get(f'/api/chart/points/{self.data_set.id}', {'county': '01001,01003'}).json()
+        api_percentiles = self.client.get(f'/api/chart/percentiles/{self.data_set.id}/').json()
+        self.assertEqual(series['points']['config'], api_points['config'])
+        self.assertEqual(len(series['percentiles']['config']['data']), len(api_percentiles['config']['data']))
+        self.assertContains(response, '<script id="initial-series" type="application/json">')
+
+    def test_initial_series_can_be_turned_off(self):
+        with patch.object(ChartView, 'inline_series', False):
+            response = self.chart(['01001'])
+        self.assertNotIn('initial_series', response.context)
+        self.assertNotContains(response, 'id="initial-series"')
+
+    # series URLs change with the data set's version, so browsers can keep the responses
+    def test_series_urls_include_version(self):
+        first = self.chart(['01001']).context['series_version']
+        self.assertContains(self.chart(['01001']), f'?v={first}&format=compact')
+        self.data_set.save()
+        self.assertNotEqual(self.chart(['01001']).context['series_version'], first)
@@ -0,0 +1,44 @@
+from django.test import RequestFactory, TestCase
+
+from hda_privileged.geography import get_geography, reload_geography
+from hda_privileged.models import Data_Point, Data_Set, Health_Indicator
+from hda_public.views.location_selection import HealthStatePathView, HealthView
+
+
+class HealthIndicatorViewsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        reload_geography()
+        geography = get_geography()
+        cls.obesity = Health_Indicator.objects.create(name='Obesity')
+        cls.smoking = Health_Indicator.objects.create(name='Smoking')
+        Health_Indicator.objects.create(name='No data')
+
+        # obesity data for two counties in TN; smoking for one other TN county and one in AL
+        obesity = Data_Set.objects.create(indicator=cls.obesity, year=2018)
+        smoking = Data_Set.objects.create(indicator=cls.smoking, year=2018)
+        points = [
+            (obesity, '47179'),
+            (obesity, '47001'),
+            (smoking, '47003'),
+            (smoking, '01001'),
+        ]
+        Data_Point.objects.bulk_create(
+            Data_Point(data_set=ds, county_id=geography.county(fips).id, value=1.0) for (ds, fips) in points)
+
+    def get_indicators(self, view, **kwargs):
+        request = RequestFactory().get('/')
+        response = view.as_view()(request, **kwargs)
+        with self.assertNumQueries(1):
+            return [indicator.name for indicator in response.context_data['indicators']]
+
+    def test_county(self):
+        self.assertEqual(self.get_indicators(HealthView, short='TN', fips='179'), ['Obesity'])
+        self.assertEqual(self.get_indicators(HealthView, short='TN', fips='005'), [])
+
+    # every county in the state counts, not just the last one
+    def test_whole_state(self):
+        self.assertEqual(self.get_indicators(HealthStatePathView, short='TN'), ['Obesity', 'Smoking'])
+        self.assertEqual(self.get_indicators(HealthStatePathView, short='AL'), ['Smoking'])
+        self.assertEqual(self.get_indicators(HealthStatePathView, short='WY'), [])
@@ -0,0 +1,103 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from hda_privileged.geography import get_geography, reload_geography
+from hda_privileged.models import Cache_Version, Data_Point, Data_Set, Health_Indicator, Percentile
+from hda_privileged.versions import bump_data_set_version, bump_data_version, data_set_version
+from hda_public.views.overview import IndicatorOverviewBase
+
+
+class OverviewTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        reload_geography()
+        geography = get_geography()
+        cls.washington = geography.county('47179')
+        cls.autauga = geography.county('01001')
+
+        cls.obesity = Health_Indicator.objects.create(name='Obesity', important=True)
+        cls.smoking = Health_Indicator.objects.create(name='Smoking', important=False)
+        cls.obesity_sets = [cls.add_data_set(cls.obesity, year, [cls.washington]) for year in (2016, 2018, 2017)]
+        # the most recent smoking data set doesn't include Washington County
+        cls.smoking_2016 = cls.add_data_set(cls.smoking, 2016, [cls.washington, cls.autauga])
+        cls.smoking_2017 = cls.add_data_set(cls.smoking, 2017, [cls.autauga])
+
+    @classmethod
+    def add_data_set(cls, indicator, year, counties):
+        data_set = Data_Set.objects.create(indicator=indicator, year=year)
+        Data_Point.objects.bulk_create(
+            Data_Point(data_set=data_set, county_id=county.id, value=1.0, rank=0.5) for county in counties)
+        Percentile.objects.bulk_create(
+            Percentile(data_set=data_set, rank=r / 10, value=float(r)) for r in range(1, 10))
+        return data_set
+
+    def setUp(self):
+        # the page cache would answer repeated requests without a template context
+        cache.clear()
+
+    def overview(self, path):
+        response = self.client.get(path)
+        return (response.context['all_indicators'], response.context['important_indicators'])
+
+    def test_latest_data_set_for_county(self):
+        (all_indicators, important) = self.overview('/county/TN/179')
+        self.assertEqual(all_indicators, [
+            {'name': 'Obesity', 'data_set_id': self.obesity_sets[1].id},
+            {'name': 'Smoking', 'data_set_id': self.smoking_2016.id},
+        ])
+        self.assertEqual(len(important), 1)
+        self.assertEqual(important[0]['data_set_id'], self.obesity_sets[1].id)
+        self.assertIn('<svg', important[0]['sparkline'])
+
+    def test_latest_data_set_for_state(self):
+        (all_indicators, important) = self.overview('/state/AL')
+        self.assertEqual(all_indicators, [{'name': 'Smoking', 'data_set_id': self.smoking_2017.id}])
+        self.assertEqual(important, [])
+
+    def test_no_data(self):
+        (all_indicators, _) = self.overview('/county/TN/001')
+        self.assertEqual(all_indicators, [])
+
+    def test_static_charts_inline(self):
+        response = self.client.get('/county/TN/179')
+        self.assertContains(response, '<svg', count=1)
+        self.assertContains(response, '<title>Obesity: Washington County, TN</title>', html=False)
+        # the series are only requested once the chart is on screen
+        self.assertContains(response, 'SingleChart.smallWhenVisible')
+        self.assertContains(response, '/api/chart/batch?format=compact&')
+
+    # one query for the page, one for the data version and one for the versions of the charted
+    # data sets, however many data sets each indicator has (bumping the data version makes the
+    # page cache miss, but keeps everything else cached)
+    def test_query_count_does_not_grow_with_history(self):
+        self.client.get('/state/TN')
+        bump_data_version()
+        with self.assertNumQueries(3):
+            self.client.get('/state/TN')
+
+        for year in range(1990, 2010):
+            self.add_data_set(self.obesity, year, [self.washington])
+
+        bump_data_version()
+        with self.assertNumQueries(3):
+            (all_indicators, _) = self.overview('/state/TN')
+        self.assertEqual(all_indicators[0]['data_set_id'], self.obesity_sets[1].id)
+
+    # the version in series URLs is stored for good in browsers, so it must come from the
+    # database, not from whichever process happens to render the page
+    def test_series_urls_use_stored_version(self):
+        data_set = self.obesity_sets[1]
+        bump_data_set_version(data_set.id)
+        (important,) = self.client.get('/county/TN/179').context['important_indicators']
+        self.assertEqual(important['version'], data_set_version(data_set.id))
+        self.assertEqual(important['version'], Cache_Version.objects.get(key=f'data_set:{data_set.id}').value)
+
+    def test_inline_series_option(self):
+        with patch.object(IndicatorOverviewBase, 'inline_series', True):
+            response = self.client.get('/county/TN/179')
+        self.assertContains(response, f'id="initial-series-{self.obesity_sets[1].id}"')
+        (important,) = response.context['important_indicators']
+        self.assertEqual(important['initial_series']['points']['config']['data'][0]['name'], 'Washington County')
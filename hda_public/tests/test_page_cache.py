@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F
+from django.test import TestCase
+
+from hda_privileged.models import Cache_Version, Health_Indicator
+from hda_public.page_cache import page_cache_stats
+
+
+class PageCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_requests_are_hits(self):
+        first = self.client.get('/select/TN')
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        # only the data version is read from the database
+        with self.assertNumQueries(1):
+            second = self.client.get('/select/TN')
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(page_cache_stats(), {'hits': 1, 'misses': 1, 'ratio': 0.5})
+
+    def test_query_string_order_does_not_matter(self):
+        self.client.get('/select/', {'choice': 'county', 'page': 2})
+        response = self.client.get('/select/?page=2&choice=county')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        response = self.client.get('/select/', {'choice': 'county', 'page': 3})
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+
+    def test_data_changes_invalidate_pages(self):
+        self.client.get('/select/')
+        indicator = Health_Indicator.objects.create(name='Page Cache Indicator')
+        self.assertEqual(self.client.get('/select/')['X-Page-Cache'], 'miss')
+        indicator.name = 'Renamed'
+        indicator.save()
+        self.assertEqual(self.client.get('/select/')['X-Page-Cache'], 'miss')
+
+    def test_not_for_signed_in_users(self):
+        User.objects.create_user('analyst', password='secret')
+        self.client.login(username='analyst', password='secret')
+        self.client.get('/select/')
+        self.assertNotIn('X-Page-Cache', self.client.get('/select/'))
+
+    # warnings added by the view are part of this response only
+    def test_pages_with_messages_are_not_cached(self):
+        self.client.get('/chart/1?county=99999')
+        response = self.client.get('/chart/1?county=99999')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+
+    def test_version_is_shared_between_processes(self):
+        self.client.get('/select/TN')
+        # another process's cache is empty, but it reads the same version
+        cache.clear()
+        Health_Indicator.objects.create(name='Elsewhere')
+        response = self.client.get('/select/TN')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        # a bump made by another process (with its own cache) is seen here too
+        Cache_Version.objects.filter(key='data').update(value=F('value') + 1)
+        response = self.client.get('/select/TN')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
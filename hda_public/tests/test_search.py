@@ -0,0 +1,47 @@
+from django.test import TestCase
+
+from hda_privileged.models import US_County
+
+
+class SearchViewTestCase(TestCase):
+
+    def test_counties_limited_in_database(self):
+        # a one letter query matches thousands of counties
+        self.assertGreater(US_County.objects.filter(search_str__icontains='a').count(), 1000)
+
+        response = self.client.get('/search/', {'query': 'a'})
+        self.assertEqual(response.status_code, 200)
+
+        page = response.context['county_page']
+        self.assertEqual(len(response.context['counties']), 100)
+        self.assertGreater(page.paginator.num_pages, 10)
+        self.assertContains(response, 'page=2')
+
+    def test_later_pages(self):
+        first = self.client.get('/search/', {'query': 'a'}).context['counties']
+        second = self.client.get('/search/', {'query': 'a', 'page': 2}).context['counties']
+        self.assertEqual(len(second), 100)
+        self.assertFalse(set(c.id for c in first) & set(c.id for c in second))
+
+    def test_states_by_name_or_code(self):
+        # "Vi" matches Virginia and the Virgin Islands by name, and VI by code
+        states = self.client.get('/search/', {'query': 'vi'}).context['states']
+        self.assertEqual([s.short for s in states], ['VI', 'VA'])
+        states = self.client.get('/search/', {'query': 'tn'}).context['states']
+        self.assertEqual([s.short for s in states], ['TN'])
+
+    def test_no_query(self):
+        response = self.client.get('/search/')
+        self.assertIn('error', response.context)
+
+    def test_close_matches_when_nothing_matches(self):
+        response = self.client.get('/search/', {'query': 'Montgomry'})
+        counties = response.context['counties']
+        self.assertTrue(response.context['close_matches'])
+        self.assertGreater(len(counties), 1)
+        self.assertTrue(all(c.name == 'Montgomery County' for c in counties))
+        self.assertContains(response, 'Did you mean')
+
+    def test_no_close_matches_for_exact_results(self):
+        response = self.client.get('/search/', {'query': 'Montgomery'})
+        self.assertNotIn('close_matches', response.context)
@@ -0,0 +1,23 @@
+from django.test import TestCase
+
+from hda_public.views.service_worker import static_version
+
+
+class ServiceWorkerTestCase(TestCase):
+
+    def test_served_from_root(self):
+        response = self.client.get('/service-worker.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertContains(response, f'const CACHE_NAME = "hda-static-{static_version()}";')
+        self.assertContains(response, 'const STATIC_URL = "/static/";')
+
+    def test_static_version_is_stable(self):
+        self.assertEqual(static_version(), static_version())
+        self.assertEqual(len(static_version()), 12)
+
+    def test_pages_register_worker(self):
+        response = self.client.get('/')
+        self.assertContains(response, 'navigator.serviceWorker.register("/service-worker.js")')
+        self.assertContains(response, 'js/series_cache.js')
@@ -6,6 +6,7 @@ from hda_public.views import (
     HealthView,
     ChartView,
     SearchView,
+    ServiceWorkerView,
     IndicatorOverviewCounty,
     IndicatorOverviewState,
     UnknownLocationView,
@@ -14,6 +15,7 @@ from hda_public.views import (
 # only successful method of import for this new view
 from hda_public.views.location_selection import HealthStatePathView
 from hda_public.converters import StateUSPSConverter, FIPS3Converter
+from hda_public.page_cache import cache_page_by_data_version
 
 # custom path converters to validate:
 # - USPS 2-letter state codes:
@@ -28,14 +30,19 @@ urlpatterns = [
     # the home page:
     path('', HomeView.as_view(), name='home'),
     # a chart page that can show any counties given as a query parameter:
-    path('chart/<int:data_set>', ChartView.as_view(), name='chart'),
+    path('chart/<int:data_set>', cache_page_by_data_version(ChartView.as_view()), name='chart'),
     # location selection pages
-    path('select/', StateView.as_view(), name='state_list'),
-    path('select/<usps:short>', CountyView.as_view(), name='county_list'),
+    path('select/', cache_page_by_data_version(StateView.as_view()), name='state_list'),
+    path('select/<usps:short>', cache_page_by_data_version(CountyView.as_view()), name='county_list'),
     # search results page
     path('search/', SearchView.as_view(), name='search'),
     # overview pages for states and counties
-    path('state/<usps:state>', IndicatorOverviewState.as_view(), name='state'),
-    path('county/<usps:state>/<fips3:county>', IndicatorOverviewCounty.as_view(), name='county'),
+    # (these pages, and the ones above, are the same for everyone until the data changes,
+    # so whole pages are cached; see hda_public/page_cache.py)
+    path('state/<usps:state>', cache_page_by_data_version(IndicatorOverviewState.as_view()), name='state'),
+    path('county/<usps:state>/<fips3:county>',
+         cache_page_by_data_version(IndicatorOverviewCounty.as_view()), name='county'),
     path('unknown_location', UnknownLocationView.as_view(), name='unknown_location'),
+    # caches static files in the browser; has to be at the root to control every page
+    path('service-worker.js', ServiceWorkerView.as_view(), name='service_worker'),
 ]
@@ -10,5 +10,6 @@ from .chartview import ChartView
 from .homeview import HomeView
 from .location_selection import StateView, CountyView, HealthView
 from .searchview import SearchView
+from .service_worker import ServiceWorkerView
 from .overview import IndicatorOverviewState, IndicatorOverviewCounty
 from .unknown_location import UnknownLocationView
@@ -6,7 +6,11 @@
 from django.contrib import messages
 from django.views.generic import TemplateView
 
-from hda_privileged.models import US_State, US_County, Data_Set
+from app_api.util.series import percentile_series, point_series
+from hda_privileged.geography import get_geography
+from hda_privileged.ingest import current_data_set_id
+from hda_privileged.models import Data_Set
+from hda_privileged.versions import data_set_version
 
 
 class ChartView(TemplateView):
@@ -37,6 +41,26 @@ class ChartView(TemplateView):
 
     template_name = 'hda_public/chart.html'
 
+    # whether to put the chart's series in the page, so the chart can be drawn without
+    # any requests to the API (see initial_series_decorator)
+    inline_series = True
+
+
+    def get_data_set(self, data_set_id):
+        """
+        :return: the live data set with the given ID - or if that data set has been replaced by a
+            new upload (and not purged yet), its replacement
+        :rtype: Data_Set
+        :raises Data_Set.DoesNotExist: if there is neither
+        """
+        data_sets = Data_Set.objects.live().select_related('indicator')
+        try:
+            return data_sets.get(pk=data_set_id)
+        except Data_Set.DoesNotExist:
+            current_id = current_data_set_id(data_set_id)
+            if current_id is None:
+                raise
+            return data_sets.get(pk=current_id)
 
     def data_set_decorator(self, context):
         """
@@ -58,10 +82,12 @@ class ChartView(TemplateView):
             raise TypeError("Chart view needs a data set ID, but was not given one!")
 
         try:
-            data_set = Data_Set.objects.get(pk=data_set_id)
+            data_set = self.get_data_set(data_set_id)
             context['data_set_id'] = data_set.id
             context['year'] = data_set.year
             context['indicator'] = data_set.indicator
+            # series URLs include the version, so browsers can keep the responses
+            context['series_version'] = data_set_version(data_set.id)
 
             return (context, True)
 
@@ -74,31 +100,28 @@ class ChartView(TemplateView):
 
     def try_get_state(self, usps):
         """
-        Attempt to query a specific US_State from the data model, returning None if it is missing
+        Attempt to look up a specific state in the geography registry, returning None if it is missing
 
         :param usps: ID of the state to retrieve, a 2-letter USPS code
         :type usps: str
-        :return: the US_State matching the given USPS code
-        :rtype: US_State | None
+        :return: the state matching the given USPS code
+        :rtype: StateRecord | None
         """
-        try:
-            return US_State.objects.get(short=usps.upper())
-        except US_State.DoesNotExist:
-            return None
+        return get_geography().state(usps)
 
-    def try_get_county(self, full_fips):
+    def get_counties(self, fips_list):
         """
-        Attempt to query a specific county from the data model, returning None if it is missing
+        Look up every county in a list of FIPS codes in the geography registry,
+        without querying the database.
 
-        :param full_fips: a 5-digit FIPS code for a county or county-equivalent
-        :type full_fips: str
-        :return: the county matching the given FIPS code
-        :rtype: US_County | None
+        :param fips_list: 5-digit FIPS codes for counties or county-equivalents
+        :type fips_list: List<str>
+        :return: map of FIPS code to county, for each FIPS code that matches a county
+        :rtype: dict<str, CountyRecord>
         """
-        try:
-            return US_County.objects.get(fips5=full_fips)
-        except US_County.DoesNotExist:
-            return None
+        geography = get_geography()
+        found = (geography.county(fips) for fips in set(fips_list))
+        return {county.fips5: county for county in found if county is not None}
 
     def state_request_decorator(self, context):
         """
@@ -142,8 +165,7 @@ class ChartView(TemplateView):
             # current_state added to pass in url param when user chooses to go from
             # all counties chart to county selection page: Kim Hawkins
             context['current_state'] = state.short
-            context['counties'] = [
-                county.fips5 for county in state.counties.all().iterator()]
+            context['counties'] = [county.fips5 for county in state.counties]
             return (context, True)
 
     def county_request_decorator(self, context):
@@ -182,8 +204,9 @@ class ChartView(TemplateView):
             return (context, True)
 
         fips_list = fips_str.split(',')
-        # list of pairs, (FIPs, County or None)
-        query_results = [(fips, self.try_get_county(fips)) for fips in fips_list]
+        found = self.get_counties(fips_list)
+        # list of pairs, (FIPs, County or None), in the order they were requested
+        query_results = [(fips, found.get(fips, None)) for fips in fips_list]
         # list of County
         counties = [county for (_, county) in query_results if county is not None]
         # list of FIPs that did not match a county
@@ -206,6 +229,29 @@ class ChartView(TemplateView):
         context['counties'] = [c.fips5 for c in counties]
         return (context, True)
 
+    def initial_series_decorator(self, context):
+        """
+        If the view is set to inline its series, adds the percentile and point series for the
+        chart to the context under 'initial_series', as {'percentiles': ..., 'points': ...}.
+        These come from the same (cached) serializers as the chart series API endpoints.
+
+        :param context: template context dictionary
+        :type context: dict
+        :return: tuple of augmented context and flag for decorate_context
+        :rtype: (dict, bool)
+        """
+        if not self.inline_series:
+            return (context, True)
+
+        data_set_id = context['data_set_id']
+        geography = get_geography()
+        counties = [geography.county(fips) for fips in context.get('counties', [])]
+        context['initial_series'] = {
+            'percentiles': percentile_series(data_set_id),
+            'points': point_series(data_set_id, counties),
+        }
+        return (context, True)
+
     def decorate_context(self, context):
         """
         A helper function that chains several other functions together, each of which takes in
@@ -232,6 +278,7 @@ class ChartView(TemplateView):
             self.data_set_decorator,
             self.state_request_decorator,
             self.county_request_decorator,
+            self.initial_series_decorator,
         ]
 
         context, keep_going, other_args = context, True, []
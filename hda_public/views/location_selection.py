@@ -1,6 +1,9 @@
+from django.http import Http404
 from django.views.generic import TemplateView, ListView
 
-from hda_privileged.models import US_State, US_County, Health_Indicator
+from hda_privileged.geography import get_geography
+from hda_privileged.models import US_State, US_County
+from hda_public.queries import indicatorsForLocation
 
 class StateView(ListView):
     template_name = 'hda_public/state_list.html'
@@ -9,7 +12,8 @@ class StateView(ListView):
     context_object_name = "states"
 
     def get_queryset(self):
-        states = US_State.objects.all().order_by('full')
+        # states come from the geography registry, not the database
+        states = sorted(get_geography().states, key=lambda s: s.full)
         return states
 
     def get_context_data(self, **kwargs):
@@ -24,24 +28,33 @@ class CountyView(ListView):
     model = US_County
     context_object_name = "counties"
 
+    def get_state(self):
+        state_short_name = self.kwargs.get('short', None)
+        if state_short_name is None:
+            return None
+        state = get_geography().state(state_short_name)
+        if state is None:
+            raise Http404(f"No state matches '{state_short_name}'")
+        return state
+
     def get_context_data(self, **kwargs):
         context = super(CountyView, self).get_context_data(**kwargs)
         context['range'] = range(context['paginator'].num_pages)
-        state_short_name = self.kwargs.get('short', None)
+        state = self.get_state()
 
-        if state_short_name is not None:
-            context['state'] = US_State.objects.filter(short=state_short_name).first().full
-            context['state_short_name'] = state_short_name
+        if state is not None:
+            context['state'] = state.full
+            context['state_short_name'] = state.short
 
         return context
 
     def get_queryset(self):
-        state_short_name = self.kwargs.get('short', None)
+        state = self.get_state()
         counties = None
 
-        if state_short_name is not None:
-            associated_state = US_State.objects.filter(short=state_short_name).first()
-            counties = associated_state.counties.order_by('name')
+        if state is not None:
+            # counties come from the geography registry, not the database
+            counties = sorted(state.counties, key=lambda c: c.name)
 
         return counties
 
@@ -68,18 +81,18 @@ class HealthView(TemplateView):
         state_short = self.kwargs.get('short', None)
 
         if fips is not None and state_short is not None:
+            geography = get_geography()
             # get the state the user wants
-            state = US_State.objects.get(short=state_short.upper())
+            state = geography.state(state_short)
+            if state is None:
+                raise Http404(f"No state matches '{state_short}'")
             # get the county the user wants
-            county = state.counties.get(fips=fips)
-            # make a list of every data set containing a data point connected to this county,
-            # by starting with the county's data points and going backwards.
-            # the 'select_related' does *not* affect the result of the query, only how many database queries are required.
-            available_data_sets = [dp.data_set for dp in county.data_points.all().select_related('data_set')]
-            # several data sets may be for the same indicator (perhaps different datasets for different years).
-            # this extracts the indicator from each dataset into a list, then puts that list into a python set object,
-            # which can remove the duplicates for us.
-            unique_indicators = set([ds.indicator for ds in available_data_sets])
+            county = geography.county_in_state(state, fips)
+            if county is None:
+                raise Http404(f"No county in {state.full} matches '{fips}'")
+            # every indicator with a data point for this county, found in one query by the
+            # database, rather than by loading each of the county's data points
+            unique_indicators = indicatorsForLocation(county_id=county.id)
             # pack up the context - including whole objects so we can use multiple properties in the template
             context['state'] = state
             context['county'] = county
@@ -103,20 +116,12 @@ class HealthStatePathView(TemplateView):
         # user selected state from dashboard
         if state_short is not None:
             # get the state the user wants
-            chosen_state = US_State.objects.get(short=state_short.upper())
-            counties = US_County.objects.filter(state=chosen_state)
-            for county in counties:
-                dp = county.data_points
-            # make a list of every data set containing a data point connected to counties in this state,
-            # by starting with the county data points and going backwards.
-            # the 'select_related' does *not* affect the result of the query, only how many database queries are required.
-            available_data_sets = [
-                dp.data_set for dp in county.data_points.all().select_related('data_set')]
-            # several data sets may be for the same indicator (perhaps different datasets for different years).
-            # this extracts the indicator from each dataset into a list, then puts that list into a python set object,
-            # which can remove the duplicates for us.
-            unique_indicators = set(
-                [ds.indicator for ds in available_data_sets])
+            chosen_state = get_geography().state(state_short)
+            if chosen_state is None:
+                raise Http404(f"No state matches '{state_short}'")
+            counties = chosen_state.counties
+            # every indicator with a data point for *any* county in this state, found in one query
+            unique_indicators = indicatorsForLocation(county__state_id=chosen_state.short)
             # pack up the context - including whole objects so we can use multiple properties in the template
             context['state'] = chosen_state
             context['county'] = counties
@@ -12,11 +12,12 @@
 from django.views import View
 from django.shortcuts import render, redirect
 from django.urls import reverse, reverse_lazy
-from django.db.models import Count
 
-from hda_privileged.models import US_State, US_County, Health_Indicator, Data_Set, Data_Point
-
-from util.collections import index_selector, group_by_selector
+from app_api.util.series import percentile_series, point_series
+from app_api.util.sparkline import sparkline
+from hda_privileged.geography import get_geography
+from hda_privileged.versions import data_set_versions
+from hda_public.queries import latestDataSetsForLocation
 
 
 class IndicatorOverviewBase(View):
@@ -24,11 +25,16 @@ class IndicatorOverviewBase(View):
     Base class for overview page views; provides a framework for the state and county views
     to fill in. The key differences are the query string used to request chart data on the page
     (get_chart_location_parameter), the format of the name of the place being displayed,
-    (get_place_name), and which data sets are involved (get_related_data_sets).
+    (get_place_name), and which data points are involved (get_data_point_filter).
 
     Note that this subclasses View, not TemplateView!
     """
 
+    # Whether to put each small chart's series in the page, so the interactive chart can be
+    # drawn without any requests to the API. Off by default: the static previews already show
+    # something straight away, and most visitors never open most of the charts.
+    inline_series = False
+
     def handle_missing_parameter(self):
         return redirect('unknown_location')
 
@@ -50,31 +56,28 @@ class IndicatorOverviewBase(View):
         """
         pass
 
-    def get_related_data_sets(self):
+    def get_data_point_filter(self):
+        """
+        Return Data_Point field lookups that select data points for the requested location.
+        Subclasses MUST implement this!
+        :return: keyword arguments for Data_Point.objects.filter
+        :rtype: dict
+        """
+        pass
+
+    def get_counties(self):
         """
-        Return every data set containing a data point for the requested location.
+        Return the counties to highlight on the charts for the requested location.
         Subclasses MUST implement this!
-        :return: query set of data sets related to the requested location
-        :rtype: QuerySet<Data_Set>
+        :return: county records from the geography registry
+        :rtype: List<CountyRecord>
         """
         pass
 
     def get(self, request, *args, **kwargs):
-        # every data set related to the requested location
-        data_set_meta = self.get_related_data_sets().values('id', 'year', 'indicator')
-        # group these data sets by indicator
-        grouped_by_indicator = group_by_selector(
-            data_set_meta.iterator(),
-            index_selector('indicator')
-        )
-        # sort each group by year, descending
-        for (_, dsm) in grouped_by_indicator.items():
-            dsm.sort(key=index_selector('year'), reverse=True)
-        # now change the map so each indicator ID points to only the ID of the most recent data set:
-        data_set_for_indicator = {ind: dsm[0]['id'] for (ind, dsm) in grouped_by_indicator.items()}
-
-        # at this point, we know what data sets and indicators are available, but we don't
-        # actually have the full indicator objects queried from the database.
+        # one query finds every indicator with data for the requested location,
+        # and the most recent data set for each of them (see hda_public/queries.py)
+        indicators = latestDataSetsForLocation(**self.get_data_point_filter())
 
         # What has to go on this page?
         # 1. One chart for each important indicator
@@ -86,32 +89,48 @@ class IndicatorOverviewBase(View):
         #    b. data set ID (for URL)
         #    c. county or counties (for URL)
 
-        # So it's the same for each. Let's get all our indicator objects:
-        indicator_ids = set(data_set_for_indicator.keys())
-        indicators = Health_Indicator.objects.filter(id__in=indicator_ids)
-
-        # whew. now let's build a list of dictionaries to use in context.
+        # So it's the same for each. Let's build a list of dictionaries to use in context.
         # here's a little mapping function:
         def make_indicator_ctx(indicator):
             return {
-                'name': indicator.name,
-                'data_set_id': data_set_for_indicator[indicator.id]
+                'name': indicator['name'],
+                'data_set_id': indicator['data_set_id']
             }
 
+        place_name = self.get_place_name()
+        counties = self.get_counties()
+
+        # the version of every charted data set, in one query
+        versions = data_set_versions([i['data_set_id'] for i in indicators if i['important']])
+
         # now use the mapping function to construct lists of dictionaries for the template context:
         all_indicator_context = []
         important_indicator_context = []
         for indicator in indicators:
             ctx = make_indicator_ctx(indicator)
             all_indicator_context.append(ctx)
-            if indicator.important:
-                important_indicator_context.append(ctx)
+            if indicator['important']:
+                # important indicators get a chart; it starts out as a static SVG that can be
+                # shown straight away (see app_api/util/sparkline.py)
+                title = f"{indicator['name']}: {place_name}"
+                version = versions[indicator['data_set_id']]
+                svg = sparkline(indicator['data_set_id'], counties, title, version)
+                important_ctx = dict(ctx, sparkline=svg)
+                # series URLs include the version, so browsers can keep the responses
+                important_ctx['version'] = version
+                if self.inline_series:
+                    important_ctx['initial_series'] = {
+                        'percentiles': percentile_series(indicator['data_set_id']),
+                        'points': point_series(indicator['data_set_id'], counties),
+                    }
+                    important_ctx['initial_series_id'] = f"initial-series-{indicator['data_set_id']}"
+                important_indicator_context.append(important_ctx)
 
         context = dict()
 
         context['all_indicators'] = all_indicator_context
         context['important_indicators'] = important_indicator_context
-        context['place_name'] = self.get_place_name()
+        context['place_name'] = place_name
         context['place_query_string'] = self.get_chart_location_parameter()
 
         return render(request, 'hda_public/overview.html', context=context)
@@ -130,24 +149,26 @@ class IndicatorOverviewCounty(IndicatorOverviewBase):
         state_name = self.state.short
         return f"{county_name}, {state_name}"
 
-    def get_related_data_sets(self):
-        # get all the data points this county is in:
-        dps = self.county.data_points.all()
-        # then get all the data sets that have one of those data points:
-        return Data_Set.objects.filter(data_points__in=dps)
+    def get_data_point_filter(self):
+        # data points for this county
+        return {'county_id': self.county.id}
+
+    def get_counties(self):
+        return [self.county]
 
     def get(self, request, state=None, county=None):
         if state is None or county is None:
             return self.handle_missing_parameter()
 
-        try:
-            self.state = US_State.objects.get(pk=state.upper())
-        except US_State.DoesNotExist:
+        # the state and county come from the geography registry, not the database
+        geography = get_geography()
+
+        self.state = geography.state(state)
+        if self.state is None:
             return self.handle_missing_parameter()
 
-        try:
-            self.county = self.state.counties.get(fips=county)
-        except US_County.DoesNotExist:
+        self.county = geography.county_in_state(self.state, county)
+        if self.county is None:
             return self.handle_missing_parameter()
 
         return super(IndicatorOverviewCounty, self).get(request)
@@ -164,21 +185,19 @@ class IndicatorOverviewState(IndicatorOverviewBase):
     def get_place_name(self):
         return f"{self.state.full}"
 
-    def get_related_data_sets(self):
-        # get all the counties in the state:
-        counties = self.state.counties.all()
-        # get all the data points that point at one of the counties:
-        dps = Data_Point.objects.filter(county__in=counties)
-        # then get all the data sets that have one of those data points:
-        return Data_Set.objects.filter(data_points__in=dps)
+    def get_data_point_filter(self):
+        # data points for any of the counties in the state
+        return {'county__state_id': self.state.short}
+
+    def get_counties(self):
+        return self.state.counties
 
     def get(self, request, state=None):
         if state is None:
             return self.handle_missing_parameter()
 
-        try:
-            self.state = US_State.objects.get(pk=state.upper())
-        except US_State.DoesNotExist:
+        self.state = get_geography().state(state)
+        if self.state is None:
             return self.handle_missing_parameter()
 
         return super(IndicatorOverviewState, self).get(request)
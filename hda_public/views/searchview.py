@@ -1,25 +1,33 @@
-
+from django.core.paginator import Paginator
+from django.db.models import Q
 from django.views.generic import TemplateView
 
+from app_api.util.search_backends import get_search_backend
 from hda_privileged.models import US_County, US_State
 
 class SearchView(TemplateView):
     template_name = 'hda_public/search_results.html'
 
-    def find_county_results(self, query):
-        # Orders results first by state, then by name. This does not put the most relevant result
-        # first, but groups results from the same state together, which may make them easier to scan through?
-        matches = US_County.objects.filter(search_str__icontains=query).order_by('state', 'name')
-        # truncate to no more than 100 results!
-        return list(matches.iterator())[:100]
+    # how many counties to show on each page of results
+    county_page_size = 100
+
+    def find_county_results(self, query, page_number=1):
+        # The search backend decides how results are ordered; see app_api/util/search_backends.py
+        matches = get_search_backend().search_counties(query).select_related('state')
+        # Paginating the query set makes the database do the limiting: we only read the
+        # counties on the requested page, rather than every match
+        paginator = Paginator(matches, self.county_page_size)
+        return paginator.get_page(page_number)
+
+    def find_close_county_results(self, query):
+        # counties whose names are a typo or two away from the query, e.g. "Montgomry"
+        close_matches = get_search_backend().fuzzy_counties(query, self.county_page_size)
+        return Paginator(close_matches, self.county_page_size).get_page(1)
 
     def find_state_results(self, query):
-        name_matches = US_State.objects.filter(full__istartswith=query)
-        abbrv_matches = US_State.objects.filter(short__istartswith=query)
-        name_set = set(name_matches.iterator())
-        abbrv_set = set(abbrv_matches.iterator())
-        all_set = name_set | abbrv_set  # set union
-        return sorted(all_set, key=lambda s: s.full)
+        # one query for states matching by name or by USPS code
+        matches = US_State.objects.filter(Q(full__istartswith=query) | Q(short__istartswith=query))
+        return list(matches.order_by('full'))
 
     def get_context_data(self, **kwargs):
         context = super(SearchView, self).get_context_data(**kwargs)
@@ -32,7 +40,12 @@ class SearchView(TemplateView):
 
         context['query'] = query_str
 
-        context['counties'] = self.find_county_results(query_str)
+        county_page = self.find_county_results(query_str, self.request.GET.get('page', 1))
+        if county_page.paginator.count == 0:
+            county_page = self.find_close_county_results(query_str)
+            context['close_matches'] = county_page.paginator.count > 0
+        context['counties'] = county_page.object_list
+        context['county_page'] = county_page
         context['states'] = self.find_state_results(query_str)
 
         return context
@@ -0,0 +1,66 @@
+# ServiceWorkerView - serves the service worker script, which answers requests for static files
+# (our own, and libraries with fixed versions from CDNs) from the browser's cache, so repeat
+# visits only have to download pages and whatever data isn't in the SeriesCache already.
+#
+# Static files don't have hashes in their names, so the worker's cache is named after a hash of
+# all of them instead. When any static file changes, so does the script; browsers install the new
+# worker, which throws away the old cache.
+#
+# The script is served by Django rather than as a static file because a service worker can only
+# control pages at or below its own URL - and every page is below '/'.
+# ~ see https://developer.mozilla.org/en-US/docs/Web/API/Service_Worker_API/Using_Service_Workers
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.views.generic import TemplateView
+
+# libraries loaded from CDNs whose URLs include their version, so they never change
+VERSIONED_CDN_PREFIXES = [
+    'https://ajax.googleapis.com/ajax/libs/jquery/1.10.2/',
+    'https://maxcdn.bootstrapcdn.com/bootstrap/3.3.7/',
+    'https://use.fontawesome.com/releases/v5.3.1/',
+    'https://cdnjs.cloudflare.com/ajax/libs/Chart.js/2.7.2/',
+]
+
+# hash of the static files, computed once per process
+_static_version = None
+
+
+def static_version():
+    """
+    :return: a short hash of the names and contents of every static file
+    :rtype: str
+    """
+    global _static_version
+    if _static_version is None:
+        digest = hashlib.sha1()
+        found = []
+        for finder in finders.get_finders():
+            for (path, storage) in finder.list([]):
+                found.append((path, storage))
+        for (path, storage) in sorted(found, key=lambda item: item[0]):
+            digest.update(path.encode('utf-8'))
+            with storage.open(path) as static_file:
+                digest.update(static_file.read())
+        _static_version = digest.hexdigest()[:12]
+    return _static_version
+
+
+class ServiceWorkerView(TemplateView):
+    template_name = 'hda_public/service_worker.js'
+    content_type = 'application/javascript'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cache_name'] = f"hda-static-{static_version()}"
+        context['static_url'] = settings.STATIC_URL
+        context['cdn_prefixes'] = VERSIONED_CDN_PREFIXES
+        return context
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        # browsers should always check for a new version of the worker
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -133,6 +133,10 @@ STATIC_URL = '/static/'
 # several different apps
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# Generated typeahead prefetch data is saved here (see app_api/util/prefetch.py); it needs
+# to be somewhere that is served under STATIC_URL + 'prefetch/'
+PREFETCH_DIR = os.path.join(BASE_DIR, 'static', 'prefetch')
+
 # static files that are not assets (e.g. user uploads)
 # will be served from this URL; the web server (e.g. nginx)
 # should be configured to serve requests to this URL from
@@ -144,6 +148,29 @@ MEDIA_URL = '/media/'
 # (so add that to .gitignore!)
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Where search suggestions come from: 'memory' keeps an index of county and state names in each
+# app process; 'database' runs every search in the database (using trigram indexes on
+# PostgreSQL). See app_api/util/search_backends.py
+SEARCH_BACKEND = 'memory'
+
+# How long (in seconds) to keep cached copies of public pages. Pages are also thrown away
+# whenever the data changes; see hda_public/page_cache.py
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Whether deleting a data set or indicator starts removing its rows from the database in a
+# background thread straight away. If not, run the purge_deleted_data command (e.g. from cron);
+# see hda_privileged/purge.py
+PURGE_IN_BACKGROUND = True
+
+# How many data points each step of a purge deletes
+PURGE_BATCH_SIZE = 5000
+
+# Whether uploaded files are stored gzipped; see hda_privileged/documents.py
+UPLOAD_COMPRESSION = False
+
+# How long (in seconds) a typo-tolerant search may spend comparing names before giving up
+SEARCH_FUZZY_BUDGET = 0.05
+
 # "Production" settings:
 # Rather than use this boolean in functions and have everything in one file,
 # we'll see if it's simpler to just have all the production stuff in its own
@@ -153,4 +180,10 @@ if ON_CSCI5910:
 
 # This is not the fanciest or most flexible way to do this; here's a whole
 # thread on the subject: https://code.djangoproject.com/wiki/SplitSettings
+# (Defaults the production file may override have to be set above this.)
+
+# PostgreSQL-specific model features (e.g. trigram lookups) need this app, which in turn
+# needs psycopg2, so only install it when we are actually using PostgreSQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
 
@@ -29,4 +29,7 @@ DATABASES = {
 
 STATIC_ROOT = '/home/hds-app/static/'
 
+# regenerated prefetch data has to go where the web server will find it
+PREFETCH_DIR = os.path.join(STATIC_ROOT, 'prefetch')
+
 MEDIA_ROOT = '/home/hds-app/media/'
\ No newline at end of file
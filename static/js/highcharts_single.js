@@ -5,13 +5,18 @@ indicator, then removes the loading indicator once some data has been loaded.
 Contains all the static configuration/settings/options for the chart, and exports a function
 to create and display a chart. Usage:
 
-    SingleChart.init(
+    SingleChart.large(
         <ID of element to contain chart>,
         <URL to get percentile series from>,
         <URL to get point series from>,
-        <Title to display>
+        <Title to display>,
+        <(optional) series embedded in the page, from SingleChart.readInitialSeries>
     );
 
+If the page embeds the series, the chart is drawn from them without any network requests.
+Otherwise, series URLs that include the data set's version (`v=`) are answered from the
+browser's SeriesCache (see series_cache.js) when they have been downloaded before.
+
 Much of this used to be directly within the public/chart.html template, but as this gets more
 complicated (loading data series asynchronously, fixing tooltips, etc.) it is much neater to
 keep a separate file.
@@ -138,14 +143,17 @@ var SingleChart = (function(context, Highcharts) {
         }
     };
 
+    // Promises for county name dictionaries, keyed by URL. The compact point series format
+    // only sends FIPS codes, so we download the names once and share them between charts.
+    const county_names = {};
+
     /**
-     * Uses the Fetch API to request a Highchart's chart series object in JSON format.
-     * When the series object is received, adds the series to the chart.
-     * @param {Highcharts.chart} chart Chart instance to add data series to
-     * @param {string} data_url URL to request data series from
+     * Fetches a URL and parses the response body as JSON, rejecting on server errors.
+     * @param {string} url URL to request
+     * @param {AbortSignal} signal (optional) signal that cancels the request
      */
-    function loadDataSeries(chart, data_url) {
-        return context.fetch(data_url)
+    function fetchJSON(url, signal) {
+        return context.fetch(url, {signal: signal})
             .then(response => {
                 if (response.ok) {
                     return response.json();
@@ -156,9 +164,93 @@ var SingleChart = (function(context, Highcharts) {
                     return a rejected promise, which will trigger our 'catch' handler */
                     throw new Error(response.text());
                 }
-            })
-            .then(json => {
-                chart.addSeries(json.config);
+            });
+    };
+
+    /**
+     * Returns a promise for the dictionary of county names (FIPS -> name) at the given URL,
+     * only requesting it from the server the first time it is asked for.
+     * @param {string} names_url URL of the county names dictionary
+     */
+    function getCountyNames(names_url) {
+        if (!(names_url in county_names)) {
+            county_names[names_url] = fetchJSON(names_url);
+        }
+        return county_names[names_url];
+    };
+
+    /**
+     * Whether a chart series URL includes its data set's version (`v=`), so its response never
+     * changes and can be kept in the SeriesCache (see series_cache.js).
+     * @param {string} url chart series URL
+     */
+    function isVersioned(url) {
+        return 'SeriesCache' in context && /[?&]v=/.test(url);
+    };
+
+    /**
+     * Like fetchJSON, but answers versioned chart series URLs from the SeriesCache if possible.
+     * @param {string} url chart series URL
+     * @param {AbortSignal} signal (optional) signal that cancels the request
+     */
+    function fetchSeries(url, signal) {
+        return isVersioned(url) ? context.SeriesCache.getJSON(url, signal) : fetchJSON(url, signal);
+    };
+
+    /**
+     * Turns a series in the compact format (parallel arrays of FIPS codes, x and y values) back
+     * into a regular Highcharts series config with a list of {x, y, name} points.
+     * Series that are not compact are returned as-is.
+     * @param {object} json parsed response from one of the chart series endpoints
+     */
+    function decodeSeries(json) {
+        const compact = json.compact;
+        if (!compact) {
+            return Promise.resolve(json.config);
+        }
+        // leaves the response as it was, since it may also be going into the SeriesCache
+        return getCountyNames(compact.names).then(names => Object.assign({}, json.config, {
+            data: compact.fips.map((fips, i) => ({
+                x: compact.x[i],
+                y: compact.y[i],
+                name: names[fips]
+            }))
+        }));
+    };
+
+    /**
+     * Reads chart series embedded in the page by the server, in a
+     * <script type="application/json"> element: {percentiles: {...}, points: {...}}
+     * Returns undefined if there is no such element.
+     * @param {string} element_id DOM ID of the script element
+     */
+    function readInitialSeries(element_id) {
+        const element = context.document.getElementById(element_id);
+        if (!element) {
+            return undefined;
+        }
+        try {
+            return JSON.parse(element.textContent);
+        } catch (error) {
+            context.console.log(error);
+            return undefined;
+        }
+    };
+
+    /**
+     * Uses the Fetch API to request a Highchart's chart series object in JSON format.
+     * When the series object is received, adds the series to the chart.
+     * If the series was embedded in the page, uses that instead of making a request.
+     * @param {Highcharts.chart} chart Chart instance to add data series to
+     * @param {string} data_url URL to request data series from
+     * @param {object} initial (optional) series embedded in the page
+     */
+    function loadDataSeries(chart, data_url, initial) {
+        const json = initial ? Promise.resolve(initial) : fetchSeries(data_url);
+        return json
+            .then(decodeSeries)
+            .then(config => {
+                chart.addSeries(config);
             })
             .catch(error => {
                 // TODO: display to our user that something went wrong,
@@ -167,17 +259,19 @@ var SingleChart = (function(context, Highcharts) {
             })
     };
 
-    function init_chart(element_id, percentile_data_url, points_data_url, config_object) {
+    function init_chart(element_id, percentile_data_url, points_data_url, config_object, initial) {
+        initial = initial || {};
+
         // create a chart object
         var chart = new Highcharts.chart(element_id, config_object);
         chart.showLoading();
 
         // asynchronously download the configuration object for the percentile
         // spline series, then add it to the chart
-        var perc_req = loadDataSeries(chart, percentile_data_url);
+        var perc_req = loadDataSeries(chart, percentile_data_url, initial.percentiles);
 
         // and the same for the data points
-        var pt_req = loadDataSeries(chart, points_data_url);
+        var pt_req = loadDataSeries(chart, points_data_url, initial.points);
 
         // remove loading indicator when requests are finished
         // (could use .race() to hide when the *first* request completes!)
@@ -192,8 +286,9 @@ var SingleChart = (function(context, Highcharts) {
      * @param {string} percentile_data_url URL to load percentile data series from
      * @param {string} points_data_url URL to load data points series from
      * @param {string} chart_title Title to display on chart
+     * @param {object} initial (optional) series embedded in the page, see readInitialSeries
      */
-    function init_large(chart_element_id, percentile_data_url, points_data_url, chart_title) {
+    function init_large(chart_element_id, percentile_data_url, points_data_url, chart_title, initial) {
         // augment our base configuration with a title
         var config = base_config_large;
         config.title = {
@@ -205,24 +300,227 @@ var SingleChart = (function(context, Highcharts) {
             chart_element_id,
             percentile_data_url,
             points_data_url,
-            config
+            config,
+            initial
         );
     };
 
-    function init_small(chart_element_id, percentile_data_url, points_data_url) {
+    function init_small(chart_element_id, percentile_data_url, points_data_url, initial) {
         // all the small charts use the same configuration, so this is straightforward
         init_chart(
             chart_element_id,
             percentile_data_url,
             points_data_url,
-            base_config_small
+            base_config_small,
+            initial
         );
     };
 
+    /**
+     * Creates a small chart when the user first interacts with its element (clicking, hovering
+     * or focusing it), replacing the static preview rendered by the server. If there is no
+     * preview, creates the chart straight away.
+     * @param {string} chart_element_id DOM ID of element to contain new Highchart's chart
+     * @param {string} percentile_data_url URL to load percentile data series from
+     * @param {string} points_data_url URL to load data points series from
+     * @param {boolean} has_preview whether the element contains a static preview of the chart
+     * @param {object} initial (optional) series embedded in the page, see readInitialSeries
+     */
+    function init_small_on_interaction(chart_element_id, percentile_data_url, points_data_url, has_preview, initial) {
+        const element = context.document.getElementById(chart_element_id);
+        if (!has_preview || !element) {
+            init_small(chart_element_id, percentile_data_url, points_data_url, initial);
+            return;
+        }
+
+        const events = ['click', 'mouseenter', 'focus', 'touchstart'];
+        let started = false;
+        function start() {
+            if (started) {
+                return;
+            }
+            started = true;
+            events.forEach(name => element.removeEventListener(name, start));
+            element.removeAttribute('title');
+            element.innerHTML = '';
+            init_small(chart_element_id, percentile_data_url, points_data_url, initial);
+        };
+        events.forEach(name => element.addEventListener(name, start, {passive: true}));
+    };
+
+    /* Loading small charts as they scroll into view */
+
+    // Cancels every batched request that is still running when the user leaves the page,
+    // so the server doesn't keep working on responses nobody will see
+    const page_requests = ('AbortController' in context) ? new context.AbortController() : undefined;
+    context.addEventListener('pagehide', () => {
+        if (page_requests) {
+            page_requests.abort();
+        }
+    });
+
+    // Series requested (for charts that have come into view) but not yet sent to the server,
+    // grouped by batch URL: batch URL -> {data_set_id: [resolve, reject]}
+    const pending_batches = {};
+
+    /**
+     * Sends every pending request for a batch URL as one request, and settles each chart's
+     * promise with its own series from the response.
+     * @param {string} batch_url URL of the batch series endpoint, with the location's query string
+     */
+    function sendBatch(batch_url) {
+        const waiting = pending_batches[batch_url];
+        delete pending_batches[batch_url];
+
+        const ids = Object.keys(waiting);
+        const url = batch_url + '&data_sets=' + ids.join(',');
+        fetchJSON(url, page_requests && page_requests.signal)
+            .then(json => {
+                ids.forEach(id => {
+                    const [resolve, reject] = waiting[id];
+                    if (json[id]) {
+                        resolve(json[id]);
+                    } else {
+                        reject(new Error('No series for data set ' + id));
+                    }
+                });
+            })
+            .catch(error => {
+                ids.forEach(id => waiting[id][1](error));
+            });
+    };
+
+    /**
+     * Returns a promise for the {percentiles, points} series of a data set. Requests made
+     * together (e.g. for every chart that comes into view at the same time) are sent to the
+     * server as a single request.
+     * @param {string} batch_url URL of the batch series endpoint, with the location's query string
+     * @param {number} data_set_id ID of the data set to get series for
+     */
+    function requestSeries(batch_url, data_set_id) {
+        return new Promise((resolve, reject) => {
+            if (!(batch_url in pending_batches)) {
+                pending_batches[batch_url] = {};
+                // wait for the other charts that came into view in this frame
+                context.setTimeout(() => sendBatch(batch_url), 0);
+            }
+            pending_batches[batch_url][data_set_id] = [resolve, reject];
+        });
+    };
+
+    /**
+     * Returns a promise for the {percentiles, points} series of a chart from the SeriesCache,
+     * or for undefined unless both are there.
+     * @param {string} percentile_data_url versioned URL of the percentile series
+     * @param {string} points_data_url versioned URL of the point series
+     */
+    function cachedSeries(percentile_data_url, points_data_url) {
+        if (!isVersioned(percentile_data_url) || !isVersioned(points_data_url)) {
+            return Promise.resolve(undefined);
+        }
+        return Promise.all([
+            context.SeriesCache.get(percentile_data_url),
+            context.SeriesCache.get(points_data_url)
+        ]).then(([percentiles, points]) => {
+            return (percentiles && points) ? {percentiles: percentiles, points: points} : undefined;
+        });
+    };
+
+    /**
+     * Keeps a chart's series from a batch in the SeriesCache, under the URLs they would have
+     * been requested from individually.
+     */
+    function storeSeries(percentile_data_url, points_data_url, json) {
+        if (isVersioned(percentile_data_url)) {
+            context.SeriesCache.put(percentile_data_url, json.percentiles);
+        }
+        if (isVersioned(points_data_url)) {
+            context.SeriesCache.put(points_data_url, json.points);
+        }
+    };
+
+    // One observer for every chart; each chart's element maps to the function that loads it
+    const on_visible = new Map();
+    const observer = ('IntersectionObserver' in context) ? new context.IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting && on_visible.has(entry.target)) {
+                const load = on_visible.get(entry.target);
+                on_visible.delete(entry.target);
+                observer.unobserve(entry.target);
+                load();
+            }
+        });
+    }, {rootMargin: '100px'}) : undefined;
+
+    /**
+     * Sets up a small chart that loads nothing until it scrolls into view. Then its series are
+     * requested (in a batch with any other charts that came into view at the same time), and:
+     * - if the element has a static preview, the chart replaces it when the user interacts with
+     *   it, using the series that were already downloaded;
+     * - otherwise, the chart is drawn as soon as its series arrive.
+     * Without IntersectionObserver support, this falls back to smallOnInteraction.
+     * @param {string} chart_element_id DOM ID of element to contain new Highchart's chart
+     * @param {number} data_set_id ID of the data set to chart
+     * @param {string} batch_url URL of the batch series endpoint, with the location's query string
+     * @param {string} percentile_data_url URL to load the percentile series from, if the batch fails
+     * @param {string} points_data_url URL to load the point series from, if the batch fails
+     * @param {boolean} has_preview whether the element contains a static preview of the chart
+     */
+    function init_small_when_visible(chart_element_id, data_set_id, batch_url, percentile_data_url, points_data_url, has_preview) {
+        const element = context.document.getElementById(chart_element_id);
+        if (!observer || !element) {
+            init_small_on_interaction(chart_element_id, percentile_data_url, points_data_url, has_preview);
+            return;
+        }
+
+        let series;
+        function load() {
+            if (!series) {
+                series = cachedSeries(percentile_data_url, points_data_url).then(cached => {
+                    if (cached) {
+                        return cached;
+                    }
+                    return requestSeries(batch_url, data_set_id).then(json => {
+                        storeSeries(percentile_data_url, points_data_url, json);
+                        return json;
+                    });
+                })
+                // if the batch fails (or is cancelled), the chart requests its own series instead
+                .catch(() => undefined);
+            }
+            return series;
+        };
+        function draw() {
+            load().then(initial => init_small(chart_element_id, percentile_data_url, points_data_url, initial));
+        };
+
+        if (has_preview) {
+            on_visible.set(element, load);
+            const events = ['click', 'mouseenter', 'focus', 'touchstart'];
+            let started = false;
+            function start() {
+                if (started) {
+                    return;
+                }
+                started = true;
+                events.forEach(name => element.removeEventListener(name, start));
+                element.removeAttribute('title');
+                draw();
+            };
+            events.forEach(name => element.addEventListener(name, start, {passive: true}));
+        } else {
+            on_visible.set(element, draw);
+        }
+        observer.observe(element);
+    };
+
     // Exports: contains the members that will be made available from this module
     return {
         large: init_large,
-        small: init_small
+        small: init_small,
+        smallOnInteraction: init_small_on_interaction,
+        smallWhenVisible: init_small_when_visible,
+        readInitialSeries: readInitialSeries
     };
 
 }(this, Highcharts)); // inject our dependencies. 'this' should be 'window'
@@ -0,0 +1,173 @@
+/*
+Module for keeping downloaded JSON (chart series and typeahead prefetch data) in the browser's
+IndexedDB, so that going back and forth between overview, chart and location pages doesn't
+download the same data again. Usage:
+
+    SeriesCache.getJSON(<URL>, <(optional) AbortSignal>)
+        .then(json => ...);
+
+Entries are keyed by URL, so this must only be used for URLs that change whenever their contents
+do: prefetch files have a hash of their contents in their names, and chart series URLs include
+the data set's version, which the server puts in the page (`v=<version>`, see hda_privileged/
+versions.py). Old versions are never asked for again, and are evicted (least recently used first)
+once the cache holds more than MAX_ENTRIES entries or about MAX_BYTES of JSON.
+
+If IndexedDB isn't available (e.g. in some private browsing modes), every request goes straight
+to the network.
+~ see https://developer.mozilla.org/en-US/docs/Web/API/IndexedDB_API/Using_IndexedDB
+*/
+var SeriesCache = (function(context) {
+
+    const DB_NAME = 'hda-series-cache';
+    const DB_VERSION = 1;
+    const STORE = 'responses';
+
+    const MAX_ENTRIES = 500;
+    const MAX_BYTES = 20 * 1024 * 1024;
+
+    // Promise for the open database, or for undefined if it can't be used
+    let database;
+
+    /**
+     * Wraps an IndexedDB request in a promise for its result.
+     * @param {IDBRequest} request
+     */
+    function settle(request) {
+        return new Promise((resolve, reject) => {
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    };
+
+    /**
+     * Returns a promise for the database, opening (and if need be creating) it the first time.
+     * The promise resolves to undefined if IndexedDB can't be used.
+     */
+    function openDatabase() {
+        if (database === undefined) {
+            if (!('indexedDB' in context)) {
+                database = Promise.resolve(undefined);
+                return database;
+            }
+            const request = context.indexedDB.open(DB_NAME, DB_VERSION);
+            request.onupgradeneeded = () => {
+                // entries: {url, json, size, used}
+                const store = request.result.createObjectStore(STORE, {keyPath: 'url'});
+                store.createIndex('used', 'used');
+            };
+            database = settle(request).catch(error => {
+                context.console.log(error);
+                return undefined;
+            });
+        }
+        return database;
+    };
+
+    /**
+     * Returns a promise for the JSON stored for a URL, or undefined if there is none.
+     * Marks the entry as just used, so it is evicted last.
+     * @param {string} url
+     */
+    function get(url) {
+        return openDatabase().then(db => {
+            if (!db) {
+                return undefined;
+            }
+            const store = db.transaction(STORE, 'readwrite').objectStore(STORE);
+            return settle(store.get(url)).then(entry => {
+                if (!entry) {
+                    return undefined;
+                }
+                entry.used = Date.now();
+                store.put(entry);
+                return entry.json;
+            });
+        }).catch(error => {
+            context.console.log(error);
+            return undefined;
+        });
+    };
+
+    /**
+     * Deletes the least recently used entries until the cache is within its size limits.
+     * @param {IDBDatabase} db
+     */
+    function evict(db) {
+        const store = db.transaction(STORE, 'readwrite').objectStore(STORE);
+        let count = 0;
+        let bytes = 0;
+        // newest first, so everything after the limits is what to delete
+        store.index('used').openCursor(null, 'prev').onsuccess = event => {
+            const cursor = event.target.result;
+            if (!cursor) {
+                return;
+            }
+            bytes += cursor.value.size;
+            count += 1;
+            if (count > MAX_ENTRIES || bytes > MAX_BYTES) {
+                cursor.delete();
+            }
+            cursor.continue();
+        };
+    };
+
+    /**
+     * Stores the JSON for a URL. Storing happens in the background; failures are only logged.
+     * @param {string} url
+     * @param {object} json parsed response; it is copied when stored, so can be changed afterwards
+     * @param {number} size (optional) size of the response in bytes, if known
+     */
+    function put(url, json, size) {
+        openDatabase().then(db => {
+            if (!db) {
+                return;
+            }
+            const entry = {
+                url: url,
+                json: json,
+                size: size || JSON.stringify(json).length,
+                used: Date.now()
+            };
+            const transaction = db.transaction(STORE, 'readwrite');
+            transaction.objectStore(STORE).put(entry);
+            transaction.oncomplete = () => evict(db);
+        }).catch(error => {
+            context.console.log(error);
+        });
+    };
+
+    /**
+     * Returns a promise for the JSON at a URL, from the cache if possible, and otherwise from the
+     * network (storing it for next time). Rejects on network and server errors.
+     * @param {string} url URL whose contents never change
+     * @param {AbortSignal} signal (optional) signal that cancels the request
+     */
+    function getJSON(url, signal) {
+        return get(url).then(cached => {
+            if (cached !== undefined) {
+                return cached;
+            }
+            return context.fetch(url, {signal: signal})
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`${response.status} ${response.statusText} from ${url}`);
+                    }
+                    return response.text();
+                })
+                .then(text => {
+                    const json = JSON.parse(text);
+                    put(url, json, text.length);
+                    return json;
+                });
+        });
+    };
+
+    // Exports: contains the members that will be made available from this module
+    const exports = {
+        get: get,
+        put: put,
+        getJSON: getJSON
+    };
+
+    return exports;
+}(window));
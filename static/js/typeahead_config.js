@@ -13,6 +13,22 @@ var TypeaheadSetup = (function() {
             return "<h3 class='suggestion-category'>" + title + "</h3>";
         }
 
+        // County prefetch data lists each state once, and each county as [fips5, name, state index]
+        // (see app_api/util/prefetch.py); expand it into the same datums the remote endpoint sends.
+        function decode_counties(data) {
+            return data.counties.map(function(row) {
+                const state = data.states[row[2]];
+                const value = row[1] + " " + state[0];
+                return {
+                    id: row[0],
+                    value: value,
+                    tokens: value.split(" "),
+                    name: row[1],
+                    state: state[1]
+                };
+            });
+        }
+
         function render_suggestion(context) {
             return "<div>" +
                 context.name +
@@ -21,11 +37,39 @@ var TypeaheadSetup = (function() {
                 "</small></div>";
         }
 
+        // Prefetch files have a hash of their contents in their names, so they can be kept in the
+        // browser's SeriesCache (IndexedDB, see series_cache.js) instead of Bloodhound's own
+        // localStorage cache, which is too small for every county.
+        function cached_transport(settings, on_success, on_error) {
+            if (typeof SeriesCache === "undefined") {
+                $.ajax(settings).done(on_success).fail(on_error);
+                return;
+            }
+            SeriesCache.getJSON(settings.url).then(on_success, on_error);
+        }
+
+        // if the prefetch data hasn't been generated, its URL is empty, and every suggestion
+        // comes from the remote endpoint
+        function prefetch_options(url, transform) {
+            if (!url) {
+                return undefined;
+            }
+            const options = {
+                url: url,
+                cache: false,
+                transport: cached_transport
+            };
+            if (transform) {
+                options.transform = transform;
+            }
+            return options;
+        }
+
         const county_source = new Bloodhound({
             queryTokenizer: Bloodhound.tokenizers.whitespace,
             datumTokenizer: get_tokens,
             identify: get_id,
-            prefetch: config.prefetch.county,
+            prefetch: prefetch_options(config.prefetch.county, decode_counties),
             remote: {
                 url: config.remote.county,
                 wildcard: config.remote.wildcard
@@ -35,7 +79,7 @@ var TypeaheadSetup = (function() {
         const state_source = new Bloodhound({
             queryTokenizer: Bloodhound.tokenizers.whitespace,
             datumTokenizer: Bloodhound.tokenizers.whitespace,
-            prefetch: config.prefetch.state,
+            prefetch: prefetch_options(config.prefetch.state),
             remote: {
                 url: config.remote.state,
                 wildcard: config.remote.wildcard